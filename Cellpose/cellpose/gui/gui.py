@@ -9,7 +9,7 @@ import warnings
 import datetime
 import time
 import copy
-import pickle
+import contextlib
 
 from qtpy import QtGui, QtCore
 from superqt import QRangeSlider, QCollapsible
@@ -1031,6 +1031,11 @@ class MainW(QMainWindow):
 
         self.pipelineMenuL.addWidget(self.run_pipeline_btn)
 
+        self.pl_profile_checkbox = QCheckBox("profile stages")
+        self.pl_profile_checkbox.setToolTip(
+            "time every stage of the pipeline, including the model")
+        self.pipelineMenuL.addWidget(self.pl_profile_checkbox)
+
         # --- save pipeline to file --- #
         self.pipelineExport = QGroupBox("Export")
         self.pipelineExport.setFont(self.boldfont)
@@ -1041,6 +1046,13 @@ class MainW(QMainWindow):
             "Export the current pipeline to a file\nNote: you must have selected a model and added it to your pipeline to export")
         self.pipelineExport_btn.clicked.connect(self.export_pipeline)
         self.pipelineExportL.addWidget(self.pipelineExport_btn)
+        self.pipelineProfile_btn = QPushButton("export profile")
+        self.pipelineProfile_btn.setToolTip(
+            "Export the profile of the last profiled pipeline run as JSON")
+        self.pipelineProfile_btn.clicked.connect(self.export_pipeline_profile)
+        self.pipelineExportL.addWidget(self.pipelineProfile_btn)
+        # profile of the last run with "profile stages" checked
+        self.pipeline_profile = None
 
         # the actual pipeline object containing all the necessary context for running pipelines
         # loaded with self.import_pipeline
@@ -1052,44 +1064,30 @@ class MainW(QMainWindow):
     def export_pipeline(self):
         if self.pipeline is None or self.pipeline.segModel is None:
             return
-        file_path, _ = QFileDialog.getSaveFileName(self, "save to file", ".")
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "save to file", ".", "Pipelines (*.json)")
         if not file_path:
             return
-        with open(file_path, 'wb') as fp:
-            pickle.dump(self.pipeline, fp)
+        from src.pipelines import save_pipeline
+        save_pipeline(self.pipeline, file_path)
 
     def import_pipeline(self):
         file_path, _ = QFileDialog.getOpenFileName(
             self, "open exported pipeline", ".")
         if file_path:
+            # remove the error label from a previous attempt
+            err_label = self.pipelineBoxL.itemAt(1)
+            if err_label:
+                widget = err_label.widget()
+                if widget:
+                    self.pipelineBoxL.removeWidget(widget)
+                    widget.deleteLater()
             try:
-                from src.pipelines import Pipeline
-                with open(file_path, 'rb') as fp:
-
-                    # remove the error label from a previous attempt
-                    err_label = self.pipelineBoxL.itemAt(1)
-                    if err_label:
-                        widget = err_label.widget()
-                        if widget:
-                            self.pipelineBoxL.removeWidget(widget)
-                            widget.deleteLater()
-
-                    new_pipeline = pickle.load(fp)
-                    if not isinstance(new_pipeline, Pipeline):
-                        print("[Error] not a pipeline")
-                        self.pipelineBoxL.addWidget(
-                            QLabel("Not a valid pipeline file"))
-                    else:
-                        self.pipeline = new_pipeline
-                        module = pg.importlib.import_module(
-                            "src.napari_image_filters")
-                        # bootstrap the actual subroutine
-                        # functions are stored as in the file they were saved
-                        # in
-                        for i, f in enumerate(self.pipeline):
-                            func = getattr(module, f.__name__)
-                            self.pipeline[i] = func
-                        self.update_pipeline_ui()
+                from src.pipelines import load_pipeline
+                # steps are resolved by name to the filters, with the
+                # arguments they were recorded with
+                self.pipeline = load_pipeline(file_path)
+                self.update_pipeline_ui()
             except Exception as e:
                 err_box = QCollapsible("error message")
                 err_box._toggle_btn.setFont(self.medfont)
@@ -1127,12 +1125,27 @@ class MainW(QMainWindow):
             self.pipeline.stack_before = curr_img
             if curr_img.shape[0] == 1:
                 curr_img = curr_img[0]
+            profiler = None
+            if self.pl_profile_checkbox.isChecked():
+                from src.pipelines_profile import PipelineProfiler
+                profiler = PipelineProfiler(self.pipeline.name)
             for func in self.pipeline:
-                curr_img = func(curr_img)
+                with self._pipeline_stage(profiler, func.__name__,
+                                          curr_img) as stage:
+                    curr_img = func(curr_img)
+                    stage.set_output(curr_img)
             io._initialize_images(self, curr_img, load_3D=self.load_3D)
             if self.pipeline.segModel is not None:
-                self.compute_segmentation(
-                    model_name=self.pipeline.segModel.__name__)
+                with self._pipeline_stage(
+                        profiler,
+                        f"model {self.pipeline.segModel.__name__()}",
+                        curr_img) as stage:
+                    self.compute_segmentation(
+                        model_name=self.pipeline.segModel.__name__)
+                    stage.set_output(getattr(self, "cellpix", None))
+            if profiler is not None:
+                self.pipeline_profile = profiler.finish()
+                print(f"GUI_INFO: {self.pipeline_profile}")
 
             self.pipeline.stack_after = curr_img
             self.enable_buttons()
@@ -1151,6 +1164,22 @@ class MainW(QMainWindow):
                 "run the current pipeline on the current image layer")
             self.loaded_pl_stack = False
 
+    def _pipeline_stage(self, profiler, name, data):
+        """Profiled stage of a pipeline run, or a no-op without profiler."""
+        if profiler is None:
+            from src.pipelines_profile import StageProfile
+            return contextlib.nullcontext(StageProfile(name))
+        return profiler.stage(name, data)
+
+    def export_pipeline_profile(self):
+        if self.pipeline_profile is None:
+            return
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "save profile", ".", "Profiles (*.json)")
+        if not file_path:
+            return
+        self.pipeline_profile.save(file_path)
+
     def save_ml_to_pipeline(self):
         try:
             # remove or add the error message from a previous attempt
@@ -0,0 +1,87 @@
+"""
+Options and fixtures of the image filter benchmarks.
+"""
+import pytest
+import numpy as np
+import cv2
+
+# edge lengths of the square benchmark images
+DEFAULT_SIZES = "512,1024,2048,4096,8192"
+
+# frames of the stacked layout
+STACK_FRAMES = 8
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--bench-sizes", default=DEFAULT_SIZES,
+        help="comma separated image edge lengths to benchmark "
+             f"(default {DEFAULT_SIZES})")
+    parser.addoption(
+        "--bench-max-stack-size", type=int, default=2048,
+        help="largest edge length benchmarked for stacks of "
+             f"{STACK_FRAMES} frames")
+
+
+def pytest_generate_tests(metafunc):
+    if "size" in metafunc.fixturenames:
+        sizes = metafunc.config.getoption("--bench-sizes")
+        metafunc.parametrize(
+            "size", [int(size) for size in sizes.split(",")], scope="session")
+
+
+def synthetic_cells(size: int, seed: int = 0) -> np.ndarray:
+    """
+    Fluorescence-like float image in [0, 1]: blurred round cells of random
+    size and brightness with brighter nuclei, on a noisy background.
+    """
+    rng = np.random.default_rng(seed)
+    canvas = np.zeros((size, size), np.float32)
+
+    n_cells = max(8, size * size // 4000)
+    centers = rng.integers(0, size, (n_cells, 2))
+    radii = rng.integers(6, 20, n_cells)
+    brightness = rng.uniform(0.3, 0.8, n_cells)
+    for (x, y), radius, value in zip(centers, radii, brightness):
+        cv2.circle(canvas, (int(x), int(y)), int(radius), float(value), -1)
+        cv2.circle(canvas, (int(x), int(y)), int(radius) // 3,
+                   float(min(value + 0.2, 1.0)), -1)
+
+    canvas = cv2.GaussianBlur(canvas, (0, 0), 2.0)
+    canvas += rng.normal(0.05, 0.02, canvas.shape).astype(np.float32)
+    return np.clip(canvas, 0, 1)
+
+
+def _to_dtype(img: np.ndarray, dtype: str) -> np.ndarray:
+    if dtype == "float32":
+        return img.astype(np.float32)
+    return (img * np.iinfo(dtype).max).astype(dtype)
+
+
+_images = {}
+
+
+@pytest.fixture(scope="session")
+def benchmark_image():
+    """
+    Returns a function giving the (cached) synthetic image for a size,
+    layout ("2d", "rgb" or "stack") and dtype.
+    """
+    def make(size: int, layout: str, dtype: str) -> np.ndarray:
+        key = (size, layout, dtype)
+        if key not in _images:
+            # a single cache entry at a time keeps 8k images affordable
+            _images.clear()
+            if layout == "stack":
+                img = np.stack([synthetic_cells(size, seed)
+                                for seed in range(STACK_FRAMES)])
+            elif layout == "rgb":
+                # each channel a different staining
+                img = np.stack([synthetic_cells(size, seed)
+                                for seed in range(3)], axis=-1)
+            else:
+                img = synthetic_cells(size)
+            _images[key] = _to_dtype(img, dtype)
+        return _images[key]
+
+    return make
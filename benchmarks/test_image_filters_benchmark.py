@@ -0,0 +1,92 @@
+"""
+Benchmarks of the image filter library
+
+Every function in IMG_FUNCTIONS, PIL based and native-dtype, over square
+synthetic cell images of several sizes, dtypes and layouts (2D, RGB and
+stacks of frames). Besides the timings of pytest-benchmark, each result
+records the throughput in megapixels per second and the peak memory the
+filter allocated through NumPy (traced with tracemalloc in a separate,
+untimed run).
+
+Run and compare between commits with:
+    pytest benchmarks --benchmark-autosave
+    pytest benchmarks --benchmark-compare
+Smaller runs with e.g. --bench-sizes=512,2048 or -k "gaussian and uint8".
+"""
+import tracemalloc
+import pytest
+import numpy as np
+
+from src.napari_image_filters import (
+    GRAYSCALE_INPUT_FUNCTIONS, IMG_FUNCTIONS, split_channels,
+    to_grayscale_input
+)
+from src.napari_image_filters_native import as_native
+from src.napari_image_filters_stack import apply_stack, is_stack
+
+# filter arguments besides the image
+FILTER_ARGS = {
+    "apply_saturation": (1.5,),
+}
+
+
+def _prepare(func, img: np.ndarray) -> np.ndarray:
+    """Grayscale conversion the widget applies before some PIL filters."""
+    if func in GRAYSCALE_INPUT_FUNCTIONS:
+        return to_grayscale_input(img)
+    return img
+
+
+def _peak_bytes(run) -> int:
+    """Peak memory allocated through NumPy while running the filter."""
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# the filter and implementation vary fastest, so all of them run on one
+# synthetic image before the next is generated
+@pytest.mark.performance
+@pytest.mark.parametrize(
+    "func", IMG_FUNCTIONS, ids=[func.__name__ for func in IMG_FUNCTIONS])
+@pytest.mark.parametrize("impl", ["pil", "native"])
+@pytest.mark.parametrize("dtype", ["uint8", "uint16", "float32"])
+@pytest.mark.parametrize("layout", ["2d", "rgb", "stack"])
+def test_filter_benchmark(benchmark, benchmark_image, request,
+                          func, layout, dtype, impl, size):
+    if func is split_channels and layout != "rgb":
+        pytest.skip("split_channels needs an RGB image")
+    if layout == "stack" and \
+            size > request.config.getoption("--bench-max-stack-size"):
+        pytest.skip("stack too large, see --bench-max-stack-size")
+
+    img = benchmark_image(size, layout, dtype)
+    args = FILTER_ARGS.get(func.__name__, ())
+    if impl == "native":
+        filter_impl = as_native(func)
+    else:
+        filter_impl = func
+        img = _prepare(func, img)
+
+    if is_stack(img):
+        def run():
+            return apply_stack(filter_impl, img, *args)
+    else:
+        def run():
+            return filter_impl(img, *args)
+
+    benchmark.group = f"{func.__name__} {layout} {size}"
+    benchmark(run)
+    if benchmark.disabled:
+        # --benchmark-disable runs every filter once, as a smoke test
+        return
+
+    # frames x height x width for stacks, height x width otherwise
+    megapixels = float(np.prod(img.shape[:3 if is_stack(img) else 2])) / 1e6
+    benchmark.extra_info["megapixels"] = megapixels
+    benchmark.extra_info["megapixels_per_s"] = \
+        megapixels / benchmark.stats.stats.mean
+    benchmark.extra_info["peak_bytes"] = _peak_bytes(run)
@@ -1,6 +1,12 @@
+import re
+from collections import deque
 from os import remove
-from pydantic import BaseModel
-from typing import List, Union
+from queue import Queue
+from threading import Lock
+from time import perf_counter
+from pydantic import BaseModel, ValidationError
+from typing import Callable, Deque, Dict, List, Optional, Union
+from jiter import from_json
 from openai import OpenAI
 import asyncio
 from json import dumps, loads
@@ -10,7 +16,7 @@ import websockets
 
 class ActionModel(BaseModel):
     action_name: str
-    action_args: List[Union[str, int, bool]]
+    action_args: List[Union[str, int, float, bool]]
 
 
 class ActionChainModel(BaseModel):
@@ -18,21 +24,325 @@ class ActionChainModel(BaseModel):
     action: List[ActionModel]
 
 
+# seconds a chat request may take before it fails, and retries after that
+REQUEST_TIMEOUT = 30.0
+REQUEST_RETRIES = 1
+
+# tokens of conversation sent with a request; older turns are compacted
+# into the summary once it is exceeded, but the last CONTEXT_KEEP_TURNS
+# turns are always sent verbatim
+CONTEXT_TOKEN_BUDGET = 3000
+CONTEXT_KEEP_TURNS = 6
+
+# prompt metrics of this many recent requests are kept
+METRICS_KEPT = 100
+
+# characters of a message quoted in the summary
+SUMMARY_QUOTE_LENGTH = 80
+
+
+def estimate_tokens(messages: List[Dict[str, str]]) -> int:
+    """
+    Rough token count of chat messages: about four characters per token,
+    plus the few tokens the chat format adds to every message.
+    """
+    return sum(4 + len(message["content"]) // 4 for message in messages)
+
+
+def summarize_turn(turn: List[Dict[str, str]]) -> str:
+    """
+    One line summary of a conversation turn, the user's message and the
+    actions of the reply, without asking the LLM.
+    """
+    line = ""
+    for message in turn:
+        content = message["content"]
+        if message["role"] == "user":
+            if len(content) > SUMMARY_QUOTE_LENGTH:
+                content = content[:SUMMARY_QUOTE_LENGTH] + "..."
+            line = f'user asked "{content}"'
+            continue
+        try:
+            reply = ActionChainModel.model_validate_json(content)
+        except ValidationError:
+            continue
+        actions = "; ".join(
+            " ".join([action.action_name] +
+                     [str(arg) for arg in action.action_args])
+            for action in reply.action)
+        line += f" -> {actions}" if actions else " -> no action"
+    return line
+
+
+class PromptMetrics():
+    """
+    Size of the prompt of one request.
+
+    Attributes:
+        messages (int): Messages sent, system prompt and summary included
+        estimated_tokens (int): Tokens estimated before sending
+        prompt_tokens (int, optional): Prompt tokens the API reported
+        summary_lines (int): Earlier turns in the summary
+        summarized_turns (int): Turns compacted so far
+        dropped_turns (int): Turns dropped so far, also from the summary
+    """
+
+    def __init__(self, messages: int, estimated_tokens: int,
+                 summary_lines: int, summarized_turns: int,
+                 dropped_turns: int):
+        self.messages = messages
+        self.estimated_tokens = estimated_tokens
+        self.prompt_tokens: Optional[int] = None
+        self.summary_lines = summary_lines
+        self.summarized_turns = summarized_turns
+        self.dropped_turns = dropped_turns
+
+    def __repr__(self):
+        tokens = self.prompt_tokens if self.prompt_tokens is not None \
+            else f"~{self.estimated_tokens}"
+        return (f"{self.messages} messages, {tokens} prompt tokens, "
+                f"{self.summary_lines} turns summarized")
+
+
+# end of a sentence in a streamed response text
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+class ReplyStreamParser():
+    """
+    Incremental parser of a streamed ActionChainModel reply.
+
+    The reply is parsed again from its snapshot at every delta, partial
+    strings included. Sentences of response_text are reported once the
+    whitespace after them arrived, an action once the next one starts; the
+    rest when the stream ends.
+
+    Args:
+        on_sentence (callable, optional): Called with every sentence of
+            response_text, in order
+        on_action (callable, optional): Called with every complete
+            ActionModel, in order
+    """
+
+    def __init__(self, on_sentence: Optional[Callable[[str], None]] = None,
+                 on_action: Optional[Callable[[ActionModel], None]] = None):
+        self.on_sentence = on_sentence
+        self.on_action = on_action
+        self._text_done = 0
+        self._actions_done = 0
+
+    def feed(self, snapshot: str):
+        """Report what became complete in the reply received so far."""
+        if not snapshot.strip():
+            return
+        parsed = from_json(snapshot.encode(), partial_mode="trailing-strings")
+        if not isinstance(parsed, dict):
+            return
+        text = parsed.get("response_text")
+        if isinstance(text, str):
+            # the text is complete once the actions follow it
+            self._sentences(text, complete="action" in parsed)
+        actions = parsed.get("action")
+        if isinstance(actions, list):
+            self._actions(actions[:-1])
+
+    def finish(self, reply: ActionChainModel):
+        """Report the rest of the complete reply."""
+        self._sentences(reply.response_text, complete=True)
+        self._actions(reply.action)
+
+    def _sentences(self, text: str, complete: bool):
+        pending = text[self._text_done:]
+        sentences = _SENTENCE_END.split(pending)
+        if not complete:
+            # the last one may still grow
+            sentences = sentences[:-1]
+        for sentence in sentences:
+            self._text_done = text.index(sentence, self._text_done) + \
+                len(sentence)
+            if sentence.strip() and self.on_sentence is not None:
+                self.on_sentence(sentence.strip())
+        if complete:
+            self._text_done = len(text)
+
+    def _actions(self, actions: list):
+        for action in actions[self._actions_done:]:
+            if not isinstance(action, ActionModel):
+                action = ActionModel.model_validate(action)
+            self._actions_done += 1
+            if self.on_action is not None:
+                self.on_action(action)
+
+
 class GPT:
-    def __init__(self, api_key: str, prompt: str = ""):
-        self.client = OpenAI(api_key=api_key)
+    def __init__(self, api_key: str, prompt: str = "",
+                 base_url: Optional[str] = None,
+                 timeout: float = REQUEST_TIMEOUT,
+                 max_retries: int = REQUEST_RETRIES,
+                 token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 keep_turns: int = CONTEXT_KEEP_TURNS,
+                 summarize: bool = True):
+        """
+        Args:
+            api_key (str): OpenAI API key
+            prompt (str): System prompt, sent with every request
+            base_url (str, optional): API endpoint, $OPENAI_BASE_URL or
+                the OpenAI API by default
+            timeout (float): Seconds before a request fails
+            max_retries (int): Retries of failed requests
+            token_budget (int): Tokens of conversation sent with a request
+            keep_turns (int): Last turns always sent verbatim
+            summarize (bool): Compact older turns into a summary instead
+                of dropping them
+        """
+        self.client = OpenAI(api_key=api_key, base_url=base_url,
+                             timeout=timeout, max_retries=max_retries)
+        # the system prompt followed by the turns sent verbatim
         self.messages = [{"role": "system", "content": prompt}]
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summarize = summarize
+        self.summary: List[str] = []
+        self.summarized_turns = 0
+        self.dropped_turns = 0
+        self.metrics: Deque[PromptMetrics] = deque(maxlen=METRICS_KEPT)
+        # say is called from several worker threads at once
+        self._lock = Lock()
+        # called with the seconds and tokens of every request, on the
+        # request's thread
+        self.on_usage: Optional[Callable[[float, int], None]] = None
+
+    def context(self) -> List[Dict[str, str]]:
+        """The messages sent with the next request."""
+        messages = self.messages[:1]
+        if self.summary:
+            messages.append({
+                "role": "system",
+                "content": "Summary of the earlier conversation:\n" +
+                           "\n".join(f"- {line}" for line in self.summary)})
+        return messages + self.messages[1:]
+
+    def _turns(self) -> List[List[Dict[str, str]]]:
+        """The stored conversation, split where the user spoke."""
+        turns = []
+        for message in self.messages[1:]:
+            if message["role"] == "user" or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return turns
+
+    def _compact(self):
+        """
+        Move the oldest turns into the summary (or drop them) while the
+        context exceeds the token budget, keeping the last keep_turns.
+        """
+        turns = self._turns()
+        compacted = 0
+        while len(turns) - compacted > self.keep_turns and \
+                estimate_tokens(self.context()) > self.token_budget:
+            turn = turns[compacted]
+            compacted += 1
+            del self.messages[1:1 + len(turn)]
+            if self.summarize:
+                self.summary.append(summarize_turn(turn))
+                self.summarized_turns += 1
+            else:
+                self.dropped_turns += 1
+        while self.summary and \
+                estimate_tokens(self.context()) > self.token_budget:
+            self.summary.pop(0)
+            self.dropped_turns += 1
 
-    def say(self, message: str):
-        self.messages.append({"role": "user", "content": message})
-        response = self.client.beta.chat.completions.parse(
+    def say(self, message: str, timeout: Optional[float] = None):
+        """
+        Send a message and parse the reply. Blocks for the round-trip, use
+        ChatRequestPool to call it off the Qt main thread.
+
+        Args:
+            message (str): The user's message
+            timeout (float, optional): Seconds before the request fails
+                with openai.APITimeoutError, the client's timeout if None
+
+        Returns:
+            tuple: The response text and the list of ActionModel
+        """
+        messages, metrics = self._prepare(message)
+        client = self.client if timeout is None else \
+            self.client.with_options(timeout=timeout)
+        start = perf_counter()
+        response = client.beta.chat.completions.parse(
             model="gpt-4o-mini",
-            messages=self.messages,
+            messages=messages,
             response_format=ActionChainModel
         )
+        event = self._finish(response, metrics, start)
+        return event.response_text, event.action
+
+    def say_stream(self, message: str,
+                   on_sentence: Optional[Callable[[str], None]] = None,
+                   on_action: Optional[Callable[[ActionModel], None]] = None,
+                   timeout: Optional[float] = None):
+        """
+        Send a message and stream the reply, reporting every sentence of
+        the response text and every action as soon as it is complete, so
+        speech and the first actions start before the reply is done.
+
+        Args:
+            message (str): The user's message
+            on_sentence (callable, optional): Called with every sentence
+            on_action (callable, optional): Called with every ActionModel
+            timeout (float, optional): Seconds before the request fails
+                with openai.APITimeoutError, the client's timeout if None
+
+        Returns:
+            tuple: The response text and the list of ActionModel
+        """
+        messages, metrics = self._prepare(message)
+        client = self.client if timeout is None else \
+            self.client.with_options(timeout=timeout)
+        parser = ReplyStreamParser(on_sentence, on_action)
+        start = perf_counter()
+        with client.beta.chat.completions.stream(
+            model="gpt-4o-mini",
+            messages=messages,
+            response_format=ActionChainModel,
+            stream_options={"include_usage": True}
+        ) as stream:
+            for chunk in stream:
+                if chunk.type == "content.delta":
+                    parser.feed(chunk.snapshot)
+            response = stream.get_final_completion()
+        event = self._finish(response, metrics, start)
+        parser.finish(event)
+        return event.response_text, event.action
+
+    def _prepare(self, message: str):
+        """Add the message to the conversation, the messages to send."""
+        with self._lock:
+            self.messages.append({"role": "user", "content": message})
+            self._compact()
+            messages = self.context()
+            metrics = PromptMetrics(
+                len(messages), estimate_tokens(messages), len(self.summary),
+                self.summarized_turns, self.dropped_turns)
+            self.metrics.append(metrics)
+        return messages, metrics
+
+    def _finish(self, response, metrics: PromptMetrics,
+                start: float) -> ActionChainModel:
+        """Record the usage and add the reply to the conversation."""
+        if response.usage:
+            metrics.prompt_tokens = response.usage.prompt_tokens
+        if self.on_usage is not None:
+            tokens = response.usage.total_tokens if response.usage else 0
+            self.on_usage(perf_counter() - start, tokens)
         event = response.choices[0].message.parsed
+        with self._lock:
+            self.messages.append({"role": "assistant",
+                                  "content": event.model_dump_json()})
+            self._compact()
         print(event)
-        return event.response_text, event.action
+        return event
 
     def whisper(self, file_path: str) -> str:
         """
@@ -56,6 +366,16 @@ class ElevenLabsTTS:
 
     async def stream_tts(self, text: str):
         """Open a websocket, stream text in small chunks, and play audio concurrently."""
+        sentences = Queue()
+        sentences.put(text)
+        sentences.put(None)
+        await self.stream_tts_queue(sentences)
+
+    async def stream_tts_queue(self, sentences: Queue):
+        """
+        Speak the texts put in a queue, until None is put. Speaking starts
+        with the first text, while later ones are still being generated.
+        """
         async with websockets.connect(self.gen_uri) as ws:
             # Initialization message to prepare the connection.
             init_msg = {
@@ -69,10 +389,12 @@ class ElevenLabsTTS:
 
             # Send the text in small chunks.
             chunk_size = 50  # Adjust chunk size as desired.
-            for i in range(0, len(text), chunk_size):
-                await ws.send(dumps({"text": text[i:i + chunk_size]}))
-                # Allows ElevenLabs to process and stream audio.
-                await asyncio.sleep(0.1)
+            while (text := await asyncio.to_thread(sentences.get)) is not None:
+                text += " "
+                for i in range(0, len(text), chunk_size):
+                    await ws.send(dumps({"text": text[i:i + chunk_size]}))
+                    # Allows ElevenLabs to process and stream audio.
+                    await asyncio.sleep(0.1)
 
             # Signal the end of the text stream.
             await ws.send(dumps({"text": ""}))
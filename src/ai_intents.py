@@ -0,0 +1,244 @@
+"""
+Local fast path for chat commands
+
+Most chat and voice messages name one of ChatWidget.available_commands
+directly: "grayscale", "blur 3", "sharpen then detect edges". Sending
+those to the LLM costs a round-trip of a second or more and tokens for a
+reply the words already spell out. IntentParser turns such messages into
+the same ActionModel list GPT.say returns, without the network.
+
+The parser is deliberately strict. Every word of a message has to be a
+command keyword (see COMMAND_PHRASES, misspellings are matched with
+difflib), a number or a filler word ("apply", "please", "the image"),
+and every clause has to name exactly one command. Anything else, such as
+questions or "a bit brighter", returns None and goes to the LLM.
+
+IntentStats counts how many messages the parser handled, and together
+with the LLM's measured latency and token use estimates what was saved.
+"""
+
+import inspect
+import re
+import time
+from threading import Lock
+from difflib import get_close_matches
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .ai import ActionModel
+
+# phrases naming each command, in addition to the command name itself;
+# filler words are dropped before phrases are matched
+COMMAND_PHRASES: Dict[str, List[str]] = {
+    "grayscale": ["grayscale", "greyscale", "gray", "grey", "monochrome"],
+    "saturation": ["saturation", "saturate"],
+    "edge_enhance": ["edge enhance", "edge enhancement", "enhance edges"],
+    "edge_detection": ["edge detection", "detect edges", "edge detect",
+                       "find edges"],
+    "blur": ["blur", "gaussian blur", "gaussian", "smooth", "smoothen"],
+    "contrast": ["contrast", "clahe", "enhance contrast"],
+    "texture": ["texture", "texture analysis", "lbp"],
+    "threshold": ["threshold", "adaptive threshold", "binarize"],
+    "sharpen": ["sharpen", "sharpening", "sharper"],
+    "ridge_detection": ["ridge detection", "ridges", "ridge", "detect ridges"],
+}
+
+# words allowed around the commands without changing their meaning
+FILLER_WORDS = {
+    "a", "an", "the", "it", "image", "picture", "layer", "please", "apply",
+    "use", "run", "do", "make", "add", "some", "filter", "with", "of", "by",
+    "to", "can", "you", "could", "would", "now", "set", "radius", "factor",
+    "level", "value", "amount", "this", "me", "just", "on",
+}
+
+# words separating the clauses of a chain of commands
+SEPARATORS = {"then", "and", "after", "afterwards", "next", "also", ",", ";"}
+
+NUMBER_WORDS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+
+# similarity a misspelt word needs to a keyword, see difflib
+FUZZY_CUTOFF = 0.8
+
+_TOKEN = re.compile(r"\d+(?:\.\d+)?|[a-z]+|[,;]")
+
+
+class IntentStats():
+    """
+    Hit counters of the local parser and the cost of the LLM requests.
+
+    Attributes:
+        hits (int): Messages handled locally
+        misses (int): Messages sent to the LLM
+        parse_seconds (float): Time spent parsing, hits and misses
+        llm_requests (int): LLM round-trips measured
+        llm_seconds (float): Total time of those round-trips
+        llm_tokens (int): Total tokens of those round-trips
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.parse_seconds = 0.0
+        self.llm_requests = 0
+        self.llm_seconds = 0.0
+        self.llm_tokens = 0
+        self._lock = Lock()
+
+    def record_llm(self, seconds: float, tokens: int = 0):
+        """
+        Record the latency and token use of an LLM round-trip, e.g. as
+        GPT.on_usage; safe to call from the requests' threads.
+        """
+        with self._lock:
+            self.llm_requests += 1
+            self.llm_seconds += seconds
+            self.llm_tokens += tokens
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def saved_seconds(self) -> float:
+        """LLM latency saved, from the mean of the measured round-trips."""
+        if not self.llm_requests:
+            return 0.0
+        return self.hits * self.llm_seconds / self.llm_requests
+
+    @property
+    def saved_tokens(self) -> int:
+        """LLM tokens saved, from the mean of the measured round-trips."""
+        if not self.llm_requests:
+            return 0
+        return round(self.hits * self.llm_tokens / self.llm_requests)
+
+    def __repr__(self):
+        return (f"{self.hits}/{self.hits + self.misses} messages handled "
+                f"locally ({self.hit_rate:.0%}), ~{self.saved_seconds:.1f} s "
+                f"and ~{self.saved_tokens} tokens of LLM requests saved")
+
+
+def _takes_argument(func: Callable) -> Optional[bool]:
+    """
+    Whether a filter takes a parameter after the image: True if it is
+    required, False if it is optional, None if it takes none.
+    """
+    params = list(inspect.signature(func).parameters.values())[1:]
+    if not params:
+        return None
+    return params[0].default is inspect.Parameter.empty
+
+
+class IntentParser():
+    """
+    Parses messages naming commands into ActionModel lists.
+
+    Args:
+        commands (dict): Command name to filter function, as
+            ChatWidget.available_commands
+        phrases (dict, optional): Command name to the phrases naming it,
+            COMMAND_PHRASES by default
+    """
+
+    def __init__(self, commands: Dict[str, Callable],
+                 phrases: Optional[Dict[str, List[str]]] = None):
+        phrases = COMMAND_PHRASES if phrases is None else phrases
+        self.arguments = {name: _takes_argument(func)
+                          for name, func in commands.items()}
+        self._phrases: Dict[Tuple[str, ...], str] = {}
+        for name in commands:
+            for phrase in [name.replace("_", " ")] + phrases.get(name, []):
+                self._phrases[tuple(phrase.split())] = name
+        self._longest = max((len(phrase) for phrase in self._phrases),
+                            default=0)
+        self._vocabulary = sorted(
+            {word for phrase in self._phrases for word in phrase} |
+            FILLER_WORDS | SEPARATORS | set(NUMBER_WORDS))
+        self.stats = IntentStats()
+
+    def parse(self, message: str) -> Optional[List[ActionModel]]:
+        """
+        The actions a message asks for, or None if it has to go to the LLM.
+        """
+        start = time.perf_counter()
+        actions = self._parse(message)
+        self.stats.parse_seconds += time.perf_counter() - start
+        if actions is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return actions
+
+    def _parse(self, message: str) -> Optional[List[ActionModel]]:
+        tokens = [self._correct(token)
+                  for token in _TOKEN.findall(message.lower())]
+        clauses, clause = [], []
+        for token in tokens:
+            if token in SEPARATORS:
+                clauses.append(clause)
+                clause = []
+            elif token is None:
+                return None
+            elif token not in FILLER_WORDS:
+                clause.append(token)
+        clauses.append(clause)
+
+        actions = []
+        for clause in clauses:
+            if not clause:
+                continue
+            action = self._parse_clause(clause)
+            if action is None:
+                return None
+            actions.append(action)
+        return actions or None
+
+    def _correct(self, token: str) -> Optional[str]:
+        """The known word a token is (a close) spelling of, else None."""
+        if token[0].isdigit() or token in self._vocabulary:
+            return token
+        match = get_close_matches(token, self._vocabulary, n=1,
+                                  cutoff=FUZZY_CUTOFF)
+        return match[0] if match else None
+
+    def _parse_clause(self, clause: Sequence[str]) -> Optional[ActionModel]:
+        """A single command and its number, None if the clause is not."""
+        name, numbers, index = None, [], 0
+        while index < len(clause):
+            number = _number(clause[index])
+            if number is not None:
+                numbers.append(number)
+                index += 1
+                continue
+            for length in range(min(self._longest, len(clause) - index),
+                                0, -1):
+                phrase = tuple(clause[index:index + length])
+                if phrase in self._phrases:
+                    if name is not None and name != self._phrases[phrase]:
+                        return None
+                    name = self._phrases[phrase]
+                    index += length
+                    break
+            else:
+                return None
+
+        if name is None or len(numbers) > 1:
+            return None
+        takes_argument = self.arguments[name]
+        if takes_argument is None and numbers:
+            return None
+        if takes_argument and not numbers:
+            return None
+        return ActionModel(action_name=name, action_args=numbers)
+
+
+def _number(token: str):
+    """The int or float a token spells, None if it is not a number."""
+    if token in NUMBER_WORDS:
+        return NUMBER_WORDS[token]
+    if token[0].isdigit():
+        return float(token) if "." in token else int(token)
+    return None
@@ -0,0 +1,189 @@
+"""
+Background chat requests
+
+GPT.say blocks for the whole round-trip to the LLM, seconds during which
+napari would freeze if it ran on the Qt main thread. ChatRequestPool runs
+requests on a pool of threads of its own instead, several at once, and
+hands the parsed reply (the response text and the ActionChainModel
+actions) to a callback on the main thread, where layers can be changed
+safely. The requests wait on the network, so they do not share napari's
+worker threads, which are sized to the CPUs and busy with filter jobs.
+
+Requests can also stream the reply (GPT.say_stream): its sentences and
+actions are then handed to callbacks on the main thread as soon as each is
+complete, before the whole reply arrived.
+
+Every request has a timeout; a request failing or timing out calls its
+error callback instead. Requests above max_in_flight wait for a free
+thread, in the order they were submitted.
+"""
+
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from qtpy.QtCore import QObject, Signal
+
+# requests sent to the LLM at the same time
+DEFAULT_MAX_IN_FLIGHT = 4
+
+
+class _Request():
+    """A submitted chat request."""
+
+    def __init__(self, request_id: int,
+                 on_result: Callable[[Any], None],
+                 on_error: Optional[Callable[[Exception], None]]):
+        self.request_id = request_id
+        self.on_result = on_result
+        self.on_error = on_error
+        self.cancelled = False
+        self.future: Optional[Future] = None
+
+
+class ChatRequestPool(QObject):
+    """
+    Sends chat messages with GPT.say on background threads.
+
+    Signals:
+        in_flight_changed (int): Number of requests running or waiting
+        idle: Emitted once no request is running or waiting
+    """
+
+    in_flight_changed = Signal(int)
+    idle = Signal()
+    # emitted on the request's thread, delivered on the main thread
+    _done = Signal(object, object, object)
+    _partial = Signal(object, object, object)
+
+    def __init__(self, chat, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 timeout: Optional[float] = None,
+                 parent: Optional[QObject] = None):
+        """
+        Args:
+            chat (GPT): Client the messages are sent with
+            max_in_flight (int): Requests running at the same time
+            timeout (float, optional): Default timeout of the requests in
+                seconds, the client's if None
+        """
+        super().__init__(parent)
+        self.chat = chat
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix="chat-request")
+        self._next_id = 0
+        self._requests: Dict[int, _Request] = {}
+        self._done.connect(self._finished)
+        self._partial.connect(self._streamed)
+
+    def submit(self, message: str, on_result: Callable[[Any], None],
+               on_error: Optional[Callable[[Exception], None]] = None,
+               timeout: Optional[float] = None,
+               on_sentence: Optional[Callable[[str], None]] = None,
+               on_action: Optional[Callable[[Any], None]] = None) -> int:
+        """
+        Send a message in the background.
+
+        Args:
+            message (str): The user's message
+            on_result (callable): Called with the (response_text, action)
+                tuple of GPT.say on the main thread
+            on_error (callable, optional): Called with the exception if the
+                request fails or times out, the traceback is printed
+                otherwise
+            timeout (float, optional): Seconds before the request fails,
+                the pool's timeout if None
+            on_sentence (callable, optional): Streams the reply, called
+                with every sentence of the response text on the main thread
+            on_action (callable, optional): Streams the reply, called with
+                every ActionModel on the main thread
+
+        Returns:
+            int: Id of the request
+        """
+        self._next_id += 1
+        request = self._requests[self._next_id] = _Request(
+            self._next_id, on_result, on_error)
+        timeout = self.timeout if timeout is None else timeout
+        if on_sentence is None and on_action is None:
+            request.future = self._executor.submit(
+                self.chat.say, message, timeout=timeout)
+        else:
+            request.future = self._executor.submit(
+                self.chat.say_stream, message,
+                on_sentence=self._forward(request, on_sentence),
+                on_action=self._forward(request, on_action),
+                timeout=timeout)
+        request.future.add_done_callback(
+            lambda future: self._done.emit(request, *_outcome(future)))
+        self.in_flight_changed.emit(self.in_flight())
+        return request.request_id
+
+    def in_flight(self) -> int:
+        """Number of requests running or waiting."""
+        return len(self._requests)
+
+    def is_busy(self) -> bool:
+        """Whether a request is running or waiting."""
+        return bool(self._requests)
+
+    def cancel(self):
+        """
+        Drop waiting requests and discard the replies of running ones, the
+        HTTP requests themselves run until they return or time out.
+        """
+        # futures cancelled before they ran call _finished right away
+        for request in list(self._requests.values()):
+            request.cancelled = True
+            request.future.cancel()
+
+    def shutdown(self):
+        """Cancel all requests and stop the threads once they are done."""
+        self.cancel()
+        self._executor.shutdown(wait=False)
+
+    def _forward(self, request: _Request,
+                 callback: Optional[Callable[[Any], None]]):
+        """A callback handing its value over to the main thread."""
+        if callback is None:
+            return None
+        return lambda value: self._partial.emit(request, callback, value)
+
+    def _streamed(self, request: _Request, callback: Callable[[Any], None],
+                  value: Any):
+        if request.cancelled:
+            return
+        # exceptions must not escape into the Qt event loop
+        try:
+            callback(value)
+        except Exception as error:
+            self._report(request, error)
+
+    def _finished(self, request: _Request, result: Any,
+                  error: Optional[BaseException]):
+        self._requests.pop(request.request_id, None)
+        if not request.cancelled:
+            if error is None:
+                # exceptions must not escape into the Qt event loop
+                try:
+                    request.on_result(result)
+                except Exception as callback_error:
+                    error = callback_error
+            if error is not None:
+                self._report(request, error)
+        self.in_flight_changed.emit(self.in_flight())
+        if not self._requests:
+            self.idle.emit()
+
+    def _report(self, request: _Request, error: BaseException):
+        if request.on_error is not None:
+            request.on_error(error)
+        else:
+            traceback.print_exception(error)
+
+
+def _outcome(future: Future):
+    """Result and exception of a done future, (None, None) if cancelled."""
+    if future.cancelled():
+        return None, None
+    error = future.exception()
+    return (None, error) if error is not None else (future.result(), None)
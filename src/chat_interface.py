@@ -1,8 +1,10 @@
 from os import getenv
 from openai import OpenAI
 import numpy as np
+import dask.array as da
 import asyncio
 import time
+from queue import Queue
 from threading import Thread
 from qtpy.QtCore import QEvent, Qt, QTimer
 from qtpy.QtWidgets import (
@@ -27,6 +29,8 @@ from .napari_image_filters import (
     apply_ridge_detection,
 )
 from .ai import GPT, ElevenLabsTTS
+from .ai_intents import IntentParser
+from .ai_requests import ChatRequestPool
 from .utils import run_tts_in_thread
 # The exception handles the headless CICD testing
 try:
@@ -78,6 +82,13 @@ class ChatWidget(QWidget):
 
         self.ai_system_prompt = AI_PROMPT
         self.Chat = GPT(api_key=OPENAI_API_KEY, prompt=AI_PROMPT)
+        # plain commands are parsed locally, the rest goes to the LLM
+        self.intents = IntentParser(self.available_commands)
+        self.Chat.on_usage = self.intents.stats.record_llm
+        # LLM round-trips run on worker threads, not the Qt event loop
+        self.requests = ChatRequestPool(self.Chat, parent=self)
+        # stream replies: speak and execute them while they arrive
+        self.stream_replies = True
         self.Speak = ElevenLabsTTS(
             gen_uri=generation_url,
             api_key=ELEVENLABS_API_KEY,
@@ -252,9 +263,10 @@ class ChatWidget(QWidget):
 
         # Get current audio level (amplitude) from STT
         current_level = 0
-        # if hasattr(self.stt, '_audio_data') and self.stt._audio_data:
-        #     # Get the most recent audio chunk and calculate its RMS amplitude
-        #     recent_chunk = self.stt._audio_data[-1]
+        # if hasattr(self.stt, '_audio') and len(self.stt._audio):
+        #     # Get the most recent 100 ms and calculate its RMS amplitude
+        #     recent_chunk = self.stt._audio.read(
+        #         self.stt._audio.frames_written - self.stt.sample_rate // 10)
         #     if recent_chunk.size > 0:
         #         print(np.mean(np.square(recent_chunk)))
         #         current_level = np.sqrt(np.mean(np.square(recent_chunk)))
@@ -300,22 +312,7 @@ class ChatWidget(QWidget):
     def process_transcript(self, transcript):
         """Process a transcript from either recording or streaming"""
         self.chat_history.append(f"[👤] User: <i>{transcript}</i>")
-
-        try:
-            response_text, action = self.Chat.say(transcript)
-            if response_text:
-                self.add_to_chat(f'[🤖] <b>{response_text}</b>')
-                Thread(
-                    target=run_tts_in_thread,
-                    args=(
-                        self.Speak.stream_tts,
-                        response_text),
-                    daemon=True).start()
-            if action:
-                self.add_to_chat(f'[⚙️] <b>{self.format_action(action)}</b>')
-                self.execute_command(action)
-        except Exception as e:
-            self.add_to_chat("[⚠️] Error: " + str(e))
+        self.send_to_llm(transcript)
 
     def process_input(self):
         """
@@ -329,21 +326,82 @@ class ChatWidget(QWidget):
         self.input_field.clear()
 
         # Process with LLM
-        try:
-            response_text, action = self.Chat.say(user_input)
-            if response_text:
-                self.add_to_chat(f'[🤖] <b>{response_text}</b>')
+        self.send_to_llm(user_input)
+
+    def send_to_llm(self, message):
+        """
+        Executes a message naming commands right away, and sends any other
+        message to the LLM in the background, the reply is handled by
+        handle_response on the main thread
+        """
+        action = self.intents.parse(message)
+        if action is not None:
+            self.handle_response(("", action))
+            return
+        if self.stream_replies:
+            self.stream_from_llm(message)
+            return
+        self.requests.submit(message, self.handle_response,
+                             self.handle_request_error)
+
+    def stream_from_llm(self, message):
+        """
+        Sends a message to the LLM and streams the reply: each sentence is
+        shown and spoken, and each action executed, as soon as it arrived
+        """
+        # sentences for the TTS thread, started with the first sentence
+        speech = None
+
+        def on_sentence(sentence):
+            nonlocal speech
+            self.add_to_chat(f'[🤖] <b>{sentence}</b>')
+            if speech is None:
+                speech = Queue()
                 Thread(
                     target=run_tts_in_thread,
                     args=(
-                        self.Speak.stream_tts,
-                        response_text),
+                        self.Speak.stream_tts_queue,
+                        speech),
                     daemon=True).start()
-            if action:
-                self.add_to_chat(f'[⚙️] <b>{self.format_action(action)}</b>')
-                self.execute_command(action)
-        except Exception as e:
-            self.add_to_chat("[⚠️] Error: " + str(e))
+            speech.put(sentence)
+
+        def on_action(action):
+            self.add_to_chat(f'[⚙️] <b>{self.format_action([action])}</b>')
+            self.execute_command([action])
+
+        def end_speech(*_):
+            if speech is not None:
+                speech.put(None)
+
+        def on_error(error):
+            end_speech()
+            self.handle_request_error(error)
+
+        self.requests.submit(message, end_speech, on_error,
+                             on_sentence=on_sentence, on_action=on_action)
+
+    def handle_response(self, reply):
+        """
+        Shows, speaks and executes a reply of the LLM
+        """
+        response_text, action = reply
+        if response_text:
+            self.add_to_chat(f'[🤖] <b>{response_text}</b>')
+            Thread(
+                target=run_tts_in_thread,
+                args=(
+                    self.Speak.stream_tts,
+                    response_text),
+                daemon=True).start()
+        if action:
+            self.add_to_chat(f'[⚙️] <b>{self.format_action(action)}</b>')
+            self.execute_command(action)
+
+    def handle_request_error(self, error):
+        """
+        Reports a failed or timed out LLM request
+        """
+        self.add_to_chat("[⚠️] Error: " + str(error))
 
     def format_action(self, action):
         """
@@ -364,14 +422,19 @@ class ChatWidget(QWidget):
         Switches the current layer to the newest filtered layer
         """
         self.filter_widget._push_to_history(curr_layer)
-        if hasattr(filtered_array, "__array__"):
+        if isinstance(filtered_array, da.Array):
+            # tiled results are computed when napari displays them
+            pass
+        elif hasattr(filtered_array, "__array__"):
             filtered_array = np.asarray(filtered_array)
         elif not isinstance(filtered_array, np.ndarray):
             filtered_array = np.array(filtered_array)
 
-        # Create new layer with descriptive name and add to napari viewer
+        # Create new layer with descriptive name and add to napari viewer,
+        # or update the layer of an earlier call with "Update in place"
         new_layer_name = f"{curr_layer.name} | {filter_name}"
-        self.viewer.add_image(filtered_array, name=new_layer_name)
+        self.filter_widget._show_result(
+            curr_layer, filtered_array, new_layer_name, filter_name)
 
     def execute_command(self, command):
         """
@@ -384,15 +447,14 @@ class ChatWidget(QWidget):
             funct = action.action_name
             param = action.action_args
 
+            # the original data of the current layer, a read only view
+            # (or lazily backed data) which filters do not modify
             layer = self.filter_widget._get_current_layer()
-            img = self.filter_widget.original_data.copy()
+            img = self.filter_widget.original_data
 
-            if param != []:
-                filtered_array = self.available_commands[funct](
-                    img, param[0])
-            else:
-                filtered_array = self.available_commands[funct](img)
+            # same lazy, stack and native dispatch as the filter buttons
+            filtered_array, _ = self.filter_widget._run_filter(
+                self.available_commands[funct], img, *param[:1])
+            # change_layer pushes the layer to the undo history
             self.change_layer(layer, filtered_array, funct.title())
-            if param == []:
-                self.filter_widget._push_to_history(layer)
         return
@@ -3,21 +3,37 @@ Napari Plugin Configuration and Widget
 
 This module sets up the Napari plugin interface for image filtering.
 """
+from functools import partial
+from weakref import WeakKeyDictionary
+import inspect
 import napari
 import numpy as np
+import dask.array as da
 from qtpy.QtWidgets import (
     QWidget, QVBoxLayout, QPushButton,
-    QLabel, QSlider, QHBoxLayout
+    QLabel, QSlider, QHBoxLayout, QCheckBox, QSpinBox, QProgressBar
 )
-from qtpy.QtCore import Qt
+from qtpy.QtCore import Qt, QTimer
 from .napari_image_filters import (
     apply_grayscale, apply_saturation,
     apply_edge_enhance, apply_edge_detection,
     apply_gaussian_blur, apply_contrast_enhancement,
     apply_texture_analysis, apply_adaptive_threshold,
     apply_sharpening, apply_ridge_detection, otsu_thresholding,
-    otsu_thresholding_no_mask, split_channels
+    otsu_thresholding_no_mask, split_channels, channel_views,
+    CHANNEL_COLORMAPS, GRAYSCALE_INPUT_FUNCTIONS, to_grayscale_input
 )
+from .napari_image_filters_stack import apply_stack, is_stack
+from .napari_image_filters_native import as_native
+from .napari_image_filters_tiled import (
+    apply_tiled, full_resolution, is_lazy_array, is_multiscale
+)
+from .napari_image_filters_parallel import (
+    DEFAULT_WORKERS, get_worker_count, set_worker_count
+)
+from .napari_image_filters_cache import DEFAULT_CACHE_BYTES, ResultCache
+from .napari_image_filters_history import DEFAULT_HISTORY_BYTES, UndoHistory
+from .napari_image_filters_jobs import FilterJobQueue
 
 from .chat_interface import ChatWidget
 from .pipelines import WorkflowWidget
@@ -25,6 +41,30 @@ from .cellpose_launch import CellposeLaunchPoint
 from .napari_image_filters_ui import ImageFiltersUI
 
 
+# longest edge of the downsampled proxy the saturation preview is computed on
+PREVIEW_SIZE = 1024
+# minimum time between two preview updates while dragging the slider
+PREVIEW_INTERVAL_MS = 40
+# largest number of batches of frames a stack is filtered in, reporting
+# progress after each, and the smallest batch: smaller stacks are filtered
+# in one vectorized call
+JOB_STEPS = 20
+JOB_BATCH_BYTES = 64 * 1024 ** 2
+
+
+def _read_only_view(data):
+    """
+    Read only view of in-memory layer data, which guards it against writes
+    without copying it. Lazily backed data is never modified and returned
+    as is.
+    """
+    if isinstance(data, np.ndarray):
+        view = data.view()
+        view.setflags(write=False)
+        return view
+    return data
+
+
 class ImageFilterWidget(QWidget):
     """
     Custom Napari widget for image filtering operations.
@@ -45,12 +85,21 @@ class ImageFilterWidget(QWidget):
         """
         super().__init__()
         self.viewer = viewer
+        # Unmodified data of every layer used as a filter source, as read
+        # only views, and the one of the layer selected last
+        self._originals = WeakKeyDictionary()
         self.original_data = None
 
-        # History stack for undo functionality
-        self.history_stack = []
-        # Maximum number of undo steps
-        self.max_history = 20
+        # History stack for undo functionality, within a memory budget
+        self.history_stack = UndoHistory(DEFAULT_HISTORY_BYTES)
+
+        # Layers added with filter results, oldest first, and the layer of
+        # each (source layer, filter) for in place updates
+        self._derived_layers = []
+        self._family_layers = {}
+
+        # Recent filter results, keyed on the input and the filter call
+        self.result_cache = ResultCache(DEFAULT_CACHE_BYTES)
 
         # Create main layout
         layout = QVBoxLayout()
@@ -64,9 +113,95 @@ class ImageFilterWidget(QWidget):
         self.undo_button.setEnabled(False)  # Disabled initially
         button_layout.addWidget(self.undo_button)
 
+        # Native dtype mode keeps 16-bit and float data in their own dtype
+        # instead of going through PIL's uint8 conversion
+        self.native_dtype_checkbox = QCheckBox("Keep bit depth")
+        self.native_dtype_checkbox.setToolTip(
+            "Filter images in their own dtype (e.g. uint16) without PIL\n"
+            "Unchecked, filters use the PIL compatible uint8 behaviour")
+        button_layout.addWidget(self.native_dtype_checkbox)
+
+        # Split channels into views of the layer data shown with a colormap,
+        # instead of three copies with the other channels zeroed
+        self.channel_views_checkbox = QCheckBox("Channel views")
+        self.channel_views_checkbox.setChecked(True)
+        self.channel_views_checkbox.setToolTip(
+            "Split channels without copying the image: each channel layer\n"
+            "is a view of the original shown with a red/green/blue colormap")
+        button_layout.addWidget(self.channel_views_checkbox)
+
+        # Overwrite the layer a filter added before on the same source
+        # layer, instead of adding a new layer per call
+        self.in_place_checkbox = QCheckBox("Update in place")
+        self.in_place_checkbox.setToolTip(
+            "Repeated calls of a filter on a layer update one result layer,\n"
+            "reusing its buffer when the shape and dtype match")
+        button_layout.addWidget(self.in_place_checkbox)
+
+        # Number of result layers kept, the oldest are removed beyond it
+        self.layer_cap_spinbox = QSpinBox()
+        self.layer_cap_spinbox.setRange(0, 1000)
+        self.layer_cap_spinbox.setPrefix("Keep layers: ")
+        self.layer_cap_spinbox.setSpecialValueText("Keep layers: all")
+        self.layer_cap_spinbox.valueChanged.connect(
+            lambda _: self._enforce_layer_cap())
+        button_layout.addWidget(self.layer_cap_spinbox)
+
+        # Run filters on a worker thread so napari stays responsive
+        self.background_checkbox = QCheckBox("Run in background")
+        self.background_checkbox.setChecked(True)
+        self.background_checkbox.setToolTip(
+            "Filter on a worker thread, newer calls of a filter on the same\n"
+            "layer replace pending ones")
+        button_layout.addWidget(self.background_checkbox)
+
+        # Number of threads filtering channels and stack frames in parallel
+        self.workers_spinbox = QSpinBox()
+        self.workers_spinbox.setRange(1, max(DEFAULT_WORKERS, 64))
+        self.workers_spinbox.setValue(get_worker_count())
+        self.workers_spinbox.setPrefix("Threads: ")
+        self.workers_spinbox.valueChanged.connect(set_worker_count)
+        button_layout.addWidget(self.workers_spinbox)
+
+        # Memory budget of the result cache, 0 disables it
+        self.cache_spinbox = QSpinBox()
+        self.cache_spinbox.setRange(0, 64 * 1024)
+        self.cache_spinbox.setSingleStep(256)
+        self.cache_spinbox.setValue(DEFAULT_CACHE_BYTES // 1024 ** 2)
+        self.cache_spinbox.setPrefix("Cache: ")
+        self.cache_spinbox.setSuffix(" MB")
+        self.cache_spinbox.valueChanged.connect(
+            lambda mb: self.result_cache.set_max_bytes(mb * 1024 ** 2))
+        button_layout.addWidget(self.cache_spinbox)
+
+        # Memory budget of the undo history
+        self.history_spinbox = QSpinBox()
+        self.history_spinbox.setRange(0, 64 * 1024)
+        self.history_spinbox.setSingleStep(256)
+        self.history_spinbox.setValue(DEFAULT_HISTORY_BYTES // 1024 ** 2)
+        self.history_spinbox.setPrefix("Undo: ")
+        self.history_spinbox.setSuffix(" MB")
+        self.history_spinbox.valueChanged.connect(
+            lambda mb: self.history_stack.set_max_bytes(mb * 1024 ** 2))
+        button_layout.addWidget(self.history_spinbox)
+
         # Add layout to main layout
         layout.addLayout(button_layout)
 
+        # Progress of the running background job
+        self.job_queue = FilterJobQueue(self)
+        job_layout = QHBoxLayout()
+        self.job_progress = QProgressBar()
+        self.job_progress.setRange(0, 100)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.job_queue.cancel)
+        job_layout.addWidget(self.job_progress)
+        job_layout.addWidget(self.cancel_button)
+        layout.addLayout(job_layout)
+        self.job_queue.progress.connect(self._show_job_progress)
+        self.job_queue.idle.connect(self._hide_job_progress)
+        self._hide_job_progress()
+
         # Saturation slider
         sat_layout = QHBoxLayout()
         self.sat_label = QLabel("Saturation: 1.0")
@@ -75,10 +210,26 @@ class ImageFilterWidget(QWidget):
         self.sat_slider.setMaximum(200)
         self.sat_slider.setValue(100)
         self.sat_slider.valueChanged.connect(self._update_saturation)
+        self.sat_slider.sliderReleased.connect(self._commit_saturation)
         sat_layout.addWidget(self.sat_label)
         sat_layout.addWidget(self.sat_slider)
+
+        # While dragging, saturation is previewed on a downsampled proxy in
+        # a single preview layer, the full resolution result is computed
+        # once the slider is released
+        self.preview_checkbox = QCheckBox("Live preview")
+        self.preview_checkbox.setChecked(True)
+        sat_layout.addWidget(self.preview_checkbox)
         layout.addLayout(sat_layout)
 
+        self._preview_layer = None
+        # coalesces slider events: at most one preview per interval, for
+        # the latest slider value
+        self._preview_timer = QTimer(self)
+        self._preview_timer.setSingleShot(True)
+        self._preview_timer.setInterval(PREVIEW_INTERVAL_MS)
+        self._preview_timer.timeout.connect(self._preview_saturation)
+
         # Filter buttons
         self.filter_buttons = [
             ("Split channels", self._split_channels),
@@ -146,17 +297,32 @@ class ImageFilterWidget(QWidget):
         # Find the first image layer
         for layer in selected_layers:
             if isinstance(layer, napari.layers.Image):
-                # Store original data (The first time called)
-                if self.original_data is None:
-                    self.original_data = layer.data.copy()
+                # Store the original data of each layer the first time it
+                # is selected. Filters never write to their input, so a
+                # read only view replaces a copy; layer data is replaced,
+                # not modified, and in place updates skip source layers
+                if layer not in self._originals:
+                    self._originals[layer] = _read_only_view(layer.data)
+                self.original_data = self._originals[layer]
                 return layer
 
         # If no image layer is found
         raise ValueError("Please select an image layer")
 
+    def _resolve_filter(self, filter_func):
+        """
+        Returns the filter implementation to run: the native-dtype version
+        when "Keep bit depth" is checked, the PIL compatible one otherwise.
+        Native filters (e.g. replayed from a workflow) stay native.
+        """
+        if self.native_dtype_checkbox.isChecked():
+            return as_native(filter_func)
+        return filter_func
+
     def _update_saturation(self, value):
         """
-        Update saturation label based on slider position.
+        Update saturation label based on slider position, and preview or
+        apply the new saturation.
 
         Args:
             value (int): Slider value (0-200)
@@ -164,6 +330,70 @@ class ImageFilterWidget(QWidget):
         # Convert slider value to saturation multiplier
         sat_value = value / 100.0
         self.sat_label.setText(f"Saturation: {sat_value:.2f}")
+
+        if self.preview_checkbox.isChecked() and self.sat_slider.isSliderDown():
+            if not self._preview_timer.isActive():
+                self._preview_timer.start()
+            return
+        self._apply_saturation()
+
+    def _preview_proxy(self, data):
+        """
+        Downsampled copy of layer data for previews, and the stride used.
+        Only the spatial axes of stacks are downsampled.
+        """
+        data = full_resolution(data)
+        lead = 1 if is_stack(data) else 0
+        stride = max(1, -(-max(data.shape[lead:lead + 2]) // PREVIEW_SIZE))
+        index = (slice(None),) * lead + (slice(None, None, stride),) * 2
+        return np.asarray(data[index]), stride
+
+    def _preview_saturation(self):
+        """
+        Show the saturation of the slider on a downsampled proxy of the
+        current layer, updating one preview layer in place.
+        """
+        try:
+            layer = self._get_current_layer()
+            proxy, stride = self._preview_proxy(layer.data)
+            impl = self._resolve_filter(apply_saturation)
+            sat_value = self.sat_slider.value() / 100.0
+            if is_stack(proxy):
+                preview = apply_stack(impl, proxy, sat_value)
+            else:
+                preview = impl(proxy, sat_value)
+
+            if self._preview_layer is not None and \
+                    self._preview_layer in self.viewer.layers:
+                self._preview_layer.data = preview
+                return
+
+            # the proxy is scaled up to overlay the full resolution layer
+            lead = 1 if is_stack(proxy) else 0
+            scale = [1] * lead + [stride, stride]
+            self._preview_layer = self.viewer.add_image(
+                preview, name=f"{layer.name} | Saturation preview",
+                scale=scale)
+            # napari selects new layers, the source stays the one filtered
+            selection = self.viewer.layers.selection
+            if hasattr(selection, "select_only"):
+                selection.select_only(layer)
+        except Exception as e:
+            print(f"Error previewing saturation: {e}")
+
+    def _remove_preview(self):
+        """Remove the saturation preview layer, if there is one."""
+        self._preview_timer.stop()
+        if self._preview_layer is not None and \
+                self._preview_layer in self.viewer.layers:
+            self.viewer.layers.remove(self._preview_layer)
+        self._preview_layer = None
+
+    def _commit_saturation(self):
+        """Replace the preview with the full resolution result on release."""
+        if not self.preview_checkbox.isChecked():
+            return
+        self._remove_preview()
         self._apply_saturation()
 
     def _push_to_history(self, layer):
@@ -173,12 +403,11 @@ class ImageFilterWidget(QWidget):
         Args:
             layer (napari.layers.Image): Current image layer
         """
-        if len(self.history_stack) >= self.max_history:
-            # Remove oldest history item if we exceed max history
-            self.history_stack.pop(0)
-
-        # Store a copy of the current state
-        self.history_stack.append(layer.data.copy())
+        # Store the current state, older states are compressed and the
+        # oldest dropped when the history exceeds its memory budget
+        self.history_stack.push(layer.data)
+        self.history_spinbox.setToolTip(
+            f"Undo history: {self.history_stack}")
 
         # Enable undo button when we have history
         self.undo_button.setEnabled(True)
@@ -203,86 +432,313 @@ class ImageFilterWidget(QWidget):
             import traceback
             traceback.print_exc()
 
-    def _apply_filter(self, filter_func):
+    def _workflow_step(self, filter_func, args):
+        """
+        The step recorded in the workflow for a filter call: the filter
+        itself, or the filter with its arguments bound by keyword (after the
+        image argument) under the same name.
+        """
+        if not args:
+            return filter_func
+        names = list(inspect.signature(filter_func).parameters)[1:]
+        step = partial(filter_func, **dict(zip(names, args)))
+        step.__name__ = filter_func.__name__
+        return step
+
+    def _filter_steps(self, filter_func, filter_impl, data, *args):
+        """
+        Generator running a filter on layer data: the PIL compatible or
+        native-dtype implementation, tile by tile for lazily backed data
+        (dask, zarr, multiscale at full resolution), batched for stacks,
+        after the grayscale conversion some filters expect. Results of the
+        same call on the same data come from the result cache.
+
+        Large stacks are filtered in up to JOB_STEPS batches of frames, and
+        the fraction done is yielded before each batch, so background jobs
+        report progress and stop between batches when cancelled.
+
+        Args:
+            filter_func (callable): Filter function to apply
+            filter_impl (callable): Implementation to run, see
+                _resolve_filter
+            data: Layer data
+            *args: Extra arguments passed to the filter
+
+        Returns:
+            The filter result
+        """
+        cache_key = None
+        if self.result_cache.max_bytes:
+            cache_key = self.result_cache.make_key(data, filter_impl, *args)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # Lazy data stays lazy and is filtered tile by tile. Time-lapse and
+        # z-stack layers are filtered as whole batches of frames in one
+        # call instead of slice by slice
+        if is_lazy_array(data):
+            data = da.asarray(full_resolution(data))
+            run_filter = partial(apply_tiled, filter_impl)
+        elif is_stack(data):
+            run_filter = partial(apply_stack, filter_impl)
+        else:
+            run_filter = filter_impl
+
+        # Preprocess for filters requiring grayscale input, the native
+        # filters convert to grayscale themselves and keep the dtype
+        if filter_impl is filter_func and \
+                filter_func in GRAYSCALE_INPUT_FUNCTIONS:
+            data = to_grayscale_input(data)
+
+        if is_lazy_array(data) or not is_stack(data):
+            yield 0.0
+            result = run_filter(data, *args)
+        else:
+            result = yield from self._filter_batches(run_filter, data, args)
+
+        return self.result_cache.put(cache_key, result)
+
+    def _filter_batches(self, run_filter, stack, args):
+        """
+        Generator filtering a stack in batches of frames, written into
+        preallocated outputs. Yields the fraction done before each batch.
+        """
+        frame_bytes = max(1, stack[0].nbytes) if len(stack) else 1
+        size = max(1, -(-len(stack) // JOB_STEPS),
+                   JOB_BATCH_BYTES // frame_bytes)
+        if len(stack) <= size:
+            yield 0.0
+            return run_filter(stack, *args)
+
+        outputs = None
+        for start in range(0, len(stack), size):
+            yield start / len(stack)
+            parts = run_filter(stack[start:start + size], *args)
+            single = not isinstance(parts, tuple)
+            parts = (parts,) if single else parts
+            if outputs is None:
+                outputs = tuple(
+                    np.empty((len(stack),) + part.shape[1:], part.dtype)
+                    for part in parts)
+            for output, part in zip(outputs, parts):
+                output[start:start + size] = part
+        return outputs[0] if single else outputs
+
+    def _run_filter(self, filter_func, data, *args):
         """
-        Apply a filter to the current image layer.
+        Run a filter on layer data on the calling thread, see _filter_steps.
 
         Args:
             filter_func (callable): Filter function to apply
+            data: Layer data
+            *args: Extra arguments passed to the filter
+
+        Returns:
+            tuple: The filter result and the implementation that ran
         """
+        # PIL compatible or native-dtype implementation of the filter
+        filter_impl = self._resolve_filter(filter_func)
+        steps = self._filter_steps(filter_func, filter_impl, data, *args)
+        try:
+            while True:
+                next(steps)
+        except StopIteration as done:
+            self._update_cache_tooltip()
+            return done.value, filter_impl
+
+    def _update_cache_tooltip(self):
+        self.cache_spinbox.setToolTip(
+            f"Filter result cache: {self.result_cache.stats()}")
+
+    def _apply_filter(self, filter_func, *args, background=None):
+        """
+        Apply a filter to the current image layer. With "Run in background"
+        checked the filter runs as a job on a worker thread and the result
+        layer is added once it is ready; a newer call of the same filter on
+        the same layer supersedes a pending one.
+
+        Args:
+            filter_func (callable): Filter function to apply
+            *args: Extra arguments passed to the filter, e.g. the saturation
+                level, so stacks still use the vectorized implementation
+            background (bool, optional): Run as a background job, defaults
+                to the "Run in background" check box
+        """
+        if filter_func is channel_views:
+            self._add_channel_views()
+            return
+        if background is None:
+            background = self.background_checkbox.isChecked()
+
         try:
             # Get current layer
             layer = self._get_current_layer()
             # Store current state in history before applying filter
             self._push_to_history(layer)
-            # Create copy to avoid modifying original
-            original_data = layer.data.copy()
-
-            # Preprocess for filters requiring grayscale input
-            if filter_func in [
-                    apply_grayscale,
-                    apply_texture_analysis,
-                    apply_adaptive_threshold,
-                    otsu_thresholding,
-                    otsu_thresholding_no_mask]:
-
-                # RGB & RGBA images
-                if original_data.ndim == 3 and original_data.shape[2] in [
-                        3, 4]:
-                    original_data = np.mean(original_data, axis=2)
-
-                # Single-channel 3D array
-                elif original_data.ndim == 3 and original_data.shape[2] == 1:
-                    original_data = original_data.squeeze()
-
-            # Handle multi-dimensional data
-            if filter_func in [apply_edge_enhance, apply_edge_detection]:
-                # Check if input is 3D stack or single image (2D)
-                if original_data.ndim == 3 and original_data.shape[-1] not in [
-                        3, 4]:
-                    filtered_slices = []
-                    for i in range(original_data.shape[0]):
-                        # Apply filter to individual 2D slices
-                        slice_data = original_data[i]
-                        filtered_slice = filter_func(slice_data)
-                        filtered_slices.append(np.asarray(filtered_slice))
-                    # Rebuild 3D stack from processed slices
-                    filtered_array = np.stack(filtered_slices)
-                else:
-                    # Process single 2D image or RGB image directly
-                    filtered_array = filter_func(original_data)
-            else:
+            # A read only view guards the layer data without copying it,
+            # lazily backed data (dask, zarr) is never modified and stays
+            # lazy
+            original_data = _read_only_view(layer.data)
+
+            if not background:
+                filtered_array, filter_impl = self._run_filter(
+                    filter_func, original_data, *args)
+                self._add_filter_result(
+                    layer, filter_func, filter_impl, filtered_array, args)
+                return
+
+            # the implementation is resolved on the main thread, the check
+            # box may change while the job is queued
+            filter_impl = self._resolve_filter(filter_func)
+            self.job_queue.submit(
+                (id(layer), filter_func), filter_func.__name__,
+                partial(self._filter_steps, filter_func, filter_impl,
+                        original_data, *args),
+                partial(self._add_filter_result,
+                        layer, filter_func, filter_impl, args=args),
+                self._report_job_error)
 
-                # special case: splitting into 3 channels, so add 3 new layers
-                if filter_func is split_channels:
-                    img_r, img_b, img_g = filter_func(original_data)
-                    filter_name = filter_func.__name__.replace(
-                        "apply_", "").replace("_", " ").title()
-                    new_layer_name = f"{layer.name} | {filter_name}"
+        except Exception as e:
+            print(f"Error applying filter: {e}")
+            import traceback
+            traceback.print_exc()
 
-                    self.viewer.add_image(img_r, name=new_layer_name + '_r')
-                    self.viewer.add_image(img_g, name=new_layer_name + '_g')
-                    self.viewer.add_image(img_b, name=new_layer_name + '_b')
-                    self.workflow.add_event_to_workflow(filter_func)
-                    return
+    def _add_filter_result(self, layer, filter_func, filter_impl,
+                           filtered_array, args):
+        """
+        Add the result of a filter as new layers and record the filter in
+        the workflow. Runs on the main thread.
+        """
+        self._update_cache_tooltip()
+        filter_name = filter_func.__name__.replace(
+            "apply_", "").replace("_", " ").title()
+        new_layer_name = f"{layer.name} | {filter_name}"
+
+        # special case: splitting into 3 channels, so add 3 new layers
+        if filter_func is split_channels:
+            img_r, img_b, img_g = filtered_array
+            for img, suffix in ((img_r, '_r'), (img_g, '_g'), (img_b, '_b')):
+                self._show_result(
+                    layer, img, new_layer_name + suffix,
+                    filter_func.__name__ + suffix)
+            self.workflow.add_event_to_workflow(filter_func)
+            return
 
-                # Apply filter directly for non-special cases
-                filtered_array = filter_func(original_data)
+        # Create new layer with descriptive name and add to napari viewer
+        self._show_result(
+            layer, filtered_array, new_layer_name, filter_func.__name__)
+        # the implementation that ran is recorded, so a workflow made
+        # with "Keep bit depth" replays at the input bit depth
+        self.workflow.add_event_to_workflow(
+            self._workflow_step(filter_impl, args))
 
-            # Rename filter function to saturation for display
-            if filter_func.__name__ == "<lambda>":
-                filter_func.__name__ = "apply_saturation"
+    def _show_result(self, source, data, name, family, **kwargs):
+        """
+        Show a filter result: as a new layer, or with "Update in place" by
+        overwriting the layer the same filter family added before for the
+        same source layer. Its buffer is reused when shape and dtype match,
+        unless it is shared (cached results are read only, channel views
+        belong to their source) or the layer has been a filter source. Beyond the "Keep layers" cap the oldest
+        result layers are removed.
 
-            # Create new layer with descriptive name and add to napari viewer
-            filter_name = filter_func.__name__.replace(
-                "apply_", "").replace("_", " ").title()
-            new_layer_name = f"{layer.name} | {filter_name}"
+        Args:
+            source (napari.layers.Image): Layer the filter was applied to
+            data: Filter result
+            name (str): Name of a new layer
+            family (str): Filter family, e.g. the filter name
+            **kwargs: Extra arguments of viewer.add_image
 
-            self.viewer.add_image(filtered_array, name=new_layer_name)
-            self.workflow.add_event_to_workflow(filter_func)
+        Returns:
+            napari.layers.Image: The new or updated layer
+        """
+        key = (id(source), family)
+        target = self._family_layers.get(key)
+        if self.in_place_checkbox.isChecked() and target is not None and \
+                target in self.viewer.layers:
+            current = target.data
+            # copy on write: the buffer of a layer used as a filter source
+            # may still be read, by its original or a queued job
+            if target not in self._originals and \
+                    isinstance(current, np.ndarray) and \
+                    isinstance(data, np.ndarray) and \
+                    current.shape == data.shape and \
+                    current.dtype == data.dtype and \
+                    current.flags.writeable and current.flags.owndata:
+                np.copyto(current, data)
+                target.refresh()
+            else:
+                target.data = data
+            return target
+
+        target = self.viewer.add_image(data, name=name, **kwargs)
+        self._family_layers[key] = target
+        self._derived_layers.append(target)
+        self._enforce_layer_cap()
+        return target
+
+    def _enforce_layer_cap(self):
+        """Remove the oldest result layers beyond the "Keep layers" cap."""
+        # layers removed by the user no longer count
+        self._derived_layers = [
+            layer for layer in self._derived_layers
+            if layer in self.viewer.layers]
+        self._family_layers = {
+            key: layer for key, layer in self._family_layers.items()
+            if layer in self._derived_layers}
+
+        cap = self.layer_cap_spinbox.value()
+        while cap and len(self._derived_layers) > cap:
+            oldest = self._derived_layers.pop(0)
+            self._family_layers = {
+                key: layer for key, layer in self._family_layers.items()
+                if layer is not oldest}
+            self.viewer.layers.remove(oldest)
+
+    def _report_job_error(self, error):
+        print(f"Error applying filter: {error}")
+        self.add_to_chat(f"[ERROR] {error}")
+
+    def _show_job_progress(self, name, fraction):
+        self.job_progress.setFormat(f"{name}: %p%")
+        self.job_progress.setValue(int(fraction * 100))
+        self.job_progress.setVisible(True)
+        self.cancel_button.setVisible(True)
+
+    def _hide_job_progress(self):
+        self.job_progress.setVisible(False)
+        self.cancel_button.setVisible(False)
+
+    def _add_channel_views(self):
+        """
+        Add a layer per channel of the current layer, each a strided view of
+        the layer data with a red, green or blue colormap, blended
+        additively. No pixel data is copied, and the channel layers can be
+        filtered like any other layer.
+        """
+        try:
+            layer = self._get_current_layer()
+            # zarr arrays would read the channel when sliced, dask slices it
+            # lazily
+            levels = layer.data if is_multiscale(layer.data) else [layer.data]
+            levels = [da.asarray(level) if is_lazy_array(level) else level
+                      for level in levels]
+            views = [channel_views(level) for level in levels]
+            if is_multiscale(layer.data):
+                # every pyramid level is split, the layers stay multiscale
+                views = [list(channel) for channel in zip(*views)]
+            else:
+                views = views[0]
+
+            for view, colormap in zip(views, CHANNEL_COLORMAPS):
+                self._show_result(
+                    layer, view, f"{layer.name} | {colormap.title()}",
+                    f"channel_views_{colormap}",
+                    colormap=colormap, blending="additive")
+            self.workflow.add_event_to_workflow(channel_views)
 
         except Exception as e:
-            print(f"Error applying filter: {e}")
+            print(f"Error splitting channels: {e}")
             import traceback
             traceback.print_exc()
 
@@ -293,7 +749,7 @@ class ImageFilterWidget(QWidget):
         """Apply saturation adjustment to current layer."""
         sat_value = self.sat_slider.value() / 100.0
         # Connect the saturation button to the filter method
-        self._apply_filter(lambda img: apply_saturation(img, sat_value))
+        self._apply_filter(apply_saturation, sat_value)
 
     def _apply_grayscale(self):
         """Apply grayscale filter to current layer."""
@@ -339,7 +795,10 @@ class ImageFilterWidget(QWidget):
         self._apply_filter(otsu_thresholding_no_mask)
 
     def _split_channels(self):
-        self._apply_filter(split_channels)
+        if self.channel_views_checkbox.isChecked():
+            self._apply_filter(channel_views)
+        else:
+            self._apply_filter(split_channels)
 
 
 def napari_experimental_provide_dock_widget():
@@ -16,9 +16,11 @@ from typing import Callable, List, Union, Tuple
 import numpy as np
 from PIL import Image, ImageEnhance, ImageFilter
 import cv2
-from skimage.feature import local_binary_pattern
 from scipy.ndimage import gaussian_filter
 
+from .napari_image_filters_lbp import local_binary_pattern_uniform
+from .napari_image_filters_parallel import map_slices
+
 # global storage of all available functions
 IMG_FUNCTIONS: List[Callable] = []
 
@@ -44,11 +46,10 @@ def apply_gaussian_blur(
 
     # Apply gaussian blur
     if len(img_array.shape) == 3:
-        # For RGB images, apply to each channel
-        blurred = np.zeros_like(img_array)
-        for i in range(img_array.shape[2]):
-            blurred[:, :, i] = gaussian_filter(
-                img_array[:, :, i], sigma=radius)
+        # For RGB images, apply to each channel on the thread pool
+        blurred = map_slices(
+            lambda channel: gaussian_filter(channel, sigma=radius),
+            img_array, axis=2)
     else:
         # For grayscale images
         blurred = gaussian_filter(img_array, sigma=radius)
@@ -56,8 +57,40 @@ def apply_gaussian_blur(
     return blurred
 
 
+def clahe_equalize(channel: np.ndarray, factor: float,
+                   tile_pixels: int = None) -> np.ndarray:
+    """
+    CLAHE on a single channel 8 or 16 bit image.
+
+    Args:
+        channel (numpy.ndarray): 2D uint8 or uint16 image
+        factor (float): Clip limit
+        tile_pixels (int, optional): Edge length of the CLAHE tiles in
+            pixels. The image is padded to a multiple of it, so the result
+            of a pixel does not depend on the image size. By default the
+            image is divided into an 8x8 grid of tiles.
+
+    Returns:
+        numpy.ndarray: Equalized image
+    """
+    if tile_pixels is None:
+        clahe = cv2.createCLAHE(clipLimit=factor, tileGridSize=(8, 8))
+        return clahe.apply(channel)
+
+    height, width = channel.shape
+    padded = cv2.copyMakeBorder(
+        channel, 0, -height % tile_pixels, 0, -width % tile_pixels,
+        cv2.BORDER_REFLECT_101)
+    clahe = cv2.createCLAHE(
+        clipLimit=factor,
+        tileGridSize=(padded.shape[1] // tile_pixels,
+                      padded.shape[0] // tile_pixels))
+    return clahe.apply(padded)[:height, :width]
+
+
 def apply_contrast_enhancement(
-    img: Union[Image.Image, np.ndarray, str], factor: float = 1.5
+    img: Union[Image.Image, np.ndarray, str], factor: float = 1.5,
+    tile_pixels: int = None
 ) -> np.ndarray:
     """
     Enhance image contrast using adaptive histogram equalization.
@@ -65,6 +98,8 @@ def apply_contrast_enhancement(
     Args:
         img (PIL.Image, numpy.ndarray, str): Input image
         factor (float): Contrast enhancement factor
+        tile_pixels (int, optional): Fixed CLAHE tile edge in pixels instead
+            of an 8x8 grid, see clahe_equalize
 
     Returns:
         numpy.ndarray: Contrast-enhanced image
@@ -78,16 +113,14 @@ def apply_contrast_enhancement(
         l, a, b = cv2.split(lab)
 
         # Apply CLAHE to L channel
-        clahe = cv2.createCLAHE(clipLimit=factor, tileGridSize=(8, 8))
-        l_enhanced = clahe.apply(l)
+        l_enhanced = clahe_equalize(l, factor, tile_pixels)
 
         # Merge channels and convert back to RGB
         lab_enhanced = cv2.merge([l_enhanced, a, b])
         enhanced = cv2.cvtColor(lab_enhanced, cv2.COLOR_LAB2RGB)
     else:
         # For grayscale images
-        clahe = cv2.createCLAHE(clipLimit=factor, tileGridSize=(8, 8))
-        enhanced = clahe.apply(img_array)
+        enhanced = clahe_equalize(img_array, factor, tile_pixels)
 
     return enhanced
 
@@ -144,11 +177,13 @@ def apply_texture_analysis(
         gray_img = gray_img.astype(np.uint8)
 
     # Apply LBP
-    lbp = local_binary_pattern(gray_img, n_points, radius, method="uniform")
+    lbp = local_binary_pattern_uniform(gray_img, n_points, radius)
 
-    # Normalize to 0-255 range
-    lbp_normalized = ((lbp - lbp.min()) *
-                      (255.0 / (lbp.max() - lbp.min()))).astype(np.uint8)
+    # Normalize to 0-255 range, through a table of the n_points + 2 codes
+    low, high = lbp.min(), lbp.max()
+    levels = ((np.arange(n_points + 2) - low) *
+              (255.0 / np.float64(high - low))).astype(np.uint8)
+    lbp_normalized = levels[lbp]
 
     # If the input was a 3D array, maintain the shape for consistency
     if input_array.ndim == 3:
@@ -462,10 +497,36 @@ def sanitize_dimensional_image(pil_img: Image.Image) -> np.ndarray:
     return gray_img
 
 
+def to_grayscale_input(
+        img: np.ndarray, out: Union[np.ndarray, None] = None) -> np.ndarray:
+    """
+    Prepare the input of the filters in GRAYSCALE_INPUT_FUNCTIONS: RGB(A)
+    images and stacks are averaged over their channels, single channel 3D
+    arrays are squeezed.
+
+    Args:
+        img (numpy.ndarray): Image or stack
+        out (numpy.ndarray, optional): Float64 buffer for the channel mean
+
+    Returns:
+        numpy.ndarray: Single channel image or stack
+    """
+    # RGB & RGBA images and stacks
+    if img.ndim in [3, 4] and img.shape[-1] in [3, 4]:
+        return np.mean(img, axis=-1, out=out)
+
+    # Single-channel 3D array
+    if img.ndim == 3 and img.shape[2] == 1:
+        return img.squeeze()
+
+    return img
+
+
 def split_channels(
         img: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
-    assert len(img.shape) == 3
-    print("cannot apply RGB to greyscale image")
+    if img.ndim != 3:
+        raise ValueError(
+            f"Cannot split the channels of a greyscale image {img.shape}")
     r = img.copy()
     r[:, :, 0] = 0
     r[:, :, 1] = 0
@@ -481,6 +542,41 @@ def split_channels(
     return (r, g, b)
 
 
+def channel_views(img) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Red, green and blue channel of an RGB(A) image or stack as strided
+    views of the input. Unlike split_channels no pixel data is copied, and
+    filters can be applied to the views directly.
+
+    Args:
+        img (numpy.ndarray): H x W x C image or N x H x W x C stack with at
+            least 3 channels, a NumPy or dask array
+
+    Returns:
+        tuple: The three channels, each of shape (N x) H x W
+
+    Raises:
+        ValueError: If the input is not an RGB(A) image or stack
+    """
+    if not (img.ndim == 3 and img.shape[-1] in (3, 4) or
+            img.ndim == 4 and img.shape[-1] >= 3):
+        raise ValueError(
+            f"Expected an RGB(A) image or stack, got shape {img.shape}")
+    return tuple(img[..., channel] for channel in range(3))
+
+
+# colormaps of the layers created by channel_views
+CHANNEL_COLORMAPS = ("red", "green", "blue")
+
+# filters returning one image per channel, added as several layers
+MULTI_LAYER_FUNCTIONS: List[Callable] = [split_channels, channel_views]
+
+# filters which expect single channel input, see to_grayscale_input
+GRAYSCALE_INPUT_FUNCTIONS: List[Callable] = [
+    apply_grayscale, apply_texture_analysis, apply_adaptive_threshold,
+    otsu_thresholding, otsu_thresholding_no_mask
+]
+
 IMG_FUNCTIONS.extend([
     apply_grayscale, apply_saturation,
     apply_edge_enhance, apply_edge_detection,
@@ -0,0 +1,205 @@
+"""
+Content addressed cache for filter results
+
+Toggling filters back and forth, or the chat agent re-issuing "blur 2",
+runs the same filter on the same image again. ResultCache keeps recent
+results keyed on a hash of the input array plus the filter and its
+arguments, within a memory budget, evicting the least recently used
+result first.
+
+Cached arrays are shared between every layer they are returned to, so they
+are made read only.
+"""
+
+import hashlib
+from collections import OrderedDict
+from functools import partial
+from threading import Lock
+from typing import Callable, Hashable, Optional
+import numpy as np
+import dask.array as da
+
+# default memory budget of the cache
+DEFAULT_CACHE_BYTES = 1024 ** 3
+
+
+def array_digest(data) -> Optional[Hashable]:
+    """
+    Fast content hash of layer data.
+
+    Args:
+        data: NumPy array, or a dask array (keyed by its graph name, which
+            dask derives from its inputs)
+
+    Returns:
+        Hashable key, or None for data which cannot be hashed cheaply
+    """
+    if isinstance(data, da.Array):
+        return ("dask", data.name)
+    if not isinstance(data, np.ndarray):
+        return None
+
+    contiguous = np.ascontiguousarray(data)
+    digest = hashlib.blake2b(
+        contiguous.view(np.uint8).reshape(-1), digest_size=16).hexdigest()
+    return (digest, data.shape, data.dtype.str)
+
+
+def _callable_key(func: Callable) -> Hashable:
+    """Filter identity; partials are keyed on their function and arguments."""
+    if isinstance(func, partial):
+        return (_callable_key(func.func), repr(func.args),
+                repr(sorted(func.keywords.items())))
+    return func
+
+
+def _result_bytes(result) -> int:
+    """Memory held by a result, lazy (dask) results hold none."""
+    if isinstance(result, tuple):
+        return sum(_result_bytes(part) for part in result)
+    if isinstance(result, np.ndarray):
+        return result.nbytes
+    return 0
+
+
+def _freeze(result):
+    """Make cached arrays read only, they are shared between layers."""
+    if isinstance(result, tuple):
+        return tuple(_freeze(part) for part in result)
+    if isinstance(result, np.ndarray):
+        result.setflags(write=False)
+    return result
+
+
+class CacheStats():
+    """Hit and miss counts of a ResultCache."""
+
+    def __init__(self, hits: int = 0, misses: int = 0, evictions: int = 0,
+                 entries: int = 0, current_bytes: int = 0):
+        self.hits = hits
+        self.misses = misses
+        self.evictions = evictions
+        self.entries = entries
+        self.current_bytes = current_bytes
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __repr__(self):
+        return (f"{self.hits} hits, {self.misses} misses "
+                f"({self.hit_rate:.0%}), {self.entries} results, "
+                f"{self.current_bytes / 1024 ** 2:.1f} MB")
+
+
+class ResultCache():
+    """
+    LRU cache of filter results within a memory budget.
+
+    Args:
+        max_bytes (int): Memory budget, results larger than it are not kept
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(data, func: Callable, *args) -> Optional[Hashable]:
+        """
+        Cache key of a filter call, or None if the call cannot be cached.
+
+        Args:
+            data: Input layer data
+            func (callable): Filter implementation
+            *args: Extra filter arguments
+        """
+        digest = array_digest(data)
+        if digest is None:
+            return None
+        try:
+            key = (digest, _callable_key(func), repr(args))
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    @staticmethod
+    def chain_key(key: Optional[Hashable], func: Callable,
+                  *args) -> Optional[Hashable]:
+        """
+        Cache key of a filter call on the result of the call keyed key, e.g.
+        a pipeline stage on the stage before it, without hashing that
+        result. None if the call cannot be cached.
+        """
+        if key is None:
+            return None
+        try:
+            chained = ("stage", key, _callable_key(func), repr(args))
+            hash(chained)
+        except TypeError:
+            return None
+        return chained
+
+    def get(self, key: Optional[Hashable]):
+        """Cached result for key, or None on a miss."""
+        with self._lock:
+            if key is None or key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, key: Optional[Hashable], result):
+        """
+        Store a result, evicting least recently used results as needed.
+
+        Returns:
+            The result, read only if it was cached
+        """
+        size = _result_bytes(result)
+        if key is None or size > self.max_bytes:
+            return result
+
+        result = _freeze(result)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (result, size)
+            self.current_bytes += size
+            self._evict(self.max_bytes)
+        return result
+
+    def set_max_bytes(self, max_bytes: int):
+        """Change the memory budget, evicting results above it."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict(max_bytes)
+
+    def _evict(self, max_bytes: int):
+        while self.current_bytes > max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        """Drop all results, the statistics are kept."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> CacheStats:
+        """Hit and miss statistics of the cache."""
+        with self._lock:
+            return CacheStats(self.hits, self.misses, self.evictions,
+                              len(self._entries), self.current_bytes)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,174 @@
+"""
+Memory bounded undo history
+
+Every filter call pushes the state of the current layer to the undo
+history. Storing a full copy per step exhausts memory on large images, so
+UndoHistory keeps only the newest state as a plain array, which keeps the
+most recent undo instant. Older states are stored as the XOR against the
+next newer state, compressed with zlib in chunks on the shared thread
+pool. Filters add new layers and mostly leave the current layer as it was,
+so most chunks are unchanged and cost nothing. When the history exceeds
+its byte budget the oldest states are dropped first.
+
+Lazily backed data (dask, zarr, multiscale) is never modified in place, so
+it is kept by reference and costs no memory.
+"""
+
+import zlib
+from typing import List, Optional, Tuple
+import numpy as np
+
+from .napari_image_filters_parallel import parallel_map
+from .napari_image_filters_tiled import is_lazy_array
+
+# default memory budget of the undo history
+DEFAULT_HISTORY_BYTES = 512 * 1024 ** 2
+
+# states are compressed in chunks of this many bytes, in parallel
+CHUNK_BYTES = 4 * 1024 ** 2
+
+# zlib level, the fastest one: deltas are mostly zeros
+COMPRESSION_LEVEL = 1
+
+
+def _byte_view(data: np.ndarray) -> np.ndarray:
+    """Flat uint8 view of the bytes of a contiguous array."""
+    return np.ascontiguousarray(data).reshape(-1).view(np.uint8)
+
+
+class _Delta():
+    """
+    A state stored as compressed chunks, of its XOR with the next newer
+    state if both have the same shape and dtype (relative), or of the state
+    itself otherwise. Chunks equal to the newer state are None.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], dtype: np.dtype,
+                 chunks: List[Optional[bytes]], relative: bool):
+        self.shape = shape
+        self.dtype = dtype
+        self.chunks = chunks
+        self.relative = relative
+        self.nbytes = sum(len(chunk) for chunk in chunks if chunk is not None)
+
+
+def _is_relative(data: np.ndarray, newer) -> bool:
+    return isinstance(newer, np.ndarray) and \
+        newer.shape == data.shape and newer.dtype == data.dtype
+
+
+def _encode(data: np.ndarray, newer) -> _Delta:
+    """Compress a state, relative to the next newer state if possible."""
+    relative = _is_relative(data, newer)
+    raw = _byte_view(data)
+    reference = _byte_view(newer) if relative else None
+
+    def encode_chunk(start):
+        block = raw[start:start + CHUNK_BYTES]
+        if reference is not None:
+            newer_block = reference[start:start + CHUNK_BYTES]
+            if np.array_equal(block, newer_block):
+                return None
+            block = np.bitwise_xor(block, newer_block)
+        return zlib.compress(block, COMPRESSION_LEVEL)
+
+    chunks = parallel_map(encode_chunk, range(0, raw.size, CHUNK_BYTES))
+    return _Delta(data.shape, data.dtype, chunks, relative)
+
+
+def _decode(delta: _Delta, newer) -> np.ndarray:
+    """Restore a state from its delta and the next newer state."""
+    data = np.empty(delta.shape, delta.dtype)
+    raw = _byte_view(data)
+    reference = _byte_view(newer) if delta.relative else None
+
+    def decode_chunk(index):
+        start = index * CHUNK_BYTES
+        stop = start + CHUNK_BYTES
+        chunk = delta.chunks[index]
+        if chunk is None:
+            raw[start:stop] = reference[start:stop]
+            return
+        block = np.frombuffer(zlib.decompress(chunk), np.uint8)
+        if reference is not None:
+            np.bitwise_xor(block, reference[start:stop], out=raw[start:stop])
+        else:
+            raw[start:stop] = block
+
+    parallel_map(decode_chunk, range(len(delta.chunks)))
+    return data
+
+
+def _entry_bytes(entry) -> int:
+    if isinstance(entry, (np.ndarray, _Delta)):
+        return entry.nbytes
+    return 0
+
+
+class UndoHistory():
+    """
+    Stack of layer states within a memory budget. The newest state is
+    always kept, even if it alone exceeds the budget.
+
+    Args:
+        max_bytes (int): Memory budget of the stored states
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_HISTORY_BYTES):
+        self.max_bytes = max_bytes
+        # oldest first; the newest entry is an array (or lazy data), older
+        # ones are deltas against the entry after them
+        self._entries: List = []
+        self.nbytes = 0
+
+    def push(self, data):
+        """
+        Store a state. NumPy data is copied, lazily backed data is kept by
+        reference.
+        """
+        newest = data if is_lazy_array(data) else np.array(data)
+        if self._entries and isinstance(self._entries[-1], np.ndarray):
+            self._entries[-1] = _encode(self._entries[-1], newest)
+        self._entries.append(newest)
+        self._evict(self.max_bytes)
+
+    def pop(self):
+        """
+        Remove and return the newest state.
+
+        Raises:
+            IndexError: If the history is empty
+        """
+        if not self._entries:
+            raise IndexError("pop from an empty undo history")
+        newest = self._entries.pop()
+        if self._entries and isinstance(self._entries[-1], _Delta):
+            self._entries[-1] = _decode(self._entries[-1], newest)
+        self._update_bytes()
+        return newest
+
+    def set_max_bytes(self, max_bytes: int):
+        """Change the memory budget, dropping the oldest states above it."""
+        self.max_bytes = max_bytes
+        self._evict(max_bytes)
+
+    def clear(self):
+        """Drop all states."""
+        self._entries.clear()
+        self.nbytes = 0
+
+    def _update_bytes(self):
+        self.nbytes = sum(_entry_bytes(entry) for entry in self._entries)
+
+    def _evict(self, max_bytes: int):
+        self._update_bytes()
+        # the oldest entry only depends on newer ones, so it can be dropped
+        while self.nbytes > max_bytes and len(self._entries) > 1:
+            self.nbytes -= _entry_bytes(self._entries.pop(0))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return (f"{len(self)} steps, "
+                f"{self.nbytes / 1024 ** 2:.1f} MB")
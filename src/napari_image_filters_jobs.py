@@ -0,0 +1,132 @@
+"""
+Background execution of filter jobs
+
+Filters on large images take seconds, and run on the Qt main thread they
+freeze napari. FilterJobQueue runs them one at a time on a napari worker
+thread instead. A job is a generator function which yields the fraction of
+the work done and returns its result; the result is handed to the job's
+callback on the main thread, where layers can be added safely.
+
+Jobs are keyed, e.g. on the layer and the filter: a new job supersedes a
+queued job with the same key, which is dropped, and a running one, which is
+cancelled at its next progress step and whose result is discarded. Dragging
+a slider therefore only ever computes the latest value.
+"""
+
+import traceback
+from typing import Any, Callable, Generator, Hashable, List, Optional
+from napari.qt.threading import create_worker
+from qtpy.QtCore import QObject, Signal
+
+
+class _Job():
+    """A queued filter job."""
+
+    def __init__(self, key: Hashable, name: str,
+                 work: Callable[[], Generator[float, None, Any]],
+                 on_result: Callable[[Any], None],
+                 on_error: Optional[Callable[[Exception], None]]):
+        self.key = key
+        self.name = name
+        self.work = work
+        self.on_result = on_result
+        self.on_error = on_error
+        self.cancelled = False
+        self.worker = None
+
+
+class FilterJobQueue(QObject):
+    """
+    Runs filter jobs one at a time on a napari worker thread.
+
+    Signals:
+        progress (str, float): Name and fraction done of the running job
+        idle: Emitted once no job is running or queued
+    """
+
+    progress = Signal(str, float)
+    idle = Signal()
+
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._pending: List[_Job] = []
+        self._running: Optional[_Job] = None
+
+    def submit(self, key: Hashable, name: str,
+               work: Callable[[], Generator[float, None, Any]],
+               on_result: Callable[[Any], None],
+               on_error: Optional[Callable[[Exception], None]] = None):
+        """
+        Queue a job, superseding queued and running jobs with the same key.
+
+        Args:
+            key (hashable): Identity of the job, e.g. (layer, filter)
+            name (str): Name reported with the progress
+            work (callable): Generator function yielding the fraction done
+                and returning the result
+            on_result (callable): Called with the result on the main thread,
+                unless the job was cancelled
+            on_error (callable, optional): Called with the exception if the
+                job fails, the traceback is printed otherwise
+        """
+        self._pending = [job for job in self._pending if job.key != key]
+        if self._running is not None and self._running.key == key:
+            self._cancel(self._running)
+        self._pending.append(_Job(key, name, work, on_result, on_error))
+        self._start_next()
+
+    def cancel(self):
+        """Drop all queued jobs and cancel the running one."""
+        self._pending.clear()
+        if self._running is not None:
+            self._cancel(self._running)
+
+    def is_busy(self) -> bool:
+        """Whether a job is running or queued."""
+        return self._running is not None or bool(self._pending)
+
+    def _cancel(self, job: _Job):
+        job.cancelled = True
+        job.worker.quit()
+
+    def _start_next(self):
+        if self._running is not None:
+            return
+        if not self._pending:
+            self.idle.emit()
+            return
+
+        job = self._running = self._pending.pop(0)
+        # errors are reported through on_error instead of re-raised
+        job.worker = create_worker(
+            job.work, _start_thread=False, _ignore_errors=True)
+        job.worker.yielded.connect(
+            lambda fraction: self.progress.emit(job.name, fraction))
+        job.worker.returned.connect(lambda result: self._returned(job, result))
+        job.worker.errored.connect(lambda error: self._errored(job, error))
+        job.worker.finished.connect(lambda: self._finished(job))
+        self.progress.emit(job.name, 0.0)
+        job.worker.start()
+
+    def _returned(self, job: _Job, result: Any):
+        if job.cancelled:
+            return
+        self.progress.emit(job.name, 1.0)
+        # exceptions must not escape into the Qt event loop
+        try:
+            job.on_result(result)
+        except Exception as error:
+            self._errored(job, error)
+
+    def _errored(self, job: _Job, error: Exception):
+        if job.cancelled:
+            return
+        if job.on_error is not None:
+            job.on_error(error)
+        else:
+            traceback.print_exception(error)
+
+    def _finished(self, job: _Job):
+        if self._running is job:
+            self._running = None
+        self._start_next()
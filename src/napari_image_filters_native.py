@@ -0,0 +1,462 @@
+"""
+Native-dtype implementations of the image filters
+
+The filters in napari_image_filters.py go through PIL, which casts every
+input to uint8 (truncating 16-bit microscopy data) and copies the image
+twice per call. The functions here have the same names and arguments but
+work on NumPy arrays with NumPy/OpenCV only, and return results in the
+dtype of the input (uint8, uint16 or float32).
+
+The PIL based filters remain the default and act as the compatibility
+mode; NATIVE_FUNCTIONS maps each of them to its native counterpart.
+"""
+
+from typing import Callable, Dict, Tuple, Union
+import numpy as np
+from PIL import Image, ImageFilter
+import cv2
+from scipy.ndimage import gaussian_filter
+from skimage.filters import threshold_otsu
+
+from . import napari_image_filters as pil_filters
+from .napari_image_filters_lbp import local_binary_pattern_uniform
+from .napari_image_filters_parallel import map_slices
+
+# maps a PIL based filter to its native-dtype implementation
+NATIVE_FUNCTIONS: Dict[Callable, Callable] = {}
+
+# ITU-R 601-2 luma weights, as used by PIL and OpenCV
+_LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def ensure_array(img: Union[Image.Image, np.ndarray, str]) -> np.ndarray:
+    """
+    Convert input to a NumPy array without changing its dtype.
+
+    Args:
+        img (PIL.Image, numpy.ndarray, or str): Input image in various formats
+
+    Returns:
+        numpy.ndarray: Image array (not a copy when given an array)
+
+    Raises:
+        TypeError: If input cannot be converted to an array
+    """
+    if isinstance(img, np.ndarray):
+        return img
+
+    if isinstance(img, str):
+        img = Image.open(img)
+
+    if isinstance(img, Image.Image):
+        return np.asarray(img)
+
+    raise TypeError(
+        "Input must be a PIL Image, NumPy array, or valid image path")
+
+
+def max_value(dtype: np.dtype) -> float:
+    """White level of a dtype: its integer maximum, or 1.0 for floats."""
+    dtype = np.dtype(dtype)
+    if dtype.kind in "ui":
+        return np.iinfo(dtype).max
+    return 1.0
+
+
+def _cast(img: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    """Round and saturate a float result back into an integer dtype."""
+    dtype = np.dtype(dtype)
+    if dtype.kind in "ui":
+        info = np.iinfo(dtype)
+        img = np.clip(np.rint(img), info.min, info.max)
+    return img.astype(dtype, copy=False)
+
+
+def _to_gray(img: np.ndarray) -> np.ndarray:
+    """Luma of an RGB(A) image as float32, other images as 2D float32."""
+    if img.ndim == 3:
+        if img.shape[2] in (3, 4):
+            return img[..., :3].astype(np.float32) @ _LUMA_WEIGHTS
+        return img.mean(axis=2, dtype=np.float32)
+    return img.astype(np.float32, copy=False)
+
+
+def _mask(condition: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    """Binary mask with the white level of the input dtype."""
+    return condition.astype(dtype) * np.asarray(max_value(dtype), dtype)
+
+
+def _keep_channel_axis(result: np.ndarray, img: np.ndarray) -> np.ndarray:
+    """Single channel results of 3D inputs keep a channel axis."""
+    if img.ndim == 3:
+        return result[..., np.newaxis]
+    return result
+
+
+def apply_gaussian_blur(
+    img: Union[Image.Image, np.ndarray, str], radius: float = 2.0
+) -> np.ndarray:
+    """
+    Apply Gaussian blur to the image with adjustable radius.
+
+    Args:
+        img (PIL.Image, numpy.ndarray, or str): Input image
+        radius (float): Blur radius (sigma value)
+
+    Returns:
+        numpy.ndarray: Blurred image in the input dtype
+    """
+    if radius < 0:
+        raise ValueError
+
+    img_array = ensure_array(img)
+    if img_array.ndim == 3:
+        # channels are blurred independently on the thread pool
+        return map_slices(
+            lambda channel: gaussian_filter(channel, sigma=radius),
+            img_array, axis=2)
+    return gaussian_filter(img_array, sigma=radius)
+
+
+def apply_contrast_enhancement(
+    img: Union[Image.Image, np.ndarray, str], factor: float = 1.5,
+    tile_pixels: int = None
+) -> np.ndarray:
+    """
+    Enhance image contrast using adaptive histogram equalization.
+
+    OpenCV's CLAHE works on 8 and 16 bit images, so other dtypes are
+    equalized at 16 bit precision and mapped back to their own range.
+
+    Args:
+        img (PIL.Image, numpy.ndarray, str): Input image
+        factor (float): Contrast enhancement factor
+        tile_pixels (int, optional): Fixed CLAHE tile edge in pixels instead
+            of an 8x8 grid, see napari_image_filters.clahe_equalize
+
+    Returns:
+        numpy.ndarray: Contrast-enhanced image in the input dtype
+    """
+    img_array = ensure_array(img)
+
+    def equalize(channel):
+        return pil_filters.clahe_equalize(channel, factor, tile_pixels)
+
+    if img_array.ndim == 3 and img_array.shape[2] in (3, 4):
+        # Equalize the L channel of LAB, using OpenCV's float conversion so
+        # that the input bit depth is kept
+        scale = max_value(img_array.dtype)
+        rgb = img_array[..., :3].astype(np.float32) / np.float32(scale)
+        lab = cv2.cvtColor(rgb, cv2.COLOR_RGB2LAB)
+
+        lightness = (lab[..., 0] * (65535 / 100)).astype(np.uint16)
+        lab[..., 0] = equalize(lightness) * np.float32(100 / 65535)
+
+        enhanced = _cast(
+            np.clip(cv2.cvtColor(lab, cv2.COLOR_LAB2RGB), 0, 1) * scale,
+            img_array.dtype)
+        if img_array.shape[2] == 4:
+            # the alpha channel is carried through unchanged
+            enhanced = np.concatenate([enhanced, img_array[..., 3:]], axis=2)
+        return enhanced
+
+    if img_array.dtype in (np.uint8, np.uint16):
+        return equalize(img_array)
+
+    # float and other integer images: equalize at 16 bit over their range
+    low, high = float(img_array.min()), float(img_array.max())
+    span = (high - low) or 1.0
+    scaled = ((img_array - low) * (65535 / span)).astype(np.uint16)
+    enhanced = equalize(scaled) * (span / 65535) + low
+    return _cast(enhanced, img_array.dtype)
+
+
+def otsu_thresholding(img: np.ndarray) -> np.ndarray:
+    """
+    Otsu thresholding followed by a 5x5 opening to clean the mask.
+
+    Args:
+        img (numpy.ndarray): Grayscale or RGB image
+
+    Returns:
+        numpy.ndarray: Mask in the input dtype
+    """
+    mask = otsu_thresholding_no_mask(img)
+    kernel = np.ones((5, 5), np.uint8)
+    return cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+
+
+def otsu_thresholding_no_mask(img: np.ndarray) -> np.ndarray:
+    """
+    Otsu thresholding on the full bit depth of the image.
+
+    Args:
+        img (numpy.ndarray): Grayscale or RGB image
+
+    Returns:
+        numpy.ndarray: Mask in the input dtype
+    """
+    img_array = ensure_array(img)
+    if img_array.ndim == 3:
+        gray = _to_gray(img_array)
+    elif img_array.ndim == 2:
+        gray = img_array
+    else:
+        raise TypeError(
+            "Image argument to otsu_thresholding must be of type mxnx3 or mxn")
+
+    return _mask(gray > threshold_otsu(gray), img_array.dtype)
+
+
+def apply_texture_analysis(
+    img: Union[Image.Image, np.ndarray, str], radius: int = 3, n_points: int = 8
+) -> np.ndarray:
+    """
+    Apply Local Binary Pattern for texture analysis.
+
+    Args:
+        img (PIL.Image, numpy.ndarray, str): Input image
+        radius (int): Radius of the pattern
+        n_points (int): Number of points in the pattern
+
+    Returns:
+        numpy.ndarray: Texture pattern image scaled to the input dtype range
+    """
+    img_array = ensure_array(img)
+    # LBP compares neighbours, so integer images stay integer
+    gray = _cast(_to_gray(img_array), img_array.dtype)
+    lbp = local_binary_pattern_uniform(gray, n_points, radius)
+
+    # Normalize to the white level of the input dtype, through a table of
+    # the n_points + 2 codes
+    low, high = int(lbp.min()), int(lbp.max())
+    span = (high - low) or 1.0
+    levels = (np.arange(n_points + 2) - low) * \
+        (max_value(img_array.dtype) / span)
+
+    return _keep_channel_axis(
+        _cast(levels, img_array.dtype)[lbp], img_array)
+
+
+def apply_adaptive_threshold(
+    img: Union[Image.Image, np.ndarray, str], block_size: int = 11, c: int = 2
+) -> np.ndarray:
+    """
+    Apply Gaussian adaptive thresholding at the input bit depth.
+
+    Args:
+        img (PIL.Image, numpy.ndarray, str): Input image
+        block_size (int): Size of pixel neighborhood (must be odd)
+        c (int): Constant subtracted from the weighted mean, in 8-bit units
+            (scaled to the white level of the input dtype)
+
+    Returns:
+        numpy.ndarray: Thresholded image in the input dtype
+    """
+    if block_size <= 0 or block_size % 2 == 0:
+        raise ValueError
+    img_array = ensure_array(img)
+    gray = _to_gray(img_array)
+
+    # Same neighbourhood as cv2.ADAPTIVE_THRESH_GAUSSIAN_C
+    local_mean = cv2.GaussianBlur(
+        gray, (block_size, block_size), 0,
+        borderType=cv2.BORDER_REPLICATE | cv2.BORDER_ISOLATED)
+    offset = c * max_value(img_array.dtype) / 255
+    thresh = _mask(gray > local_mean - offset, img_array.dtype)
+
+    return _keep_channel_axis(thresh, img_array)
+
+
+def _convolve(img: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """Float convolution saturated back into the input dtype."""
+    filtered = cv2.filter2D(
+        img.astype(np.float32, copy=False), -1, kernel.astype(np.float32))
+    return _cast(filtered, img.dtype)
+
+
+def apply_sharpening(img: Union[Image.Image, np.ndarray, str]) -> np.ndarray:
+    """
+    Apply sharpening using a convolutional kernel.
+
+    Args:
+        img (PIL.Image, numpy.ndarray, str): Input image.
+
+    Returns:
+        numpy.ndarray: Sharpened image in the input dtype.
+    """
+    return _convolve(ensure_array(img), np.array([
+        [0, -1, 0],
+        [-1, 5, -1],
+        [0, -1, 0]
+    ]))
+
+
+def apply_ridge_detection(
+        img: Union[Image.Image, np.ndarray, str]) -> np.ndarray:
+    """
+    Apply ridge detection using a convolutional kernel.
+
+    Args:
+        img (PIL.Image, numpy.ndarray, str): Input image.
+
+    Returns:
+        numpy.ndarray: With ridge detection, in the input dtype.
+    """
+    return _convolve(ensure_array(img), np.array([
+        [-1, -1, -1],
+        [-1, 9, -1],
+        [-1, -1, -1]
+    ]))
+
+
+def apply_grayscale(img: Union[Image.Image, np.ndarray, str]) -> np.ndarray:
+    """
+    Convert an image to grayscale.
+
+    Args:
+        img (PIL.Image, numpy.ndarray, or str): Input image in various formats
+
+    Returns:
+        numpy.ndarray: Grayscale version of the input image, in its dtype
+    """
+    img_array = ensure_array(img)
+    if img_array.ndim == 2:
+        return img_array.copy()
+    return _keep_channel_axis(
+        _cast(_to_gray(img_array), img_array.dtype), img_array)
+
+
+def apply_crop(img: Union[Image.Image, np.ndarray, str],
+               corners: Tuple[int, int, int, int]) -> np.ndarray:
+    """
+    Crop an image based on provided corner coordinates.
+
+    Args:
+        img (PIL.Image, numpy.ndarray, or str): Input image
+        corners (tuple): (left, upper, right, lower) coordinates
+
+    Returns:
+        numpy.ndarray: Cropped view of the image
+
+    Raises:
+        Exception: If coordinates are invalid
+    """
+    img_array = ensure_array(img)
+
+    # Check for negative values
+    if any(val < 0 for val in corners):
+        raise Exception("Coordinates cannot be negative")
+
+    # Check coordinate bounds
+    y_range, x_range = img_array.shape[:2]
+    if (
+        corners[0] > x_range
+        or corners[2] > x_range
+        or corners[1] > y_range
+        or corners[3] > y_range
+    ):
+        raise Exception("Coordinates exceed image dimensions")
+
+    left, upper, right, lower = corners
+    return img_array[upper:lower, left:right]
+
+
+def apply_saturation(
+    img: Union[Image.Image, np.ndarray, str], saturation_level: float
+) -> np.ndarray:
+    """
+    Adjust image saturation by blending with the luma image, as PIL does.
+
+    Args:
+        img (PIL.Image, numpy.ndarray, or str): Input image
+        saturation_level (float): Saturation multiplier
+            0.0 = grayscale
+            1.0 = original saturation
+            > 1.0 = increased saturation
+
+    Returns:
+        numpy.ndarray: Saturated image in the input dtype
+
+    Raises:
+        ValueError: If saturation level is invalid
+    """
+    if saturation_level < 0:
+        raise ValueError("Saturation level cannot be negative")
+
+    img_array = ensure_array(img)
+    if img_array.ndim != 3 or img_array.shape[2] not in (3, 4):
+        return img_array.copy()
+
+    rgb = img_array[..., :3].astype(np.float32)
+    gray = _to_gray(img_array)[..., np.newaxis]
+    saturated = gray + np.float32(saturation_level) * (rgb - gray)
+    if img_array.dtype.kind == "f":
+        saturated = np.clip(saturated, 0, None)
+
+    result = img_array.copy()
+    result[..., :3] = _cast(saturated, img_array.dtype)
+    return result
+
+
+def _pil_kernel(img: np.ndarray, pil_filter) -> np.ndarray:
+    """A PIL ImageFilter.Kernel applied at the input bit depth."""
+    _, scale, offset, kernel = pil_filter.filterargs
+    kernel = np.asarray(kernel, dtype=np.float32).reshape(3, 3) / scale
+    filtered = cv2.filter2D(img.astype(np.float32, copy=False), -1, kernel)
+    if offset:
+        filtered += offset
+    return _cast(filtered, img.dtype)
+
+
+def apply_edge_enhance(img: Union[Image.Image, np.ndarray, str]) -> np.ndarray:
+    """
+    Enhance edges in the image.
+
+    Args:
+        img (PIL.Image, numpy.ndarray, or str): Input image
+
+    Returns:
+        numpy.ndarray: Edge-enhanced image in the input dtype
+    """
+    return _pil_kernel(ensure_array(img), ImageFilter.EDGE_ENHANCE)
+
+
+def apply_edge_detection(
+        img: Union[Image.Image, np.ndarray, str]) -> np.ndarray:
+    """
+    Detect edges in the image.
+
+    Args:
+        img (PIL.Image, numpy.ndarray, or str): Input image
+
+    Returns:
+        numpy.ndarray: Edge-detected image in the input dtype
+    """
+    return _pil_kernel(ensure_array(img), ImageFilter.FIND_EDGES)
+
+
+NATIVE_FUNCTIONS.update({
+    pil_filters.apply_grayscale: apply_grayscale,
+    pil_filters.apply_saturation: apply_saturation,
+    pil_filters.apply_edge_enhance: apply_edge_enhance,
+    pil_filters.apply_edge_detection: apply_edge_detection,
+    pil_filters.apply_gaussian_blur: apply_gaussian_blur,
+    pil_filters.apply_contrast_enhancement: apply_contrast_enhancement,
+    pil_filters.apply_texture_analysis: apply_texture_analysis,
+    pil_filters.apply_adaptive_threshold: apply_adaptive_threshold,
+    pil_filters.apply_sharpening: apply_sharpening,
+    pil_filters.apply_ridge_detection: apply_ridge_detection,
+    pil_filters.apply_crop: apply_crop,
+    pil_filters.otsu_thresholding: otsu_thresholding,
+    pil_filters.otsu_thresholding_no_mask: otsu_thresholding_no_mask,
+    # split_channels never went through PIL and already keeps the dtype
+    pil_filters.split_channels: pil_filters.split_channels,
+})
+
+
+def as_native(func: Callable) -> Callable:
+    """
+    Native-dtype counterpart of a filter, or the filter itself if it has none.
+    """
+    return NATIVE_FUNCTIONS.get(func, func)
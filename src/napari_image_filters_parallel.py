@@ -0,0 +1,125 @@
+"""
+Thread-pool execution of per-channel and per-frame filter loops
+
+OpenCV and SciPy release the GIL while they filter, so running the channels
+of an RGB image or the frames of a stack on a shared thread pool scales
+with the number of cores without copying data to other processes.
+
+The worker count is a module wide setting, changed with set_worker_count
+(the filter widget exposes it as a spin box). With a single worker every
+loop runs inline on the calling thread.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, local
+from typing import Callable, Iterable, List, Optional
+import numpy as np
+
+# default number of threads: one per core
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+_worker_count = DEFAULT_WORKERS
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = Lock()
+
+# marks pool threads, so nested loops (the channels of each frame of a
+# stack) run inline instead of waiting on the pool they are running on
+_pool_thread = local()
+
+
+def get_worker_count() -> int:
+    """Number of threads used for channel and frame loops."""
+    return _worker_count
+
+
+def set_worker_count(workers: int):
+    """
+    Set the number of threads used for channel and frame loops.
+
+    Args:
+        workers (int): Number of threads, 1 runs loops inline
+
+    Raises:
+        ValueError: If workers is smaller than 1
+    """
+    global _worker_count, _executor
+    if workers < 1:
+        raise ValueError(f"Worker count must be at least 1, got {workers}")
+
+    with _executor_lock:
+        if workers == _worker_count:
+            return
+        _worker_count = workers
+        # running tasks finish on the old pool, new ones go to a new pool
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """The shared thread pool, created on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_worker_count,
+                thread_name_prefix="image-filters")
+        return _executor
+
+
+def parallel_map(func: Callable, items: Iterable) -> List:
+    """
+    Call func on every item on the thread pool, keeping the item order.
+    Exceptions raised by func are re-raised in the calling thread. Called
+    from a task already running on the pool, the items run inline.
+
+    Args:
+        func (callable): Function of a single item
+        items (iterable): Items, e.g. channel or frame indices
+
+    Returns:
+        list: Results in the order of items
+    """
+    items = list(items)
+    if _worker_count == 1 or len(items) <= 1 or \
+            getattr(_pool_thread, "active", False):
+        return [func(item) for item in items]
+
+    def run(item):
+        _pool_thread.active = True
+        try:
+            return func(item)
+        finally:
+            _pool_thread.active = False
+
+    return list(get_executor().map(run, items))
+
+
+def map_slices(func: Callable, array: np.ndarray, axis: int = 0,
+               out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Apply func to every slice of array along axis in parallel, writing each
+    result into the matching slice of out.
+
+    Args:
+        func (callable): Function of a single slice, returning an array of
+            the same shape as the slice
+        array (numpy.ndarray): Input array
+        axis (int): Axis to iterate over, e.g. 0 for frames, -1 for channels
+        out (numpy.ndarray, optional): Output buffer, allocated like array
+            if not given
+
+    Returns:
+        numpy.ndarray: The output buffer
+    """
+    if out is None:
+        out = np.empty_like(array)
+    src = np.moveaxis(array, axis, 0)
+    dst = np.moveaxis(out, axis, 0)
+
+    def run(i):
+        dst[i] = func(src[i])
+
+    parallel_map(run, range(src.shape[0]))
+    return out
@@ -0,0 +1,362 @@
+"""
+Stack-aware execution of the image filters
+
+The functions in napari_image_filters.py handle a single image. Time-lapse
+and z-stack layers hold hundreds of frames along a leading N axis, and
+calling a filter frame by frame from Python is slow. This module runs a
+filter over the whole N x H x W (x C) stack in one vectorized call where
+the filter allows it, and falls back to a batched frame loop writing into
+a preallocated output otherwise. Frame loops run on the shared thread pool
+of napari_image_filters_parallel.
+
+For every filter f and stack s, apply_stack(f, s)[i] equals f(s[i]).
+"""
+
+from typing import Callable, Dict, Tuple, Union
+import numpy as np
+import cv2
+from PIL import ImageFilter
+from scipy import ndimage
+
+from .napari_image_filters import (
+    apply_grayscale, apply_saturation,
+    apply_edge_enhance, apply_edge_detection,
+    apply_gaussian_blur, apply_contrast_enhancement,
+    apply_texture_analysis, apply_adaptive_threshold,
+    apply_sharpening, apply_ridge_detection, apply_crop,
+    otsu_thresholding, otsu_thresholding_no_mask, split_channels,
+    channel_views
+)
+from .napari_image_filters_lbp import local_binary_pattern_uniform
+from .napari_image_filters_parallel import map_slices, parallel_map
+
+# maps a single image filter to its vectorized stack implementation
+STACK_FUNCTIONS: Dict[Callable, Callable] = {}
+
+
+def is_stack(data: np.ndarray) -> bool:
+    """
+    Whether layer data is a stack of images (N x H x W or N x H x W x C)
+    rather than a single grayscale or RGB(A) image.
+    """
+    return data.ndim == 4 or (
+        data.ndim == 3 and data.shape[-1] not in [1, 3, 4])
+
+
+def _is_rgb_stack(stack: np.ndarray) -> bool:
+    return stack.ndim == 4 and stack.shape[-1] == 3
+
+
+def _is_gray_stack(stack: np.ndarray) -> bool:
+    return stack.ndim == 3
+
+
+def _pil_layout(stack: np.ndarray) -> np.ndarray:
+    """
+    Cast and reshape a stack the same way ensure_pil_image treats a single
+    frame: uint8, single channel frames squeezed, extra channels dropped.
+    """
+    stack = stack.astype(np.uint8)
+    if stack.ndim == 4:
+        if stack.shape[-1] == 1:
+            return stack[..., 0]
+        if stack.shape[-1] not in (3, 4):
+            return stack[..., :3]
+    return stack
+
+
+def _luminance(stack: np.ndarray) -> np.ndarray:
+    """
+    ITU-R 601-2 luma transform with the same fixed point arithmetic as
+    PIL's convert("L"), so results are bit identical.
+    """
+    rgb = stack[..., :3].astype(np.uint32)
+    luma = (rgb[..., 0] * 19595 + rgb[..., 1] * 38470 +
+            rgb[..., 2] * 7471 + 0x8000) >> 16
+    return luma.astype(np.uint8)
+
+
+def _frame_kernel(kernel: np.ndarray, stack: np.ndarray) -> np.ndarray:
+    """Lift a 2D kernel so it does not mix frames or channels."""
+    kernel = kernel[np.newaxis]
+    if _is_rgb_stack(stack):
+        kernel = kernel[..., np.newaxis]
+    return kernel
+
+
+def apply_stack(
+    func: Callable, stack: np.ndarray, *args, **kwargs
+) -> Union[np.ndarray, Tuple[np.ndarray, ...]]:
+    """
+    Apply an image filter to every frame of a stack.
+
+    Args:
+        func (callable): Any single image filter, e.g. from IMG_FUNCTIONS
+        stack (numpy.ndarray): N x H x W or N x H x W x C image stack
+        *args, **kwargs: Extra arguments passed to the filter
+
+    Returns:
+        numpy.ndarray: Filtered stack with the same leading dimension, or a
+            tuple of stacks for filters returning several images
+
+    Raises:
+        ValueError: If the input is not a stack of images
+    """
+    stack = np.asarray(stack)
+    if stack.ndim not in (3, 4):
+        raise ValueError(
+            f"Expected an N x H x W (x C) stack, got shape {stack.shape}")
+
+    stack_func = STACK_FUNCTIONS.get(func)
+    if stack_func is not None:
+        result = stack_func(stack, *args, **kwargs)
+        if result is not None:
+            return result
+
+    return _apply_per_frame(func, stack, *args, **kwargs)
+
+
+def _apply_per_frame(func: Callable, stack: np.ndarray, *args, **kwargs):
+    """
+    Batched fallback: run the filter on each frame, writing straight into a
+    preallocated output instead of stacking a list of results. The first
+    frame gives the output shape, the others run on the thread pool.
+    """
+    first = func(stack[0], *args, **kwargs)
+
+    if isinstance(first, tuple):
+        outputs = tuple(
+            np.empty((len(stack),) + np.shape(part), np.asarray(part).dtype)
+            for part in first)
+        for out, part in zip(outputs, first):
+            out[0] = part
+
+        def run_parts(i):
+            for out, part in zip(outputs, func(stack[i], *args, **kwargs)):
+                out[i] = part
+
+        parallel_map(run_parts, range(1, len(stack)))
+        return outputs
+
+    first = np.asarray(first)
+    output = np.empty((len(stack),) + first.shape, first.dtype)
+    output[0] = first
+
+    def run(i):
+        output[i] = func(stack[i], *args, **kwargs)
+
+    parallel_map(run, range(1, len(stack)))
+    return output
+
+
+def _stack_gaussian_blur(stack: np.ndarray, radius: float = 2.0):
+    if radius < 0:
+        raise ValueError
+    stack = _pil_layout(stack)
+    # frames are blurred in parallel, sigma 0 leaves the channel axis as is
+    sigma = [radius, radius] + [0] * (stack.ndim - 3)
+    return map_slices(
+        lambda frame: ndimage.gaussian_filter(frame, sigma=sigma), stack)
+
+
+def _stack_grayscale(stack: np.ndarray):
+    gray = _pil_layout(stack)
+    if not _is_gray_stack(gray):
+        gray = _luminance(gray)
+
+    # 3D frames keep their channel axis, like apply_grayscale
+    if stack.ndim == 4:
+        return gray[..., np.newaxis]
+    return gray
+
+
+def _stack_saturation(stack: np.ndarray, saturation_level: float):
+    if saturation_level < 0:
+        raise ValueError
+    stack = _pil_layout(stack)
+    if _is_gray_stack(stack):
+        return stack
+    if not _is_rgb_stack(stack):
+        return None
+
+    # PIL's ImageEnhance.Color blends towards the luma image in float and
+    # truncates, which this mirrors exactly
+    gray = _luminance(stack)[..., np.newaxis].astype(np.float32)
+    blended = gray + np.float32(saturation_level) * (
+        stack.astype(np.float32) - gray)
+    return np.clip(blended, 0, 255).astype(np.uint8)
+
+
+def _stack_pil_kernel(stack: np.ndarray, pil_filter) -> np.ndarray:
+    """Vectorized equivalent of a 3x3 PIL ImageFilter.Kernel."""
+    stack = _pil_layout(stack)
+    if not (_is_gray_stack(stack) or _is_rgb_stack(stack)):
+        return None
+
+    _, scale, offset, kernel = pil_filter.filterargs
+    kernel = np.asarray(kernel, dtype=np.float32).reshape(3, 3)
+    filtered = ndimage.correlate(
+        stack.astype(np.float32), _frame_kernel(kernel, stack))
+    filtered = np.floor(filtered / scale + offset + 0.5)
+
+    output = np.clip(filtered, 0, 255).astype(np.uint8)
+    # PIL leaves the one pixel border unfiltered
+    output[:, 0] = stack[:, 0]
+    output[:, -1] = stack[:, -1]
+    output[:, :, 0] = stack[:, :, 0]
+    output[:, :, -1] = stack[:, :, -1]
+    return output
+
+
+def _stack_edge_enhance(stack: np.ndarray):
+    return _stack_pil_kernel(stack, ImageFilter.EDGE_ENHANCE)
+
+
+def _stack_edge_detection(stack: np.ndarray):
+    return _stack_pil_kernel(stack, ImageFilter.FIND_EDGES)
+
+
+def _stack_convolve(stack: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """Same as cv2.filter2D with its default reflect-101 border."""
+    stack = _pil_layout(stack)
+    if not (_is_gray_stack(stack) or _is_rgb_stack(stack)):
+        return None
+    filtered = ndimage.correlate(
+        stack.astype(np.float32),
+        _frame_kernel(kernel.astype(np.float32), stack),
+        mode="mirror")
+    return np.clip(filtered, 0, 255).astype(np.uint8)
+
+
+def _stack_sharpening(stack: np.ndarray):
+    return _stack_convolve(stack, np.array([
+        [0, -1, 0],
+        [-1, 5, -1],
+        [0, -1, 0]
+    ]))
+
+
+def _stack_ridge_detection(stack: np.ndarray):
+    return _stack_convolve(stack, np.array([
+        [-1, -1, -1],
+        [-1, 9, -1],
+        [-1, -1, -1]
+    ]))
+
+
+def _stack_crop(stack: np.ndarray, corners: Tuple[int, int, int, int]):
+    if any(val < 0 for val in corners):
+        raise Exception("Coordinates cannot be negative")
+
+    height, width = stack.shape[1:3]
+    if (
+        corners[0] > width
+        or corners[2] > width
+        or corners[1] > height
+        or corners[3] > height
+    ):
+        raise Exception("Coordinates exceed image dimensions")
+
+    left, upper, right, lower = corners
+    return _pil_layout(stack[:, upper:lower, left:right])
+
+
+def _stack_otsu(stack: np.ndarray, opening: bool):
+    stack = stack.astype(np.uint16)
+    if _is_rgb_stack(stack):
+        stack = _rgb2gray_stack(stack)
+    elif not _is_gray_stack(stack):
+        return None
+
+    # The threshold is a per frame statistic, so it is computed frame by
+    # frame, in parallel, straight into the output buffer
+    thresholded = np.empty_like(stack)
+
+    def threshold_frame(i):
+        cv2.threshold(stack[i], 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU,
+                      dst=thresholded[i])
+
+    parallel_map(threshold_frame, range(len(stack)))
+
+    if not opening:
+        return thresholded
+
+    # cleaning is a single batched morphological opening over all frames
+    return ndimage.grey_opening(thresholded, size=(1, 5, 5))
+
+
+def _rgb2gray_stack(stack: np.ndarray) -> np.ndarray:
+    """cv2.COLOR_RGB2GRAY over a whole stack in one call."""
+    n, height, width, _ = stack.shape
+    gray = cv2.cvtColor(
+        np.ascontiguousarray(stack).reshape(n * height, width, 3),
+        cv2.COLOR_RGB2GRAY)
+    return gray.reshape(n, height, width)
+
+
+def _stack_otsu_thresholding(stack: np.ndarray):
+    return _stack_otsu(stack, opening=True)
+
+
+def _stack_otsu_thresholding_no_mask(stack: np.ndarray):
+    if stack.ndim != 3:
+        return None
+    return _stack_otsu(stack, opening=False)
+
+
+def _stack_texture_analysis(
+        stack: np.ndarray, radius: int = 3, n_points: int = 8):
+    frames = _pil_layout(stack)
+    gray = frames
+    if not _is_gray_stack(frames):
+        if frames.shape[-1] not in (3, 4):
+            return None
+        gray = _luminance(frames)
+
+    # one LBP pass over all frames, normalized with the min and max codes
+    # of each frame through a per frame table of the n_points + 2 codes
+    lbp = local_binary_pattern_uniform(gray, n_points, radius)
+    low = lbp.min(axis=(1, 2)).astype(np.int64)[:, np.newaxis]
+    high = lbp.max(axis=(1, 2)).astype(np.float64)[:, np.newaxis]
+    levels = ((np.arange(n_points + 2) - low) *
+              (255.0 / (high - low))).astype(np.uint8)
+    normalized = np.take_along_axis(
+        levels, lbp.reshape(len(lbp), -1), axis=1).reshape(lbp.shape)
+
+    # RGB(A) frames keep a channel axis, like apply_texture_analysis
+    if frames.ndim == 4:
+        return normalized[..., np.newaxis]
+    return normalized
+
+
+def _stack_split_channels(stack: np.ndarray):
+    if stack.ndim != 4 or stack.shape[-1] < 3:
+        # let the frame loop report the error of split_channels
+        return None
+    # same copy and zero as split_channels, so an alpha channel is kept
+    channels = []
+    for zeroed in ([0, 1], [0, 2], [1, 2]):
+        channel = stack.copy()
+        channel[..., zeroed] = 0
+        channels.append(channel)
+    return tuple(channels)
+
+
+STACK_FUNCTIONS.update({
+    apply_gaussian_blur: _stack_gaussian_blur,
+    apply_grayscale: _stack_grayscale,
+    apply_saturation: _stack_saturation,
+    apply_edge_enhance: _stack_edge_enhance,
+    apply_edge_detection: _stack_edge_detection,
+    apply_sharpening: _stack_sharpening,
+    apply_ridge_detection: _stack_ridge_detection,
+    apply_crop: _stack_crop,
+    otsu_thresholding: _stack_otsu_thresholding,
+    otsu_thresholding_no_mask: _stack_otsu_thresholding_no_mask,
+    split_channels: _stack_split_channels,
+    apply_texture_analysis: _stack_texture_analysis,
+    # views of the channels of every frame at once
+    channel_views: channel_views,
+    # CLAHE and adaptive thresholding depend on per frame statistics and
+    # use the batched frame loop
+})
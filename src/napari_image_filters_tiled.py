@@ -0,0 +1,389 @@
+"""
+Tiled execution of the image filters for images larger than memory
+
+Slide scans are loaded into napari as dask or zarr backed layers, and
+copying such a layer into a NumPy array materializes the whole image.
+apply_tiled instead returns a lazy dask array: each output tile is only
+computed when napari (or a write to disk) asks for it, by reading the
+matching input tile plus a halo large enough for the filter's kernel.
+
+Halos are looked up by filter name in FILTER_HALOS, so the PIL based and
+the native-dtype filters share them. Filters depending on global image
+statistics get a tiled variant in TILED_FUNCTIONS. CLAHE runs with a fixed
+tile size in pixels (CLAHE_TILE_SIZE) on chunks aligned to it, so that
+neighbouring chunks share the same CLAHE tiles and agree across seams.
+
+Multiscale layers (pyramids) are filtered at full resolution, level 0.
+"""
+
+import inspect
+from collections.abc import Sequence
+from itertools import product
+from functools import partial
+from threading import Lock
+from typing import Callable, Dict, List, Tuple, Union
+import numpy as np
+import cv2
+import dask.array as da
+
+from .napari_image_filters import ensure_pil_image, sanitize_dimensional_image
+from .napari_image_filters_lbp import local_binary_pattern_uniform
+from .napari_image_filters_stack import apply_stack, is_stack
+
+# default edge length of the tiles an image is processed in
+DEFAULT_TILE_SIZE = 2048
+
+# halo for filters without an entry in FILTER_HALOS
+DEFAULT_HALO = 32
+
+# edge length in pixels of the CLAHE tiles used for tiled execution
+CLAHE_TILE_SIZE = 64
+
+# filters changing the image shape, which cannot be computed tile by tile
+SHAPE_CHANGING_FUNCTIONS = ["apply_crop"]
+
+
+def is_multiscale(data) -> bool:
+    """Whether layer data is a multiscale pyramid (a sequence of levels)."""
+    return isinstance(data, Sequence)
+
+
+def is_lazy_array(data) -> bool:
+    """
+    Whether layer data is read lazily (a dask or zarr array, or a multiscale
+    pyramid of them) instead of being held in memory.
+    """
+    if is_multiscale(data):
+        return True
+    if isinstance(data, da.Array):
+        return True
+    # zarr is optional, its arrays are recognised without importing it
+    return type(data).__module__.split(".")[0] == "zarr"
+
+
+def full_resolution(data):
+    """Level 0 of multiscale layer data, other data as is."""
+    if is_multiscale(data):
+        return data[0]
+    return data
+
+
+def _gaussian_halo(tile_shape, radius: float = 2.0, **_) -> int:
+    # scipy truncates the kernel at 4 sigma
+    return int(4.0 * radius + 0.5)
+
+
+def _clahe_halo(tile_shape, tile_pixels: int = None, **_) -> int:
+    # pixels interpolate between their own and the neighbouring CLAHE tile
+    return tile_pixels or CLAHE_TILE_SIZE
+
+
+def _texture_halo(tile_shape, radius: int = 3, **_) -> int:
+    # sampling points are bilinearly interpolated around the radius
+    return int(np.ceil(radius)) + 1
+
+
+def _adaptive_threshold_halo(tile_shape, block_size: int = 11, **_) -> int:
+    return block_size // 2
+
+
+# maps a filter name to a function of (tile_shape, **filter kwargs) giving
+# the number of pixels each tile must be extended by on every side
+FILTER_HALOS: Dict[str, Callable[..., int]] = {
+    "apply_grayscale": lambda tile_shape, **_: 0,
+    "apply_saturation": lambda tile_shape, **_: 0,
+    "apply_crop": lambda tile_shape, **_: 0,
+    "split_channels": lambda tile_shape, **_: 0,
+    "otsu_thresholding_no_mask": lambda tile_shape, **_: 0,
+    # 5x5 opening: an erosion and a dilation of 2 pixels each
+    "otsu_thresholding": lambda tile_shape, **_: 4,
+    # 3x3 kernels
+    "apply_edge_enhance": lambda tile_shape, **_: 1,
+    "apply_edge_detection": lambda tile_shape, **_: 1,
+    "apply_sharpening": lambda tile_shape, **_: 1,
+    "apply_ridge_detection": lambda tile_shape, **_: 1,
+    "apply_gaussian_blur": _gaussian_halo,
+    "apply_contrast_enhancement": _clahe_halo,
+    "apply_texture_analysis": _texture_halo,
+    "apply_adaptive_threshold": _adaptive_threshold_halo,
+}
+
+
+def _filter_kwargs(func: Callable, args: tuple, kwargs: dict) -> dict:
+    """Named arguments of a filter call, defaults included."""
+    try:
+        bound = inspect.signature(func).bind(None, *args, **kwargs)
+    except (TypeError, ValueError):
+        return dict(kwargs)
+    bound.apply_defaults()
+    # drop the image argument
+    return dict(list(bound.arguments.items())[1:])
+
+
+def filter_halo(func: Callable, tile_shape: Tuple[int, int],
+                *args, **kwargs) -> int:
+    """
+    Number of pixels a tile has to be extended by for func to give the same
+    result in the tile as on the whole image.
+
+    Args:
+        func (callable): Filter function
+        tile_shape (tuple): Height and width of the tiles
+        *args, **kwargs: Arguments the filter is called with
+
+    Returns:
+        int: Halo in pixels
+    """
+    halo = FILTER_HALOS.get(getattr(func, "__name__", ""))
+    if halo is None:
+        return DEFAULT_HALO
+    return halo(tile_shape, **_filter_kwargs(func, args, kwargs))
+
+
+def _tile_texture_analysis(
+        img: np.ndarray, radius: int = 3, n_points: int = 8) -> np.ndarray:
+    """
+    apply_texture_analysis normalized with the fixed range of uniform LBP
+    codes, 0 to n_points + 1, instead of the min and max of the tile.
+    """
+    input_array = np.asarray(img)
+    gray_img = sanitize_dimensional_image(ensure_pil_image(img))
+    if gray_img.dtype.kind == "f":
+        gray_img = (gray_img * 255).clip(0, 255).astype(np.uint8)
+    elif gray_img.dtype != np.uint8:
+        gray_img = gray_img.astype(np.uint8)
+
+    lbp = local_binary_pattern_uniform(gray_img, n_points, radius)
+    levels = (np.arange(n_points + 2) * (255.0 / (n_points + 1)))
+    lbp_normalized = levels.astype(np.uint8)[lbp]
+
+    if input_array.ndim == 3:
+        return lbp_normalized[..., np.newaxis]
+    return lbp_normalized
+
+
+# filters whose tiles need a different function than the whole image
+TILED_FUNCTIONS: Dict[str, Callable] = {
+    "apply_texture_analysis": _tile_texture_analysis,
+}
+
+# arguments tiles are filtered with, and the pixel multiple chunks must
+# start at for tiles to line up with the whole image
+TILED_KWARGS: Dict[str, dict] = {
+    "apply_contrast_enhancement": {"tile_pixels": CLAHE_TILE_SIZE},
+}
+TILE_ALIGNMENT: Dict[str, int] = {
+    "apply_contrast_enhancement": CLAHE_TILE_SIZE,
+}
+
+
+def _otsu_gray(img: np.ndarray) -> np.ndarray:
+    """The uint16 grayscale image otsu_thresholding thresholds."""
+    img = img.astype(np.uint16)
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+    return img
+
+
+def _otsu_from_histogram(hist: np.ndarray) -> int:
+    """Otsu's threshold from a histogram: foreground is value > threshold."""
+    levels = np.arange(len(hist), dtype=np.float64)
+    weight_bg = np.cumsum(hist, dtype=np.float64)
+    weight_fg = weight_bg[-1] - weight_bg
+    sum_bg = np.cumsum(hist * levels)
+    sum_fg = sum_bg[-1] - sum_bg
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_bg = sum_bg / weight_bg
+        mean_fg = sum_fg / weight_fg
+        between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.nanargmax(between))
+
+
+def _tile_slices(shape: Tuple[int, int], tile_size: int):
+    for y, x in product(range(0, shape[0], tile_size),
+                        range(0, shape[1], tile_size)):
+        yield slice(y, y + tile_size), slice(x, x + tile_size)
+
+
+def _global_otsu_threshold(source, lead: int, tile_size: int):
+    """
+    Per image Otsu thresholds, from histograms streamed tile by tile.
+    Returns a scalar for single images and one threshold per frame for
+    stacks.
+    """
+    frames = range(source.shape[0]) if lead else [None]
+    thresholds = []
+    for frame in frames:
+        prefix = () if frame is None else (frame,)
+        hist = np.zeros(65536, np.int64)
+        for ys, xs in _tile_slices(source.shape[lead:lead + 2], tile_size):
+            tile = _otsu_gray(np.asarray(source[prefix + (ys, xs)]))
+            hist += np.bincount(tile.ravel(), minlength=65536)
+        thresholds.append(_otsu_from_histogram(hist))
+    return thresholds if lead else thresholds[0]
+
+
+class _DeferredThreshold():
+    """
+    The global Otsu threshold, computed by the first tile that needs it and
+    then shared by all tiles. This keeps the full pass over the image out
+    of apply_tiled (and the Qt thread calling it).
+    """
+
+    def __init__(self, source, lead: int, tile_size: int):
+        self.args = (source, lead, tile_size)
+        self.value = None
+        self.lock = Lock()
+
+    def get(self):
+        with self.lock:
+            if self.value is None:
+                self.value = _global_otsu_threshold(*self.args)
+            return self.value
+
+
+def _threshold_tile(img: np.ndarray, threshold, opening: bool):
+    thresholded = np.where(_otsu_gray(img) > threshold, 255, 0).astype(
+        np.uint16)
+    if opening:
+        kernel = np.ones((5, 5), np.uint8)
+        thresholded = cv2.morphologyEx(thresholded, cv2.MORPH_OPEN, kernel)
+    return thresholded
+
+
+def _threshold_stack(stack: np.ndarray, thresholds: List[int],
+                     frames: slice, opening: bool):
+    return np.stack([
+        _threshold_tile(frame, threshold, opening)
+        for frame, threshold in zip(stack, thresholds[frames])])
+
+
+def apply_tiled(
+    func: Callable, data, *args, tile_size: int = DEFAULT_TILE_SIZE, **kwargs
+) -> Union[da.Array, Tuple[da.Array, ...]]:
+    """
+    Lazily apply a filter tile by tile with overlapping halos.
+
+    Otsu thresholding needs the histogram of the whole image (of each frame
+    for stacks). It is streamed over all tiles once, when the first output
+    tile is computed, not when apply_tiled is called.
+
+    Filters returning several images run once per tile for all of them;
+    computing the returned arrays together (e.g. with dask.compute) reads
+    every tile once.
+
+    Args:
+        func (callable): Image filter, PIL based or native-dtype
+        data: Image or stack; NumPy, dask, zarr or any sliceable array, or a
+            multiscale pyramid of them (filtered at level 0)
+        tile_size (int): Edge length of the output tiles
+        *args, **kwargs: Extra arguments passed to the filter
+
+    Returns:
+        dask.array.Array: Lazily computed result, or a tuple of them for
+            filters returning several images
+
+    Raises:
+        ValueError: For filters changing the image shape, e.g. cropping
+    """
+    name = getattr(func, "__name__", "")
+    if name in SHAPE_CHANGING_FUNCTIONS:
+        raise ValueError(
+            f"{name} changes the image shape and cannot run tile by tile")
+
+    data = full_resolution(data)
+    lead = 1 if is_stack(data) else 0
+    height, width = data.shape[lead:lead + 2]
+
+    # chunks start at multiples of the alignment some filters need
+    alignment = TILE_ALIGNMENT.get(name, 1)
+    tile_size = -(-tile_size // alignment) * alignment
+    kwargs = {**TILED_KWARGS.get(name, {}), **kwargs}
+
+    tile_shape = (min(tile_size, height), min(tile_size, width))
+    halo = filter_halo(func, tile_shape, *args, **kwargs)
+    halo = -(-halo // alignment) * alignment
+
+    if name in ("otsu_thresholding", "otsu_thresholding_no_mask"):
+        # the threshold is a global statistic, found in a streaming pass
+        threshold = _DeferredThreshold(data, lead, tile_size)
+        opening = name == "otsu_thresholding"
+
+        def run(tile, frames, sample=False):
+            # the sample tile only determines the output dtype and shape
+            value = ([0] * data.shape[0] if lead else 0) if sample \
+                else threshold.get()
+            if lead:
+                return _threshold_stack(tile, value, frames, opening)
+            return _threshold_tile(tile, value, opening)
+    else:
+        tile_func = TILED_FUNCTIONS.get(name, func)
+        if lead:
+            tile_func = partial(apply_stack, tile_func)
+
+        def run(tile, frames, sample=False):
+            return tile_func(tile, *args, **kwargs)
+
+    def read_tile(location):
+        """Input tile with halo, and the slice of the output to keep."""
+        (y0, y1), (x0, x1) = location[lead:lead + 2]
+        ya, yb = max(y0 - halo, 0), min(y1 + halo, height)
+        xa, xb = max(x0 - halo, 0), min(x1 + halo, width)
+
+        index = (slice(ya, yb), slice(xa, xb))
+        frames = slice(*location[0]) if lead else None
+        if lead:
+            index = (frames,) + index
+        tile = np.asarray(data[index])
+
+        keep = (slice(y0 - ya, y1 - ya), slice(x0 - xa, x1 - xa))
+        if lead:
+            keep = (slice(None),) + keep
+        return tile, keep, frames
+
+    def keep_result(result, keep):
+        if isinstance(result, tuple):
+            # several images are stacked along a new first axis
+            return np.stack([np.asarray(part)[keep] for part in result])
+        return np.asarray(result)[keep]
+
+    def filter_tile(location):
+        tile, keep, frames = read_tile(location)
+        return keep_result(run(tile, frames), keep)
+
+    # chunk grid of the output: frames one by one, then spatial tiles
+    chunks = tuple(
+        tuple(min(tile_size, size - start)
+              for start in range(0, size, tile_size))
+        for size in (height, width))
+    if lead:
+        chunks = ((1,) * data.shape[0],) + chunks
+
+    # a small corner of the image gives the output dtype and channels
+    sample_location = [(0, 1)] * lead + [
+        (0, min(height, 2 * halo + 16)), (0, min(width, 2 * halo + 16))]
+    tile, keep, frames = read_tile(sample_location)
+    sample_result = run(tile, frames, sample=True)
+    parts = len(sample_result) if isinstance(sample_result, tuple) else 0
+    sample = keep_result(sample_result, keep)
+
+    # the parts axis of filters returning several images comes first
+    spatial = len(chunks)
+    if parts:
+        chunks = ((parts,),) + chunks
+    tail = sample.shape[len(chunks):]
+
+    def block(block_info=None):
+        location = block_info[None]["array-location"]
+        return filter_tile(location[int(bool(parts)):][:spatial])
+
+    result = da.map_blocks(
+        block,
+        dtype=sample.dtype,
+        chunks=chunks + tuple((size,) for size in tail),
+        meta=np.empty((0,) * (len(chunks) + len(tail)), sample.dtype))
+
+    if parts:
+        return tuple(result[part] for part in range(parts))
+    return result
@@ -1,10 +1,17 @@
 from cellpose.denoise import DenoiseModel
 from cellpose.models import Cellpose, CellposeModel
 import numpy as np
+import dask
+import dask.array as da
 from functools import partial
+import hashlib
+import inspect
+import json
 import pickle
-from typing import Callable, Dict, List, Tuple
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Tuple
 from qtpy.QtWidgets import (
+    QCheckBox,
     QFileDialog,
     QInputDialog,
     QLabel,
@@ -18,12 +25,36 @@ from qtpy.QtWidgets import (
 # pipeline system without needing a rewrite
 
 from .utils import DropdownPopup
+from . import napari_image_filters
+from .napari_image_filters import (
+    GRAYSCALE_INPUT_FUNCTIONS, MULTI_LAYER_FUNCTIONS, to_grayscale_input
+)
+from .napari_image_filters_cache import ResultCache, array_digest
+from .napari_image_filters_stack import apply_stack, is_stack
+from .pipelines_profile import PipelineProfile, PipelineProfiler
+from .napari_image_filters_tiled import (
+    apply_tiled, full_resolution, is_lazy_array
+)
+
+# declarative pipeline files, see Pipeline.to_dict; the version is bumped
+# whenever a reader of an older version would misread a new file
+PIPELINE_FORMAT = "air-pipeline"
+PIPELINE_FORMAT_VERSION = 1
+
+# model classes a pipeline can be saved with, by name
+MODEL_CLASSES = {
+    "Cellpose": Cellpose,
+    "CellposeModel": CellposeModel,
+    "DenoiseModel": DenoiseModel,
+}
 
 
 class Pipeline():
     # Pipeline() assumes that all functions which it stores take as input a Nxnxmx3 or Nxnxm numpy image array
     # N -> any number of images, so you should be able to pass 10 images, and
     # as long as theyre nxm it will output that many images too
+    # (napari_image_filters_stack.apply_stack runs any stored function over
+    # such a stack in one batched call)
     def __init__(self) -> None:
         self.pipeline: List[Callable] = []
         self._segModel: CellposeModel | Cellpose | None = None
@@ -37,6 +68,25 @@ class Pipeline():
     def add_func(self, func: Callable):
         self.pipeline.append(func)
 
+    def compile(self, resolve: Callable[[Callable], Callable] | None = None,
+                measure_memory: bool = False,
+                cache: ResultCache | None = None,
+                profile: bool = False):
+        """
+        Returns a CompiledPipeline which runs all steps back to back and only
+        keeps the final result.
+
+        Args:
+            resolve: maps a stored function to the implementation to run,
+                e.g. ImageFilterWidget._resolve_filter for native dtypes
+            measure_memory: trace runs with tracemalloc and keep a
+                PipelineMemoryReport
+            cache: keep the output of every stage, so runs after a step was
+                edited resume from the last unchanged stage
+            profile: record a PipelineProfile of every run
+        """
+        return CompiledPipeline(self, resolve, measure_memory, cache, profile)
+
     @property
     def filtModel(self):
         return self._filtModel
@@ -53,6 +103,14 @@ class Pipeline():
     def segModel(self, model: Cellpose | CellposeModel):
         self._segModel = model
 
+    def stream(self, data, resolve: Callable[[Callable], Callable] | None = None,
+               out=None):
+        """
+        Run the pipeline one frame of a stack at a time, see
+        CompiledPipeline.stream.
+        """
+        return self.compile(resolve).stream(data, out)
+
     def __len__(self):
         return len(self.pipeline)
 
@@ -71,6 +129,76 @@ class Pipeline():
     def __repr__(self):
         return f"pipeline {self.name=}, {self.pipeline=}"
 
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Declarative form of the pipeline: step names with their arguments
+        and the models as constructor arguments, JSON compatible. Nothing
+        is pickled, so it can be hashed, stored and sent to other processes.
+
+        Raises:
+            ValueError: If a step is not a filter of napari_image_filters
+                (e.g. a lambda) or has arguments JSON cannot hold
+        """
+        return {
+            "format": PIPELINE_FORMAT,
+            "version": PIPELINE_FORMAT_VERSION,
+            "name": self.name,
+            "steps": [_step_to_dict(func) for func in self.pipeline],
+            "segModel": _model_to_dict(self.segModel),
+            "filtModel": _model_to_dict(self.filtModel),
+        }
+
+    @classmethod
+    def from_dict(cls, spec: Dict[str, Any],
+                  load_models: bool = True) -> "Pipeline":
+        """
+        Build a pipeline from its declarative form.
+
+        Args:
+            spec (dict): Output of to_dict, possibly of an older version
+            load_models (bool): Create the models, which loads their
+                weights; without, segModel and filtModel stay None
+
+        Raises:
+            ValueError: If spec is not a pipeline, is of a newer version or
+                names an unknown step or model
+        """
+        if not isinstance(spec, dict) or spec.get("format") != PIPELINE_FORMAT:
+            raise ValueError("not a pipeline")
+        version = spec.get("version")
+        if not isinstance(version, int) or version > PIPELINE_FORMAT_VERSION:
+            raise ValueError(
+                f"pipeline format version {version} is not supported, "
+                f"the newest known is {PIPELINE_FORMAT_VERSION}")
+
+        pipeline = cls()
+        pipeline.name = spec.get("name", "")
+        for step in spec.get("steps", []):
+            pipeline.add_func(_step_from_dict(step))
+        if load_models:
+            pipeline.segModel = _model_from_dict(spec.get("segModel"))
+            pipeline.filtModel = _model_from_dict(spec.get("filtModel"))
+        return pipeline
+
+    def to_json(self) -> str:
+        """The declarative form as JSON text."""
+        return json.dumps(self.to_dict(), indent=2)
+
+    @classmethod
+    def from_json(cls, text: str, load_models: bool = True) -> "Pipeline":
+        """Build a pipeline from to_json text, see from_dict."""
+        return cls.from_dict(json.loads(text), load_models)
+
+    def digest(self) -> str:
+        """
+        SHA-256 of the declarative form without the name, equal for
+        pipelines running the same steps and models.
+        """
+        spec = self.to_dict()
+        del spec["name"]
+        canonical = json.dumps(spec, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
     def __delitem__(self, name: str):
         for idx, func in enumerate(self):
             if func.__name__ == name:
@@ -78,6 +206,401 @@ class Pipeline():
                 break  # dont delete all the items with the same name
 
 
+def _json_value(value):
+    """value as plain JSON types, tuples become lists."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_json_value(item) for item in value]
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    raise ValueError(f"{value!r} cannot be saved in a pipeline")
+
+
+def _step_function(name: str) -> Callable:
+    """The filter of napari_image_filters called name."""
+    func = getattr(napari_image_filters, name, None)
+    if name.startswith("_") or not inspect.isfunction(func):
+        raise ValueError(f"unknown pipeline step {name!r}")
+    return func
+
+
+def _step_to_dict(func: Callable) -> Dict[str, Any]:
+    base = func.func if isinstance(func, partial) else func
+    name = getattr(base, "__name__", repr(base))
+    # native-dtype filters are saved under the name of the filter they
+    # stand in for, which resolves back to the PIL compatible one
+    _step_function(name)
+
+    args = {}
+    if isinstance(func, partial):
+        names = list(inspect.signature(base).parameters)[1:]
+        args.update(zip(names, func.args))
+        args.update(func.keywords)
+    return {"name": name,
+            "args": {key: _json_value(value) for key, value in args.items()}}
+
+
+def _step_from_dict(step: Dict[str, Any]) -> Callable:
+    func = _step_function(step["name"])
+    args = step.get("args") or {}
+    if not args:
+        return func
+    # same form as the steps ImageFilterWidget records
+    step_func = partial(func, **args)
+    step_func.__name__ = func.__name__
+    return step_func
+
+
+def _model_to_dict(model) -> Dict[str, Any] | None:
+    """Constructor arguments recreating model."""
+    if model is None:
+        return None
+    kind = type(model).__name__
+    if kind not in MODEL_CLASSES:
+        raise ValueError(f"{kind} models cannot be saved in a pipeline")
+
+    pretrained = getattr(model, "pretrained_model", None)
+    spec = {
+        "class": kind,
+        "gpu": bool(model.gpu),
+        "model_type": model.model_type,
+        "nchan": int(model.nchan),
+    }
+    if kind == "Cellpose":
+        spec["backbone"] = model.backbone
+    elif kind == "CellposeModel":
+        spec["pretrained_model"] = str(pretrained) if pretrained else None
+        spec["diam_mean"] = float(model.diam_mean)
+        spec["backbone"] = model.net_type.replace("cellpose_", "", 1)
+    else:
+        spec["pretrained_model"] = str(pretrained) if pretrained else None
+        spec["diam_mean"] = float(model.diam_mean)
+        spec["chan2"] = model.net_chan2 is not None
+    return spec
+
+
+def _model_from_dict(spec: Dict[str, Any] | None):
+    if spec is None:
+        return None
+    kwargs = dict(spec)
+    model_class = MODEL_CLASSES.get(kwargs.pop("class", None))
+    if model_class is None:
+        raise ValueError(f"unknown pipeline model {spec.get('class')!r}")
+    if kwargs.get("pretrained_model") is None:
+        kwargs.pop("pretrained_model", None)
+    return model_class(**kwargs)
+
+
+def save_pipeline(pipeline: Pipeline, path: str):
+    """Write the declarative form of pipeline to path as JSON."""
+    with open(path, "w") as fp:
+        fp.write(pipeline.to_json())
+
+
+def read_pipeline_spec(path: str) -> Dict[str, Any]:
+    """
+    Read the declarative form of a pipeline saved with save_pipeline, or
+    pickled by earlier versions, without creating its models.
+
+    Raises:
+        ValueError: If the file does not hold a pipeline
+    """
+    with open(path, "rb") as fp:
+        content = fp.read()
+    if content.startswith(b"\x80"):
+        pipeline = pickle.loads(content)
+        if not isinstance(pipeline, Pipeline):
+            raise ValueError(f"{path} is not a valid pipeline")
+        return pipeline.to_dict()
+    try:
+        return json.loads(content)
+    except ValueError:
+        raise ValueError(f"{path} is not a valid pipeline")
+
+
+def load_pipeline(path: str, load_models: bool = True) -> Pipeline:
+    """
+    Load a pipeline saved with save_pipeline, or pickled by earlier
+    versions. Steps are resolved by name to the filters and models are
+    created from their constructor arguments, in both cases.
+
+    Args:
+        path (str): Path of the saved pipeline
+        load_models (bool): Create the models, see Pipeline.from_dict
+
+    Raises:
+        ValueError: If the file does not hold a pipeline
+    """
+    return Pipeline.from_dict(read_pipeline_spec(path), load_models)
+
+
+class PipelineMemoryReport():
+    """
+    Measured peak memory of a compiled pipeline run, next to an estimate of
+    what replaying the same steps one by one through the filter widget keeps
+    alive (a history copy, a working copy and a new layer per step).
+    The replay figure is computed from the array sizes of the run, not
+    measured. The input image itself is not counted in either.
+    """
+
+    def __init__(self, peak_bytes: int, replay_bytes: int):
+        self.peak_bytes = peak_bytes
+        self.replay_bytes = replay_bytes
+
+    @property
+    def saved_bytes(self) -> int:
+        """Estimated saving, replay estimate minus measured peak."""
+        return max(self.replay_bytes - self.peak_bytes, 0)
+
+    def __repr__(self):
+        mb = 1024 ** 2
+        return (f"measured peak {self.peak_bytes / mb:.1f} MB, "
+                f"estimated step by step {self.replay_bytes / mb:.1f} MB, "
+                f"estimated saving {self.saved_bytes / mb:.1f} MB")
+
+
+def _check_output(out, shape: Tuple[int, ...]):
+    if tuple(out.shape) != tuple(shape):
+        raise ValueError(
+            f"output of shape {tuple(out.shape)} does not fit the result of "
+            f"shape {tuple(shape)}")
+
+
+class CompiledPipeline():
+    """
+    Fused execution of a Pipeline.
+    Steps run back to back without history copies or intermediate layers,
+    so every intermediate is freed as soon as the next step has consumed
+    it. Each step still allocates its own output: the filters have no
+    output argument to write into a reused buffer.
+
+    With measure_memory, runs are traced with tracemalloc (which slows
+    down every allocation) and self.report holds a PipelineMemoryReport.
+
+    With a cache, the output of every stage is stored under a key chained
+    from the hash of the input and the definitions of the steps up to it, so
+    only the input is ever hashed. A run resumes from the last stage whose
+    key is cached: after one step of a workflow was edited, the steps before
+    it are not run again. The cache's memory budget applies, least recently
+    used stages are evicted first. Runs of lazily backed data and measured
+    runs do not use the cache. self.reused_steps counts the steps the last
+    run skipped.
+
+    With profile, every step of a run is timed and measured and
+    self.profile holds the PipelineProfile; profiled runs run every step,
+    without the cache or a memory report.
+
+    stream runs stacks frame by frame instead, so peak memory does not grow
+    with the number of frames.
+    """
+
+    def __init__(self, pipeline: Pipeline,
+                 resolve: Callable[[Callable], Callable] | None = None,
+                 measure_memory: bool = False,
+                 cache: ResultCache | None = None,
+                 profile: bool = False):
+        if any(func in pipeline for func in MULTI_LAYER_FUNCTIONS):
+            raise ValueError(
+                "Splitting channels creates several layers and cannot be "
+                "compiled")
+        self.pipeline = pipeline
+        self.resolve = resolve if resolve is not None else (lambda f: f)
+        self.measure_memory = measure_memory
+        self.cache = cache
+        self.report: PipelineMemoryReport | None = None
+        self.reused_steps = 0
+        self.profile_stages = profile
+        self.profile: PipelineProfile | None = None
+
+    def _run_step(self, func: Callable, data, lazy: bool = False):
+        impl = self.resolve(func)
+
+        # same preprocessing as ImageFilterWidget._run_filter
+        if impl is func and func in GRAYSCALE_INPUT_FUNCTIONS:
+            data = to_grayscale_input(data)
+
+        if lazy:
+            return apply_tiled(impl, data)
+        result = apply_stack(impl, data) if is_stack(data) else impl(data)
+        return np.asarray(result)
+
+    def _stage_keys(self, data: np.ndarray) -> List:
+        """Cache keys of the output of every step on data."""
+        keys = []
+        key = array_digest(data)
+        for func in self.pipeline:
+            key = ResultCache.chain_key(key, self.resolve(func))
+            keys.append(key)
+        return keys
+
+    def _run_incremental(self, data: np.ndarray) -> np.ndarray:
+        keys = self._stage_keys(data)
+        start = 0
+        for index in range(len(keys) - 1, -1, -1):
+            cached = self.cache.get(keys[index])
+            if cached is not None:
+                data = cached
+                start = index + 1
+                break
+        self.reused_steps = start
+
+        for index in range(start, len(self.pipeline)):
+            data = self.cache.put(
+                keys[index], self._run_step(self.pipeline[index], data))
+        return data
+
+    def _run_profiled(self, data: np.ndarray) -> np.ndarray:
+        profiler = PipelineProfiler(self.pipeline.name)
+        try:
+            for func in self.pipeline:
+                with profiler.stage(func.__name__, data) as stage:
+                    data = self._run_step(func, data)
+                    stage.set_output(data)
+        finally:
+            self.profile = profiler.finish()
+        return data
+
+    def _run_frame(self, frame) -> np.ndarray:
+        frame = np.asarray(frame)
+        for func in self.pipeline:
+            frame = self._run_step(func, frame)
+        return frame
+
+    def iter_frames(self, data) -> Iterator[np.ndarray]:
+        """
+        Generator running every step on one frame of a stack (N x H x W or
+        N x H x W x C) at a time, yielding the result of each frame. Only
+        the current frame is read from lazily backed data. Images which are
+        not stacks are a single frame.
+        """
+        data = full_resolution(data)
+        if not is_stack(data):
+            yield self._run_frame(data)
+            return
+        for index in range(data.shape[0]):
+            yield self._run_frame(data[index])
+
+    def stream(self, data, out=None):
+        """
+        Run the pipeline frame by frame, so only one frame and its
+        intermediates are in memory besides the output, whatever the number
+        of frames. The cache, memory report and profile are not used.
+
+        Args:
+            data: Stack to filter, in memory or lazily backed
+            out (array-like, optional): Output to write the frames into,
+                e.g. a memory mapped or zarr array of the result's shape
+
+        Returns:
+            out, or a preallocated NumPy array with the result. Lazily
+            backed stacks without out give a lazy dask array, which runs the
+            pipeline on a frame when that frame is read.
+
+        Raises:
+            ValueError: If out does not have the shape of the result
+        """
+        self.reused_steps = 0
+        self.report = None
+        self.profile = None
+        source = full_resolution(data)
+        if not is_stack(source):
+            result = self._run_frame(source)
+            if out is None:
+                return result
+            _check_output(out, result.shape)
+            out[...] = result
+            return out
+        if out is None and is_lazy_array(source):
+            return self._stream_lazy(source)
+
+        frames = self.iter_frames(source)
+        first = next(frames)
+        shape = (source.shape[0],) + first.shape
+        if out is None:
+            out = np.empty(shape, first.dtype)
+        _check_output(out, shape)
+        out[0] = first
+        del first
+        for index, frame in enumerate(frames, 1):
+            out[index] = frame
+        return out
+
+    def _stream_lazy(self, source) -> da.Array:
+        """Lazy stack with one task per frame, running the pipeline on it."""
+        source = da.asarray(source)
+        # the first frame gives the shape and dtype of every result frame
+        probe = self._run_frame(source[0])
+        run_frame = dask.delayed(self._run_frame, pure=True)
+        return da.stack([
+            da.from_delayed(run_frame(source[index]), probe.shape,
+                            probe.dtype)
+            for index in range(source.shape[0])])
+
+    def __call__(self, data: np.ndarray) -> np.ndarray:
+        """
+        Run every step on data and return the final result.
+        With measure_memory, the memory report of the run is stored in
+        self.report, with profile its PipelineProfile in self.profile.
+        Lazily backed data (dask, zarr, multiscale) gives a lazy result,
+        every step runs tile by tile and nothing is measured.
+        """
+        self.reused_steps = 0
+        self.profile = None
+        if is_lazy_array(data):
+            self.report = None
+            data = full_resolution(data)
+            for func in self.pipeline:
+                data = self._run_step(func, data, lazy=True)
+            return data
+
+        data = np.asarray(data)
+        if self.profile_stages:
+            self.report = None
+            return self._run_profiled(data)
+        if not self.measure_memory:
+            self.report = None
+            if self.cache is not None and self.cache.max_bytes:
+                return self._run_incremental(data)
+            for func in self.pipeline:
+                data = self._run_step(func, data)
+            return data
+
+        was_tracing = tracemalloc.is_tracing()
+        if was_tracing:
+            baseline = tracemalloc.get_traced_memory()[0]
+        else:
+            tracemalloc.start()
+            baseline = 0
+
+        peak_bytes = 0
+        replay_bytes = 0
+        # history copies and layers a step by step replay would keep alive
+        retained_bytes = 0
+        try:
+            for func in self.pipeline:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                result = self._run_step(func, data)
+                step_peak = tracemalloc.get_traced_memory()[1]
+
+                peak_bytes = max(peak_bytes, step_peak - baseline)
+                # estimate: the replay also makes a history and a working
+                # copy of the input, on top of everything kept from earlier
+                # steps
+                replay_bytes = max(
+                    replay_bytes,
+                    retained_bytes + 2 * data.nbytes + step_peak - before)
+                retained_bytes += data.nbytes + result.nbytes
+                data = result
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+
+        self.report = PipelineMemoryReport(peak_bytes, replay_bytes)
+        return data
+
+
 class WorkflowWidget(QWidget):
     """
     Widget for interacting with different workflows
@@ -104,6 +627,10 @@ class WorkflowWidget(QWidget):
         self.wf_idx = 0
         self.current_workflow: Pipeline = Pipeline()
         self.workflows: Dict[str, Pipeline] = {}
+        # compiled versions of saved workflows
+        self.compiled_workflows: Dict[str, CompiledPipeline] = {}
+        # profile of the last profiled workflow run
+        self.last_profile: PipelineProfile | None = None
 
     def setup_ui(self):
         """Configure the widget's user interface."""
@@ -181,7 +708,33 @@ class WorkflowWidget(QWidget):
         import_wf_btn = QPushButton("Import workflow")
         import_wf_btn.clicked.connect(self.import_wf)
 
+        self.compiled_checkbox = QCheckBox("compiled replay")
+        self.compiled_checkbox.setToolTip(
+            "Run saved workflows as one fused pass that only adds the final layer")
+
         self.main_wf_layout.addWidget(import_wf_btn)
+        self.memory_report_checkbox = QCheckBox("report memory")
+        self.memory_report_checkbox.setToolTip(
+            "Measure the peak memory of compiled runs (slows them down)")
+
+        self.stream_checkbox = QCheckBox("stream frames")
+        self.stream_checkbox.setToolTip(
+            "Run compiled workflows on stacks one frame at a time, so only "
+            "one frame is filtered in memory")
+
+        self.profile_checkbox = QCheckBox("profile stages")
+        self.profile_checkbox.setToolTip(
+            "Time every step of workflow runs and report it in the chat")
+        export_profile_btn = QPushButton("export profile")
+        export_profile_btn.setToolTip(
+            "Save the profile of the last workflow run as JSON")
+        export_profile_btn.clicked.connect(self.export_profile)
+
+        self.main_wf_layout.addWidget(self.compiled_checkbox)
+        self.main_wf_layout.addWidget(self.memory_report_checkbox)
+        self.main_wf_layout.addWidget(self.stream_checkbox)
+        self.main_wf_layout.addWidget(self.profile_checkbox)
+        self.main_wf_layout.addWidget(export_profile_btn)
         self.main_wf_layout.addLayout(self.buttons)
         self.main_wf_layout.addLayout(self.recording_wf_layout)
         self.main_wf_layout.addLayout(self.saved_wf_layout)
@@ -237,14 +790,18 @@ class WorkflowWidget(QWidget):
                 "workflow does not exist")
             return
 
-        file_path, _ = QFileDialog.getSaveFileName(self, "save to file", ".")
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "save to file", ".", "Pipelines (*.json)")
         if not file_path:
             return
 
         wf = self.workflows[wf_name]
 
-        with open(file_path, 'wb') as fp:
-            pickle.dump(wf, fp)
+        try:
+            save_pipeline(wf, file_path)
+        except ValueError as e:
+            self.filter_widget.add_to_chat(f"[Error] {e}")
+            return
         self.filter_widget.add_to_chat(
             f"[Update] saved workflow {
                 wf.name} to file: {file_path}")
@@ -254,13 +811,8 @@ class WorkflowWidget(QWidget):
             self, "open exported pipeline", ".")
         if file_path:
             try:
-                with open(file_path, 'rb') as fp:
-                    new_pipeline = pickle.load(fp)
-                    if not isinstance(new_pipeline, Pipeline):
-                        self.filter_widget.add_to_chat(
-                            f"[Error] did not recognize {file_path} as a valid pipeline")
-                    self.current_workflow = new_pipeline
-                    self.save_workflow()
+                self.current_workflow = load_pipeline(file_path)
+                self.save_workflow()
             except Exception as e:
                 self.filter_widget.add_to_chat(f"[Error] {e}")
 
@@ -341,12 +893,91 @@ class WorkflowWidget(QWidget):
         # cases
         try:
             wf = self.workflows[wf_name]
-            for filter_event in wf:
-                self.filter_widget._apply_filter(filter_event)
-
         except KeyError:
             self.filter_widget.add_to_chat(
                 f"[Error] workflow {wf_name} does not exist")
+            return
+
+        # splitting channels creates several layers, so it needs the replay
+        if self.compiled_checkbox.isChecked() and \
+                not any(func in wf for func in MULTI_LAYER_FUNCTIONS):
+            self.apply_wf_compiled(wf)
+            return
+
+        # each step filters the layer added by the step before, so the
+        # replay runs on the calling thread
+        if not self.profile_checkbox.isChecked():
+            for filter_event in wf:
+                self.filter_widget._apply_filter(
+                    filter_event, background=False)
+            return
+
+        profiler = PipelineProfiler(wf.name)
+        try:
+            for filter_event in wf:
+                data = self.filter_widget._get_current_layer().data
+                with profiler.stage(filter_event.__name__, data) as stage:
+                    self.filter_widget._apply_filter(
+                        filter_event, background=False)
+                    stage.set_output(
+                        self.filter_widget._get_current_layer().data)
+        except Exception as e:
+            self.filter_widget.add_to_chat(f"[Error] {e}")
+        finally:
+            self._report_profile(profiler.finish())
+
+    def apply_wf_compiled(self, wf: Pipeline):
+        """
+        Runs a workflow as one fused pass on the current layer and adds only
+        the final result as a new layer.
+        """
+        compiled = self.compiled_workflows.get(wf.name)
+        if compiled is None or compiled.pipeline is not wf:
+            # stages share the budget of the filter result cache
+            compiled = wf.compile(self.filter_widget._resolve_filter,
+                                  cache=self.filter_widget.result_cache)
+            self.compiled_workflows[wf.name] = compiled
+        compiled.measure_memory = self.memory_report_checkbox.isChecked()
+        compiled.profile_stages = self.profile_checkbox.isChecked()
+
+        try:
+            layer = self.filter_widget._get_current_layer()
+            if self.stream_checkbox.isChecked():
+                result = compiled.stream(layer.data)
+            else:
+                result = compiled(layer.data)
+        except Exception as e:
+            self.filter_widget.add_to_chat(f"[Error] {e}")
+            return
+
+        self.viewer.add_image(result, name=f"{layer.name} | {wf.name}")
+        message = f"[Update] ran compiled workflow {wf.name}"
+        if compiled.reused_steps:
+            message += (f", reused {compiled.reused_steps} of {len(wf)} "
+                        f"steps")
+        if compiled.report is not None:
+            message += f": {compiled.report}"
+        self.filter_widget.add_to_chat(message)
+        if compiled.profile is not None:
+            self._report_profile(compiled.profile)
+
+    def _report_profile(self, profile: PipelineProfile):
+        self.last_profile = profile
+        self.filter_widget.add_to_chat(f"[Profile] {profile}")
+
+    def export_profile(self):
+        """Save the profile of the last profiled workflow run as JSON."""
+        if self.last_profile is None:
+            self.filter_widget.add_to_chat(
+                "no profile yet, check \"profile stages\" and run a workflow")
+            return
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "save profile", ".", "Profiles (*.json)")
+        if not file_path:
+            return
+        self.last_profile.save(file_path)
+        self.filter_widget.add_to_chat(
+            f"[Update] saved profile to file: {file_path}")
 
     def reset(self):
         """resets the current workflow pipeline"""
@@ -0,0 +1,252 @@
+"""
+Headless batch runs of exported workflows
+
+A workflow exported from the WorkflowWidget (see save_pipeline) can only be
+replayed interactively on a napari layer. run_batch applies it to every
+image of a folder instead, without a viewer:
+
+    python -m src.pipelines_batch workflow.json images/ results/ --workers 4
+
+Images are found with cellpose's io.get_image_files and read with io.imread.
+They are handed to a process pool as a stream, with at most a few images per
+worker in flight, so folders with thousands of files never sit in memory at
+once. Every worker builds the pipeline from its declarative form
+(Pipeline.to_dict) once when it starts, which gives one instance of the
+segmentation and denoising models per worker, reused for all the images it
+processes.
+
+For each image the filters run as a CompiledPipeline, then the pipeline's
+filtModel and segModel if it has them. The filtered image is written as
+<name>_filtered.tif and the masks as <name>_masks.tif in the output folder.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from cellpose import io
+
+from .pipelines import CompiledPipeline, Pipeline, read_pipeline_spec
+
+logger = logging.getLogger(__name__)
+
+# images submitted per worker ahead of the results, keeps workers busy
+# without reading the whole folder
+IN_FLIGHT_PER_WORKER = 2
+
+# throughput is logged every this many images (and after the last one)
+LOG_EVERY = 10
+
+# suffixes of the written results, also skipped when listing the input
+FILTERED_SUFFIX = "_filtered"
+MASKS_SUFFIX = "_masks"
+
+# state of a worker process, set once by _init_worker
+_worker_pipeline: Optional[Pipeline] = None
+_worker_compiled: Optional[CompiledPipeline] = None
+_worker_options: dict = {}
+
+
+def _init_worker(spec: dict, output_dir: str,
+                 channels: Sequence[int], diameter: Optional[float]):
+    """Build the pipeline and its models once per worker process."""
+    global _worker_pipeline, _worker_compiled, _worker_options
+    _worker_pipeline = Pipeline.from_dict(spec)
+    _worker_compiled = _worker_pipeline.compile()
+    _worker_options = {
+        "output_dir": output_dir,
+        "channels": list(channels),
+        "diameter": diameter,
+    }
+
+
+def _process_file(path: str) -> Tuple[str, int, List[str]]:
+    """
+    Run the worker's pipeline on one image file and write the results.
+
+    Returns:
+        tuple: The input path, the bytes read and the written paths
+    """
+    img = io.imread(path)
+    nbytes = img.nbytes
+    output_dir = _worker_options["output_dir"]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    written = []
+
+    data = _worker_compiled(img) if len(_worker_pipeline) else img
+    eval_args = {"channels": _worker_options["channels"],
+                 "diameter": _worker_options["diameter"]}
+    if _worker_pipeline.filtModel is not None:
+        data = _worker_pipeline.filtModel.eval(data, **eval_args)
+    if len(_worker_pipeline) or _worker_pipeline.filtModel is not None:
+        filtered_path = os.path.join(output_dir, stem + FILTERED_SUFFIX + ".tif")
+        io.imsave(filtered_path, np.asarray(data))
+        written.append(filtered_path)
+
+    if _worker_pipeline.segModel is not None:
+        # Cellpose also returns the estimated diameters
+        masks = _worker_pipeline.segModel.eval(data, **eval_args)[0]
+        masks_path = os.path.join(output_dir, stem + MASKS_SUFFIX + ".tif")
+        io.imsave(masks_path, np.asarray(masks))
+        written.append(masks_path)
+
+    return path, nbytes, written
+
+
+class BatchReport():
+    """
+    Outcome of a batch run.
+
+    Attributes:
+        written (list): Paths of the written results
+        failed (list): (path, error message) of images that failed
+        processed (int): Images done, including the failed ones
+        seconds (float): Wall time of the run
+        nbytes (int): Bytes of the images read
+    """
+
+    def __init__(self):
+        self.written: List[str] = []
+        self.failed: List[Tuple[str, str]] = []
+        self.processed = 0
+        self.seconds = 0.0
+        self.nbytes = 0
+
+    @property
+    def images_per_second(self) -> float:
+        return self.processed / self.seconds if self.seconds else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.nbytes / 1024 ** 2 / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return (f"{self.processed} images ({len(self.failed)} failed) in "
+                f"{self.seconds:.1f} s, {self.images_per_second:.2f} images/s, "
+                f"{self.mb_per_second:.1f} MB/s")
+
+
+def run_batch(pipeline_path: str, input_dir: str, output_dir: str,
+              workers: Optional[int] = None,
+              channels: Sequence[int] = (0, 0),
+              diameter: Optional[float] = None,
+              image_filter: Optional[str] = None,
+              look_one_level_down: bool = False) -> BatchReport:
+    """
+    Apply an exported pipeline to every image of a folder.
+
+    Args:
+        pipeline_path (str): Path of the exported pipeline
+        input_dir (str): Folder of the images
+        output_dir (str): Folder the results are written to, created if
+            needed
+        workers (int, optional): Number of worker processes, one per CPU
+            by default
+        channels (sequence): Cellpose channels passed to the models
+        diameter (float, optional): Cell diameter passed to the models,
+            estimated by the model if None
+        image_filter (str, optional): Only use images whose name ends with
+            this (the imf of io.get_image_files)
+        look_one_level_down (bool): Also use images in subfolders
+
+    Returns:
+        BatchReport: Written files, failures and throughput
+
+    Raises:
+        ValueError: If the pipeline is invalid, cannot run without a viewer
+            (it splits channels) or the folder holds no images
+    """
+    # fail early, before starting any worker; the workers get the
+    # declarative form and create their own models from it
+    spec = read_pipeline_spec(pipeline_path)
+    Pipeline.from_dict(spec, load_models=False).compile()
+    paths = io.get_image_files(input_dir, MASKS_SUFFIX, imf=image_filter,
+                               look_one_level_down=look_one_level_down)
+    paths = [path for path in paths
+             if not os.path.splitext(path)[0].endswith(FILTERED_SUFFIX)]
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    logger.info("running %s on %d images with %d workers",
+                pipeline_path, len(paths), workers)
+
+    report = BatchReport()
+    start = time.perf_counter()
+    pending = iter(paths)
+    # spawn: forked workers would inherit torch and Qt state of the parent
+    with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(spec, output_dir, tuple(channels),
+                      diameter)) as executor:
+        in_flight = {}
+        while True:
+            while len(in_flight) < workers * IN_FLIGHT_PER_WORKER:
+                path = next(pending, None)
+                if path is None:
+                    break
+                in_flight[executor.submit(_process_file, path)] = path
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = in_flight.pop(future)
+                report.processed += 1
+                try:
+                    _, nbytes, written = future.result()
+                except Exception as error:
+                    logger.error("failed on %s: %s", path, error)
+                    report.failed.append((path, str(error)))
+                    continue
+                report.nbytes += nbytes
+                report.written.extend(written)
+
+                if report.processed % LOG_EVERY == 0:
+                    report.seconds = time.perf_counter() - start
+                    logger.info("%d/%d images, %.2f images/s, %.1f MB/s",
+                                report.processed, len(paths),
+                                report.images_per_second,
+                                report.mb_per_second)
+
+    report.seconds = time.perf_counter() - start
+    logger.info("done: %s", report)
+    return report
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Command line entry point, returns the exit status."""
+    parser = argparse.ArgumentParser(
+        description="Apply an exported workflow to a folder of images")
+    parser.add_argument("pipeline", help="exported workflow file")
+    parser.add_argument("input_dir", help="folder of the images")
+    parser.add_argument("output_dir", help="folder for the results")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--channels", type=int, nargs=2, default=[0, 0],
+                        help="cellpose channels passed to the models")
+    parser.add_argument("--diameter", type=float, default=None,
+                        help="cell diameter passed to the models")
+    parser.add_argument("--image-filter", default=None,
+                        help="only use images whose name ends with this")
+    parser.add_argument("--look-one-level-down", action="store_true",
+                        help="also use images in subfolders")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    report = run_batch(args.pipeline, args.input_dir, args.output_dir,
+                       workers=args.workers, channels=args.channels,
+                       diameter=args.diameter,
+                       image_filter=args.image_filter,
+                       look_one_level_down=args.look_one_level_down)
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
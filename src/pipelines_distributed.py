@@ -0,0 +1,188 @@
+"""
+Recorded workflows as preprocessing steps of cellpose's distributed_eval
+
+cellpose.contrib.distributed_segmentation.distributed_eval segments
+volumes too large for memory block by block with dask. It accepts
+preprocessing steps as (function, kwargs) tuples, called on every block
+as function(image, **kwargs, crop=crop). preprocessing_steps turns a
+Pipeline into such a step, so filter chains designed interactively in
+napari run on every block before cellpose.
+
+The filters are 2D: volumes (Z x Y x X) are filtered plane by plane, as
+stacks. A filter near the edge of a block needs pixels from the
+neighbouring blocks, the halo of the filter (FILTER_HALOS); the halos of
+all steps add up. With the source array, every block is read again
+extended by that halo in Y and X, filtered and cut back to the block, so
+the result does not depend on the block grid or on distributed_eval's
+overlap. CLAHE reads start at multiples of its tile size, and filters
+with a tiled variant (TILED_FUNCTIONS) use it, as in apply_tiled. Otsu's
+threshold is computed from the block and its halo, not the whole volume.
+
+The step carries the declarative form of the pipeline (Pipeline.to_dict),
+not pickled closures; workers compile it once per pipeline.
+"""
+
+from functools import partial
+from threading import Lock
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+
+from .napari_image_filters import (
+    GRAYSCALE_INPUT_FUNCTIONS, to_grayscale_input
+)
+from .napari_image_filters_native import as_native
+from .napari_image_filters_stack import is_stack
+from .napari_image_filters_tiled import (
+    SHAPE_CHANGING_FUNCTIONS, TILE_ALIGNMENT, TILED_FUNCTIONS, TILED_KWARGS,
+    filter_halo
+)
+from .pipelines import CompiledPipeline, Pipeline
+
+# compiled pipelines of a worker, by digest and dtype handling
+_compiled: Dict[Tuple[str, bool], CompiledPipeline] = {}
+_compiled_lock = Lock()
+
+
+def _block_function(func: Callable) -> Callable:
+    """
+    The implementation of a step run on blocks: its tiled variant and
+    tiled arguments if it has them, as apply_tiled runs it.
+    """
+    base = func.func if isinstance(func, partial) else func
+    name = getattr(base, "__name__", "")
+    if name not in TILED_FUNCTIONS and name not in TILED_KWARGS:
+        return func
+    args = func.args if isinstance(func, partial) else ()
+    keywords = func.keywords if isinstance(func, partial) else {}
+    block_func = partial(TILED_FUNCTIONS.get(name, base), *args,
+                         **{**TILED_KWARGS.get(name, {}), **keywords})
+    if base in GRAYSCALE_INPUT_FUNCTIONS:
+        # CompiledPipeline only prepares the input of the stored function
+        tiled_func = block_func
+
+        def block_func(img):
+            return tiled_func(to_grayscale_input(img))
+    block_func.__name__ = name
+    return block_func
+
+
+def _step_name(func: Callable) -> str:
+    base = func.func if isinstance(func, partial) else func
+    return getattr(base, "__name__", "")
+
+
+def _step_kwargs(func: Callable) -> dict:
+    if not isinstance(func, partial):
+        return {}
+    return {**TILED_KWARGS.get(_step_name(func), {}), **func.keywords}
+
+
+def _alignment(pipeline: Pipeline) -> int:
+    """Multiple block reads start at, for CLAHE tiles to line up."""
+    return int(np.lcm.reduce(
+        [TILE_ALIGNMENT.get(_step_name(func), 1) for func in pipeline] or [1]))
+
+
+def pipeline_halo(pipeline: Pipeline, tile_shape: Tuple[int, int]) -> int:
+    """
+    Pixels a block has to be extended by in Y and X for the pipeline to
+    give the same result in the block as on the whole image: the sum of
+    the halos of its steps.
+
+    Args:
+        pipeline (Pipeline): The steps
+        tile_shape (tuple): Height and width of the blocks
+    """
+    halo = 0
+    for func in pipeline:
+        name = _step_name(func)
+        alignment = TILE_ALIGNMENT.get(name, 1)
+        step_halo = filter_halo(func.func if isinstance(func, partial)
+                                else func, tile_shape, **_step_kwargs(func))
+        halo += -(-step_halo // alignment) * alignment
+    return halo
+
+
+def _compile(spec: dict, native: bool) -> CompiledPipeline:
+    """Compiled pipeline of spec, built once per worker."""
+    pipeline = Pipeline.from_dict(spec, load_models=False)
+    key = (pipeline.digest(), native)
+    with _compiled_lock:
+        compiled = _compiled.get(key)
+        if compiled is None:
+            resolve = (lambda func: _block_function(as_native(func))) \
+                if native else _block_function
+            compiled = _compiled[key] = pipeline.compile(resolve)
+    return compiled
+
+
+def run_pipeline_block(image: np.ndarray, spec: dict, source=None,
+                       native: bool = False, crop=None) -> np.ndarray:
+    """
+    Preprocessing step of distributed_eval running a pipeline on a block.
+
+    Args:
+        image (np.ndarray): The block, read by distributed_eval
+        spec (dict): Declarative form of the pipeline
+        source (array-like, optional): The whole volume (e.g. the zarr
+            array passed to distributed_eval), to read the halo from. The
+            block is filtered without extra context if None
+        native (bool): Run the native-dtype filters, keeping the bit depth
+        crop (tuple of slices): Region of the block in source
+
+    Returns:
+        np.ndarray: The filtered block
+    """
+    compiled = _compile(spec, native)
+    if source is None or crop is None:
+        return compiled(np.asarray(image))
+
+    lead = 1 if is_stack(image) else 0
+    tile_shape = image.shape[lead:lead + 2]
+    halo = pipeline_halo(compiled.pipeline, tile_shape)
+    alignment = _alignment(compiled.pipeline)
+
+    read = list(crop)
+    keep = [slice(None)] * lead
+    for axis in (lead, lead + 1):
+        start = crop[axis].start or 0
+        stop = crop[axis].stop if crop[axis].stop is not None \
+            else source.shape[axis]
+        first = max(start - halo, 0) // alignment * alignment
+        last = min(stop + halo, source.shape[axis])
+        read[axis] = slice(first, last)
+        keep.append(slice(start - first, stop - first))
+
+    result = compiled(np.asarray(source[tuple(read)]))
+    return result[tuple(keep)]
+
+
+def preprocessing_steps(pipeline: Pipeline, source=None,
+                        native: bool = False) -> List[Tuple[Callable, dict]]:
+    """
+    distributed_eval preprocessing steps running pipeline on every block.
+
+    Args:
+        pipeline (Pipeline): Recorded workflow; its models are not run
+        source (array-like, optional): The volume passed to
+            distributed_eval, to read the halo of every block from
+        native (bool): Run the native-dtype filters, keeping the bit depth
+
+    Returns:
+        list: [(run_pipeline_block, kwargs)]
+
+    Raises:
+        ValueError: If a step cannot run block by block (it changes the
+            image shape or splits channels) or cannot be saved
+    """
+    for func in pipeline:
+        if _step_name(func) in SHAPE_CHANGING_FUNCTIONS:
+            raise ValueError(
+                f"{_step_name(func)} changes the image shape and cannot run "
+                f"block by block")
+    spec = pipeline.to_dict()
+    # models are created and run by distributed_eval itself
+    spec["segModel"] = spec["filtModel"] = None
+    Pipeline.from_dict(spec, load_models=False).compile()
+    return [(run_pipeline_block,
+             {"spec": spec, "source": source, "native": native})]
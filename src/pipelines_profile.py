@@ -0,0 +1,216 @@
+"""
+Per-stage profiling of pipeline runs
+
+PipelineProfiler times the stages of a pipeline run: the filter steps as
+well as model inference. For every stage it records the wall time, the CPU
+time of the process, the peak memory allocated while it ran and the shape
+and dtype of its input and output. The peak is the one traced by
+tracemalloc, which covers NumPy arrays but not memory torch allocates
+itself; the peak of the GPU is added when torch runs on CUDA.
+
+The resulting PipelineProfile is shown in the chat panel and can be
+exported as JSON, together with a description of the machine, to compare
+runs across machines.
+"""
+
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+import numpy as np
+
+# version of the exported JSON
+PROFILE_FORMAT_VERSION = 1
+
+
+def _describe(data) -> Optional[Dict[str, Any]]:
+    """Shape and dtype of an array, None for anything else."""
+    if data is None or not hasattr(data, "shape") or \
+            not hasattr(data, "dtype"):
+        return None
+    return {"shape": [int(size) for size in data.shape],
+            "dtype": str(data.dtype)}
+
+
+def _cuda():
+    """The torch module if it was imported and runs on CUDA, else None."""
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        return torch
+    return None
+
+
+def machine_info() -> Dict[str, Any]:
+    """Description of the machine a profile was recorded on."""
+    info = {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+    torch = _cuda()
+    if torch is not None:
+        info["gpu"] = torch.cuda.get_device_name()
+    return info
+
+
+class StageProfile():
+    """
+    Measurements of one stage.
+
+    Attributes:
+        name (str): Step or model name
+        wall_seconds (float): Elapsed time
+        cpu_seconds (float): CPU time of the process, all threads
+        peak_bytes (int): Peak memory traced by tracemalloc above the
+            memory in use when the stage started
+        gpu_peak_bytes (int, optional): Peak CUDA memory, if used
+        input (dict, optional): Shape and dtype of the input
+        output (dict, optional): Shape and dtype of the output
+    """
+
+    def __init__(self, name: str, data=None):
+        self.name = name
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_bytes = 0
+        self.gpu_peak_bytes: Optional[int] = None
+        self.input = _describe(data)
+        self.output: Optional[Dict[str, Any]] = None
+
+    def set_output(self, data):
+        """Record the shape and dtype of the stage's result."""
+        self.output = _describe(data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "peak_bytes": self.peak_bytes,
+            "gpu_peak_bytes": self.gpu_peak_bytes,
+            "input": self.input,
+            "output": self.output,
+        }
+
+    def __repr__(self):
+        mb = 1024 ** 2
+        text = (f"{self.name}: {self.wall_seconds * 1000:.1f} ms wall, "
+                f"{self.cpu_seconds * 1000:.1f} ms CPU, "
+                f"{self.peak_bytes / mb:.1f} MB peak")
+        if self.gpu_peak_bytes is not None:
+            text += f", {self.gpu_peak_bytes / mb:.1f} MB GPU"
+        if self.output is not None:
+            text += (f", {'x'.join(map(str, self.output['shape']))} "
+                     f"{self.output['dtype']}")
+        return text
+
+
+class PipelineProfile():
+    """
+    Stage by stage measurements of a pipeline run.
+
+    Attributes:
+        name (str): Name of the pipeline
+        stages (list): StageProfile of every stage, in order
+        machine (dict): Description of the machine, see machine_info
+    """
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.stages: List[StageProfile] = []
+        self.machine = machine_info()
+
+    @property
+    def wall_seconds(self) -> float:
+        return sum(stage.wall_seconds for stage in self.stages)
+
+    @property
+    def cpu_seconds(self) -> float:
+        return sum(stage.cpu_seconds for stage in self.stages)
+
+    def slowest(self) -> Optional[StageProfile]:
+        """The stage with the longest wall time."""
+        return max(self.stages, key=lambda stage: stage.wall_seconds,
+                   default=None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": PROFILE_FORMAT_VERSION,
+            "name": self.name,
+            "machine": self.machine,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "stages": [stage.to_dict() for stage in self.stages],
+        }
+
+    def save(self, path: str):
+        """Export the profile as JSON."""
+        with open(path, "w") as fp:
+            json.dump(self.to_dict(), fp, indent=2)
+
+    def __repr__(self):
+        lines = [f"profile of {self.name or 'pipeline'}: "
+                 f"{self.wall_seconds * 1000:.1f} ms wall, "
+                 f"{self.cpu_seconds * 1000:.1f} ms CPU"]
+        slowest = self.slowest()
+        for index, stage in enumerate(self.stages, 1):
+            marker = " (slowest)" if stage is slowest and \
+                len(self.stages) > 1 else ""
+            lines.append(f"{index}. {stage}{marker}")
+        return "\n".join(lines)
+
+
+class PipelineProfiler():
+    """
+    Records a PipelineProfile, one stage at a time:
+
+        with profiler.stage("apply_gaussian_blur", data) as stage:
+            data = apply_gaussian_blur(data)
+            stage.set_output(data)
+
+    tracemalloc is started for the run if it is not tracing yet, and stopped
+    again by finish.
+    """
+
+    def __init__(self, name: str = ""):
+        self.profile = PipelineProfile(name)
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str, data=None) -> Iterator[StageProfile]:
+        """Measure the code run in the with block as a stage."""
+        stage = StageProfile(name, data)
+        torch = _cuda()
+        if torch is not None:
+            torch.cuda.reset_peak_memory_stats()
+            gpu_before = torch.cuda.memory_allocated()
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.wall_seconds = time.perf_counter() - wall_start
+            stage.cpu_seconds = time.process_time() - cpu_start
+            stage.peak_bytes = max(
+                tracemalloc.get_traced_memory()[1] - before, 0)
+            if torch is not None:
+                stage.gpu_peak_bytes = max(
+                    torch.cuda.max_memory_allocated() - gpu_before, 0)
+            self.profile.stages.append(stage)
+
+    def finish(self) -> PipelineProfile:
+        """Stop tracing if the profiler started it and return the profile."""
+        if self._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_tracing = False
+        return self.profile
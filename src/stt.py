@@ -5,29 +5,37 @@ from threading import Event, Thread
 from os import remove
 from dotenv import load_dotenv
 from src.ai import GPT
+from src.stt_buffer import AudioRingBuffer
 import numpy as np
 import sounddevice as sd
 import wave
 
+# seconds of audio kept while recording, older audio is overwritten
+MAX_RECORD_SECONDS = 300.0
+
 
 class STT:
     """
     A clean, class-based Speech-to-Text (STT) interface that records audio until
     a stop signal is received and transcribes it using OpenAI's Whisper API.
+    Recordings are kept in a ring buffer of max_record_seconds, longer ones
+    lose their beginning.
     """
 
     def __init__(
             self,
             api_key: str = None,
             sample_rate: int = 44100,
-            channels: int = 1):
+            channels: int = 1,
+            max_record_seconds: float = MAX_RECORD_SECONDS):
         load_dotenv()
         self.api_key = api_key
         self.sample_rate = sample_rate
         self.channels = channels
 
         # Internal variables for audio recording
-        self._audio_data = []
+        self._audio = AudioRingBuffer(
+            int(sample_rate * max_record_seconds), channels)
         self._recording_event = Event()
         self._recording_thread = None
         self._is_recording = False
@@ -44,7 +52,7 @@ class STT:
         """
         Callback function used by the sounddevice InputStream to capture audio chunks.
         """
-        self._audio_data.append(indata.copy())
+        self._audio.write(indata)
 
     def start_recording(self):
         """
@@ -52,7 +60,7 @@ class STT:
         """
         if self._is_recording:
             return  # Already recording
-        self._audio_data = []  # Clear previous recordings
+        self._audio.clear()  # Clear previous recordings
         self._recording_event.clear()
         self._recording_thread = Thread(target=self._record_loop, daemon=True)
         self._recording_thread.start()
@@ -91,12 +99,18 @@ class STT:
         """
         Save the recorded audio data to a temporary WAV file.
         """
-        if not self._audio_data:
+        if not len(self._audio):
             raise ValueError("No audio data recorded.")
-        audio_np = np.concatenate(self._audio_data, axis=0)
+        wav_file = self._write_wav(self._audio.read(self._audio.first_frame))
+        print(wav_file)
+        return wav_file
+
+    def _write_wav(self, audio_np: np.ndarray) -> str:
+        """
+        Write int16 audio to a temporary WAV file and return its path.
+        """
         with NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
             wav_file = tmp_file.name
-            print(wav_file)
             with wave.open(wav_file, "wb") as wf:
                 wf.setnchannels(self.channels)
                 wf.setsampwidth(2)  # 16-bit PCM (2 bytes per sample)
@@ -144,7 +158,7 @@ class STT:
         if self._is_recording:
             return  # Already recording
 
-        self._audio_data = []  # Clear previous recordings
+        self._audio.clear()  # Clear previous recordings
         self._recording_event.clear()
         self._stream_callback = callback
 
@@ -175,10 +189,9 @@ class STT:
             while not self._recording_event.is_set():
                 sd.sleep(100)  # Sleep briefly
 
-                # Calculate total frames recorded so far
-                if self._audio_data:
-                    total_frames = sum(chunk.shape[0]
-                                       for chunk in self._audio_data)
+                # Total frames recorded so far
+                total_frames = self._audio.frames_written
+                if total_frames:
 
                     # If we have enough new frames for a chunk, process it
                     if total_frames - last_processed_frame >= frames_per_chunk:
@@ -186,7 +199,7 @@ class STT:
                         try:
                             # Save current chunk to temporary file
                             temp_file = self._save_chunk_to_temp_file(
-                                last_processed_frame)
+                                last_processed_frame, total_frames)
 
                             # Check audio duration
                             with wave.open(temp_file, 'rb') as wf:
@@ -207,35 +220,22 @@ class STT:
                         except Exception as e:
                             print(f"Streaming transcription error: {e}")
 
-    def _save_chunk_to_temp_file(self, start_frame=0) -> str:
+    def _save_chunk_to_temp_file(self, start_frame=0, stop_frame=None) -> str:
         """
         Save a chunk of the recorded audio data to a temporary WAV file.
 
         Args:
             start_frame: Starting frame index to process from
+            stop_frame: Frame index to stop at, the latest frame if None
 
         Returns:
             Path to the temporary WAV file
         """
-        if not self._audio_data:
+        if not len(self._audio):
             raise ValueError("No audio data recorded.")
 
-        # Get full audio data as numpy array
-        audio_np = np.concatenate(self._audio_data, axis=0)
-
-        # Extract only the part we want (from start_frame to end)
-        if start_frame > 0 and start_frame < audio_np.shape[0]:
-            audio_np = audio_np[start_frame:]
-
-        with NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
-            wav_file = tmp_file.name
-            with wave.open(wav_file, "wb") as wf:
-                wf.setnchannels(self.channels)
-                wf.setsampwidth(2)  # 16-bit PCM (2 bytes per sample)
-                wf.setframerate(self.sample_rate)
-                wf.writeframes(audio_np.tobytes())
-
-        return wav_file
+        # Copy only the part we want, not the whole recording
+        return self._write_wav(self._audio.read(start_frame, stop_frame))
 
     def stop_streaming(self):
         """
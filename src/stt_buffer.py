@@ -0,0 +1,99 @@
+"""
+Ring buffer for recorded audio
+
+STT records int16 audio in small blocks from the sounddevice callback.
+Keeping them in a list makes every look at the recording (its length, the
+frames since the last transcription) cost time in the length of the whole
+session, and memory grows as long as the microphone is open.
+AudioRingBuffer preallocates the frames of max_seconds of audio instead and
+writes the blocks in place, wrapping around once it is full; the oldest
+audio is overwritten.
+
+Frames are addressed by their position in the whole recording, counted by
+frames_written, so a reader can remember where it stopped even after the
+buffer wrapped. Reading a range copies only that range.
+"""
+
+from threading import Lock
+import numpy as np
+
+
+class AudioRingBuffer():
+    """
+    Preallocated int16 audio of a fixed number of frames.
+
+    Args:
+        capacity (int): Frames kept, the most recent ones
+        channels (int): Channels per frame
+    """
+
+    def __init__(self, capacity: int, channels: int = 1):
+        if capacity < 1:
+            raise ValueError("The capacity must be at least one frame")
+        self.capacity = capacity
+        self.channels = channels
+        self._buffer = np.zeros((capacity, channels), np.int16)
+        self._written = 0
+        # written from the audio thread, read from the streaming thread
+        self._lock = Lock()
+
+    @property
+    def frames_written(self) -> int:
+        """Frames written since the buffer was created or cleared."""
+        return self._written
+
+    @property
+    def first_frame(self) -> int:
+        """Position of the oldest frame still in the buffer."""
+        return max(self._written - self.capacity, 0)
+
+    @property
+    def nbytes(self) -> int:
+        return self._buffer.nbytes
+
+    def __len__(self):
+        """Frames in the buffer."""
+        return min(self._written, self.capacity)
+
+    def clear(self):
+        """Forget the audio, keeping the memory."""
+        with self._lock:
+            self._written = 0
+
+    def write(self, frames: np.ndarray):
+        """
+        Append frames (frames x channels, or frames for one channel),
+        overwriting the oldest ones once the buffer is full.
+        """
+        frames = np.asarray(frames).reshape(-1, self.channels)
+        with self._lock:
+            if len(frames) > self.capacity:
+                # only the last capacity frames would survive
+                self._written += len(frames) - self.capacity
+                frames = frames[-self.capacity:]
+            start = self._written % self.capacity
+            head = min(len(frames), self.capacity - start)
+            self._buffer[start:start + head] = frames[:head]
+            self._buffer[:len(frames) - head] = frames[head:]
+            self._written += len(frames)
+
+    def read(self, start: int = 0, stop: int = None) -> np.ndarray:
+        """
+        Copy of the frames from position start to stop (the latest frame if
+        None). Frames already overwritten are left out.
+
+        Returns:
+            np.ndarray: Frames x channels int16 audio
+        """
+        with self._lock:
+            stop = self._written if stop is None else min(stop, self._written)
+            start = max(start, self.first_frame)
+            if stop <= start:
+                return np.zeros((0, self.channels), np.int16)
+            first = start % self.capacity
+            length = stop - start
+            if first + length <= self.capacity:
+                return self._buffer[first:first + length].copy()
+            return np.concatenate(
+                [self._buffer[first:],
+                 self._buffer[:length - (self.capacity - first)]])
@@ -0,0 +1,120 @@
+"""
+Shared fixtures for the test suite.
+"""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import numpy as np
+from PIL import Image
+
+from src.ai import GPT
+
+
+@pytest.fixture(scope="session")
+def rgb_image():
+    """Load the test image as an RGB array."""
+    image_path = os.path.join(
+        os.path.dirname(__file__), "resources", "test_image.jpg")
+    return np.array(Image.open(image_path))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers chat completions like the OpenAI API. The reply echoes the last
+    message as an ActionChainModel; messages starting with "sleep <s>" are
+    answered after s seconds. Streamed requests get the reply in chunks of
+    a few characters, chunk_delay seconds apart. The server keeps the last
+    message and all messages of every request.
+    """
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        message = body["messages"][-1]["content"]
+        self.server.requests.append(message)
+        self.server.prompts.append(body["messages"])
+        if message.startswith("sleep"):
+            time.sleep(float(message.split()[1]))
+        content = json.dumps({
+            "response_text": f"echo {message}",
+            "action": [{"action_name": "blur", "action_args": [2]},
+                       {"action_name": "sharpen", "action_args": []}],
+        })
+        usage = {"prompt_tokens": len(body["messages"]),
+                 "completion_tokens": 1,
+                 "total_tokens": len(body["messages"]) + 1}
+        try:
+            if body.get("stream"):
+                self._stream(body, content, usage)
+                return
+            reply = json.dumps({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content,
+                                "refusal": None},
+                }],
+                "usage": usage,
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(reply)))
+            self.end_headers()
+            self.wfile.write(reply)
+        except OSError:
+            # the client timed out and closed the connection
+            pass
+
+    def _stream(self, body, content, usage):
+        """Send the reply as server-sent events, a few characters apart."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        def send(choices, **extra):
+            chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk",
+                     "created": 0, "model": body["model"],
+                     "choices": choices, **extra}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        send([{"index": 0, "delta": {"role": "assistant", "content": ""},
+               "finish_reason": None}])
+        for start in range(0, len(content), 8):
+            send([{"index": 0, "delta": {"content": content[start:start + 8]},
+                   "finish_reason": None}])
+            time.sleep(self.server.chunk_delay)
+        send([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        send([], usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    """A local server standing in for the OpenAI endpoint."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.requests, server.prompts = [], []
+    server.chunk_delay = 0.01
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def chat(stub_server):
+    """A GPT client talking to the stub server."""
+    return GPT(api_key="test", prompt="system",
+               base_url=f"http://127.0.0.1:{stub_server.server_port}/v1",
+               max_retries=0)
@@ -0,0 +1,156 @@
+"""
+Test Suite for the GPT client and its conversation context, against the
+stub OpenAI server.
+"""
+import time
+import pytest
+import openai
+
+from src.ai import (
+    ActionChainModel, ReplyStreamParser, estimate_tokens, summarize_turn
+)
+
+
+@pytest.mark.unit
+def test_say_parses_reply(chat, stub_server):
+    """
+    Test that say sends the conversation and parses the structured reply,
+    reports its usage, and that a request taking longer than its timeout
+    fails.
+    """
+    usage = []
+    chat.on_usage = lambda seconds, tokens: usage.append(tokens)
+    response_text, action = chat.say("hello")
+    assert response_text == "echo hello"
+    assert action[0].action_name == "blur"
+    assert action[0].action_args == [2]
+    assert stub_server.requests == ["hello"]
+    assert usage == [3]
+
+    with pytest.raises(openai.APITimeoutError):
+        chat.say("sleep 2", timeout=0.2)
+
+
+@pytest.mark.unit
+def test_context_keeps_recent_turns(chat, stub_server):
+    """
+    Test that the replies are part of the conversation, and that only the
+    last turns are sent verbatim once the budget is exceeded, with the
+    older ones summarized after the system prompt.
+    """
+    chat.token_budget = 250
+    chat.keep_turns = 2
+    for index in range(10):
+        chat.say(f"message {index} " + "word " * 20)
+
+    prompt = stub_server.prompts[-1]
+    assert prompt[0] == {"role": "system", "content": "system"}
+    assert prompt[1]["role"] == "system"
+    assert "Summary of the earlier conversation" in prompt[1]["content"]
+    assert '-> blur 2' in prompt[1]["content"]
+    assert [message["role"] for message in prompt[2:]] == \
+        ["user", "assistant", "user"]
+    assert prompt[-1]["content"].startswith("message 9")
+
+    # the prompt stops growing once the budget is reached
+    sizes = [metrics.estimated_tokens for metrics in chat.metrics]
+    assert max(sizes) <= 250
+    assert len(chat.metrics) == 10
+    assert chat.metrics[-1].prompt_tokens == len(prompt)
+    # summary lines are dropped, oldest first, to stay in the budget
+    assert chat.summarized_turns == 8
+    assert len(chat.summary) == 8 - chat.dropped_turns > 0
+    assert chat.metrics[-1].summary_lines > 0
+    assert estimate_tokens(chat.context()) <= 250
+
+
+@pytest.mark.unit
+def test_context_drops_without_summary(chat, stub_server):
+    """
+    Test that older turns are dropped when summarizing is off, and that the
+    last turns are kept even above the budget.
+    """
+    chat.token_budget = 10
+    chat.keep_turns = 1
+    chat.summarize = False
+    for index in range(3):
+        chat.say(f"message {index}")
+    prompt = stub_server.prompts[-1]
+    assert [message["content"] for message in prompt] == \
+        ["system", "message 2"]
+    assert chat.dropped_turns == 2
+    assert chat.summary == []
+
+
+@pytest.mark.unit
+def test_summarize_turn():
+    """
+    Test the summary line of a turn with and without a parsable reply.
+    """
+    reply = ActionChainModel.model_validate({
+        "response_text": "ok",
+        "action": [{"action_name": "blur", "action_args": [3]},
+                   {"action_name": "sharpen", "action_args": []}]})
+    turn = [{"role": "user", "content": "blur then sharpen"},
+            {"role": "assistant", "content": reply.model_dump_json()}]
+    assert summarize_turn(turn) == \
+        'user asked "blur then sharpen" -> blur 3; sharpen'
+    assert summarize_turn(turn[:1]) == 'user asked "blur then sharpen"'
+
+
+@pytest.mark.unit
+def test_reply_stream_parser():
+    """
+    Test that sentences and actions are reported once complete, while the
+    reply is still arriving, and the rest when it ends.
+    """
+    reply = ActionChainModel.model_validate({
+        "response_text": "Blurring now. Then I sharpen it",
+        "action": [{"action_name": "blur", "action_args": [2.5]},
+                   {"action_name": "sharpen", "action_args": []}]})
+    content = reply.model_dump_json()
+    events = []
+    parser = ReplyStreamParser(
+        on_sentence=lambda sentence: events.append((length, sentence)),
+        on_action=lambda action: events.append((length, action.action_name)))
+    for length in range(1, len(content) + 1):
+        parser.feed(content[:length])
+    length = None
+    parser.finish(reply)
+
+    assert [event for _, event in events] == \
+        ["Blurring now.", "Then I sharpen it", "blur", "sharpen"]
+    # the first sentence and action came before the reply was complete
+    assert events[0][0] <= content.index("Then")
+    assert events[1][0] < content.index('"action_name"')
+    assert events[2][0] < len(content)
+    assert events[3][0] is None
+
+
+@pytest.mark.unit
+def test_say_stream(chat, stub_server):
+    """
+    Test that a streamed reply equals the parsed one, and that its first
+    sentence and actions are reported before the stream ends.
+    """
+    stub_server.chunk_delay = 0.02
+    events = []
+    start = time.perf_counter()
+    reply = chat.say_stream(
+        "First sentence. Second one",
+        on_sentence=lambda sentence: events.append(
+            (time.perf_counter(), sentence)),
+        on_action=lambda action: events.append(
+            (time.perf_counter(), action.action_name)))
+    end = time.perf_counter()
+
+    assert reply[0] == "echo First sentence. Second one"
+    assert [action.action_name for action in reply[1]] == ["blur", "sharpen"]
+    assert [event for _, event in events] == \
+        ["echo First sentence.", "Second one", "blur", "sharpen"]
+    # the rest of the reply took several more chunks
+    assert end - events[0][0] > 0.1
+    assert events[2][0] < end
+    assert chat.metrics[-1].prompt_tokens == 2
+    assert chat.messages[-1]["role"] == "assistant"
+    assert start < events[0][0]
@@ -0,0 +1,92 @@
+"""
+Test Suite for the local fast path of chat commands.
+"""
+import pytest
+
+from src.napari_image_filters import (
+    apply_contrast_enhancement,
+    apply_edge_detection,
+    apply_edge_enhance,
+    apply_gaussian_blur,
+    apply_grayscale,
+    apply_saturation,
+    apply_sharpening,
+)
+from src.ai_intents import IntentParser
+
+
+@pytest.fixture
+def parser():
+    return IntentParser({
+        "grayscale": apply_grayscale,
+        "saturation": apply_saturation,
+        "edge_enhance": apply_edge_enhance,
+        "edge_detection": apply_edge_detection,
+        "blur": apply_gaussian_blur,
+        "contrast": apply_contrast_enhancement,
+        "sharpen": apply_sharpening,
+    })
+
+
+def parsed(parser, message):
+    actions = parser.parse(message)
+    if actions is None:
+        return None
+    return [(action.action_name, action.action_args) for action in actions]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("message, expected", [
+    ("grayscale", [("grayscale", [])]),
+    ("Blur 3", [("blur", [3])]),
+    ("blur three.", [("blur", [3])]),
+    ("please apply a gaussian blur with radius 2.5",
+     [("blur", [2.5])]),
+    ("sharpn", [("sharpen", [])]),
+    ("saturation 150", [("saturation", [150])]),
+    ("detect edges then enhance edges",
+     [("edge_detection", []), ("edge_enhance", [])]),
+    ("contrast, grey", [("contrast", []), ("grayscale", [])]),
+])
+def test_commands_are_parsed(parser, message, expected):
+    """
+    Test that messages naming commands give the actions the LLM would.
+    """
+    assert parsed(parser, message) == expected
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("message", [
+    "edge",
+    "saturation",
+    "grayscale 3",
+    "blur 3 5",
+    "what does blur do?",
+    "make it a bit brighter",
+    "",
+])
+def test_ambiguous_messages_fall_through(parser, message):
+    """
+    Test that vague messages, questions and commands missing or with extra
+    numbers are left to the LLM.
+    """
+    assert parser.parse(message) is None
+
+
+@pytest.mark.unit
+def test_stats(parser):
+    """
+    Test the hit counters and the savings estimated from LLM round-trips.
+    """
+    parser.parse("blur 2")
+    parser.parse("sharpen")
+    parser.parse("how are you")
+    parser.stats.record_llm(1.5, 400)
+    parser.stats.record_llm(0.5, 200)
+
+    assert parser.stats.hits == 2
+    assert parser.stats.misses == 1
+    assert parser.stats.hit_rate == pytest.approx(2 / 3)
+    assert parser.stats.saved_seconds == pytest.approx(2.0)
+    assert parser.stats.saved_tokens == 600
+    assert "2/3 messages" in repr(parser.stats)
@@ -0,0 +1,82 @@
+"""
+Test Suite for background chat requests, against the stub OpenAI server.
+"""
+import threading
+import time
+import pytest
+import openai
+
+from src.ai_requests import ChatRequestPool
+
+
+@pytest.mark.unit
+def test_pool_runs_requests_concurrently(chat, qtbot):
+    """
+    Test that requests run at the same time off the main thread and that
+    their replies and errors are handed over on the main thread.
+    """
+    pool = ChatRequestPool(chat, max_in_flight=4)
+    results, errors, threads = [], [], []
+
+    def on_result(reply):
+        threads.append(threading.current_thread())
+        results.append(reply[0])
+
+    start = time.perf_counter()
+    with qtbot.waitSignal(pool.idle, timeout=10000):
+        for index in range(3):
+            pool.submit(f"sleep 0.5 {index}", on_result, errors.append)
+        pool.submit("sleep 2", on_result, errors.append, timeout=0.2)
+        # the event loop keeps running while the requests are in flight
+        assert pool.in_flight() == 4
+    assert time.perf_counter() - start < 1.5
+
+    assert sorted(results) == [f"echo sleep 0.5 {index}" for index in range(3)]
+    assert set(threads) == {threading.main_thread()}
+    assert len(errors) == 1
+    assert isinstance(errors[0], openai.APITimeoutError)
+    pool.shutdown()
+
+
+@pytest.mark.unit
+def test_pool_limits_and_cancels(chat, stub_server, qtbot):
+    """
+    Test that requests above max_in_flight wait, and that cancelled
+    requests hand over no reply.
+    """
+    pool = ChatRequestPool(chat, max_in_flight=1)
+    results = []
+    with qtbot.waitSignal(pool.idle, timeout=10000):
+        pool.submit("sleep 0.3", results.append)
+        pool.submit("second", results.append)
+        assert pool.in_flight() == 2
+        pool.cancel()
+    assert results == []
+    assert pool.in_flight() == 0
+    # the second request was still waiting and never sent
+    assert stub_server.requests == ["sleep 0.3"]
+    pool.shutdown()
+
+
+@pytest.mark.unit
+def test_pool_streams_replies(chat, qtbot):
+    """
+    Test that streamed sentences and actions are handed over on the main
+    thread as they arrive, before the result.
+    """
+    pool = ChatRequestPool(chat)
+    events, threads = [], []
+
+    def record(kind):
+        def callback(value):
+            threads.append(threading.current_thread())
+            events.append(kind)
+        return callback
+
+    with qtbot.waitSignal(pool.idle, timeout=10000):
+        pool.submit("One. Two", record("result"),
+                    on_sentence=record("sentence"),
+                    on_action=record("action"))
+    assert events == ["sentence", "sentence", "action", "action", "result"]
+    assert set(threads) == {threading.main_thread()}
+    pool.shutdown()
@@ -66,6 +66,8 @@ def image_layer():
 def widget(qapp, viewer):
     """Create the image filter widget with a mock viewer."""
     widget = ImageFilterWidget(viewer)
+    # filters run synchronously unless a test enables background jobs
+    widget.background_checkbox.setChecked(False)
     return widget
 
 
@@ -145,6 +147,167 @@ def test_filter_methods(widget, image_layer, filter_func):
     method()  # Should not raise exception
 
 
+@pytest.mark.parametrize("filter_func", [
+    "_apply_edge_detection",
+    "_apply_gaussian_blur",
+    "_apply_grayscale",
+])
+def test_filter_methods_on_stack(widget, image_layer, filter_func):
+    """Test that z-stack layers are filtered as a whole stack."""
+    stack = np.stack([image_layer.data[..., 0]] * 4)
+    stack_layer = napari.layers.Image(stack)
+    widget.viewer.layers.selection.append(stack_layer)
+    getattr(widget, filter_func)()
+
+    filtered = widget.viewer.add_image.call_args[0][0]
+    assert filtered.shape == stack.shape
+
+
+def test_saturation_on_stack_is_vectorized(widget, image_layer, monkeypatch):
+    """Test that the saturation slider uses the vectorized stack path."""
+    from src import napari_image_filters_stack as stack_filters
+    from src.napari_image_filters import apply_saturation
+    stack_saturation = MagicMock(
+        side_effect=stack_filters.STACK_FUNCTIONS[apply_saturation])
+    monkeypatch.setitem(
+        stack_filters.STACK_FUNCTIONS, apply_saturation, stack_saturation)
+
+    stack = np.stack([image_layer.data] * 3)
+    widget.viewer.layers.selection.append(napari.layers.Image(stack))
+    widget.workflow.recording = True
+    widget.sat_slider.setValue(150)
+
+    stack_saturation.assert_called_once()
+    filtered = widget.viewer.add_image.call_args[0][0]
+    assert filtered.shape == stack.shape
+
+    step = widget.workflow.current_workflow[-1]
+    assert step.__name__ == "apply_saturation"
+    np.testing.assert_array_equal(
+        step(image_layer.data), apply_saturation(image_layer.data, 1.5))
+
+
+def test_native_dtype_mode(widget, image_layer):
+    """Test that "Keep bit depth" filters 16-bit layers without truncation."""
+    data = image_layer.data.astype(np.uint16) * 257
+    widget.viewer.layers.selection.append(napari.layers.Image(data))
+    widget.native_dtype_checkbox.setChecked(True)
+    widget._apply_gaussian_blur()
+
+    filtered = widget.viewer.add_image.call_args[0][0]
+    assert filtered.dtype == np.uint16
+    assert filtered.max() > 255
+
+
+def test_native_dtype_mode_is_recorded(widget, image_layer):
+    """Test that workflows replay the native filter that was recorded."""
+    from src.napari_image_filters_native import NATIVE_FUNCTIONS
+    from src.napari_image_filters import apply_gaussian_blur
+    data = image_layer.data.astype(np.uint16) * 257
+    widget.viewer.layers.selection.append(napari.layers.Image(data))
+    widget.workflow.recording = True
+    widget.native_dtype_checkbox.setChecked(True)
+    widget._apply_gaussian_blur()
+
+    step = widget.workflow.current_workflow[-1]
+    assert step is NATIVE_FUNCTIONS[apply_gaussian_blur]
+
+    # replaying keeps the bit depth even with the box unchecked
+    widget.native_dtype_checkbox.setChecked(False)
+    widget._apply_filter(step)
+    filtered = widget.viewer.add_image.call_args[0][0]
+    assert filtered.dtype == np.uint16
+
+
+def test_lazy_layer_stays_lazy(widget, image_layer):
+    """Test that filtering a dask backed layer gives a lazy result."""
+    import dask.array as da
+    data = da.from_array(image_layer.data, chunks=64)
+    widget.viewer.layers.selection.append(napari.layers.Image(data))
+    widget._apply_gaussian_blur()
+
+    filtered = widget.viewer.add_image.call_args[0][0]
+    assert isinstance(filtered, da.Array)
+    assert filtered.shape == image_layer.data.shape
+
+
+def test_worker_count_setting(widget):
+    """Test that the threads spin box sets the filter worker count."""
+    from src.napari_image_filters_parallel import (
+        get_worker_count, set_worker_count)
+    previous = get_worker_count()
+    widget.workers_spinbox.setValue(2)
+    assert get_worker_count() == 2
+    set_worker_count(previous)
+
+
+def test_multiscale_layer_filters_full_resolution(widget, image_layer):
+    """Test that multiscale layers are filtered lazily at level 0."""
+    import dask.array as da
+    pyramid = [image_layer.data, image_layer.data[::2, ::2]]
+    widget.viewer.layers.selection.append(
+        napari.layers.Image(pyramid, multiscale=True))
+    widget._apply_gaussian_blur()
+
+    filtered = widget.viewer.add_image.call_args[0][0]
+    assert isinstance(filtered, da.Array)
+    assert filtered.shape == image_layer.data.shape
+
+
+def test_chat_command_on_lazy_layer(widget, image_layer):
+    """Test that chat commands keep dask backed layers lazy."""
+    import dask.array as da
+    from src.ai import ActionModel
+    data = da.from_array(image_layer.data, chunks=64)
+    widget.viewer.layers.selection.append(napari.layers.Image(data))
+    widget.chat_widget.execute_command(
+        [ActionModel(action_name="blur", action_args=[])])
+
+    filtered = widget.viewer.add_image.call_args[0][0]
+    assert isinstance(filtered, da.Array)
+
+
+def test_chat_command_pushes_history_once(widget, image_layer):
+    """Test that a chat command adds a single undo step."""
+    from src.ai import ActionModel
+    widget.viewer.layers.selection.append(image_layer)
+    widget.chat_widget.execute_command(
+        [ActionModel(action_name="blur", action_args=[])])
+    assert len(widget.history_stack) == 1
+
+
+def test_history_memory_budget(widget, image_layer):
+    """Test that the undo history is bounded by its memory budget."""
+    widget.viewer.layers.selection.append(image_layer)
+    widget.history_spinbox.setValue(0)
+    for value in range(3):
+        image_layer.data = np.full_like(image_layer.data, value)
+        widget._push_to_history(image_layer)
+
+    # only the newest state is kept
+    assert len(widget.history_stack) == 1
+    widget._undo_last_change()
+    assert np.all(image_layer.data == 2)
+
+
+def test_result_cache(widget, image_layer):
+    """Test that repeating a filter call reuses the cached result."""
+    widget.viewer.layers.selection.append(image_layer)
+    widget._apply_gaussian_blur()
+    first = widget.viewer.add_image.call_args[0][0]
+    widget._apply_gaussian_blur()
+    second = widget.viewer.add_image.call_args[0][0]
+
+    assert second is first
+    stats = widget.result_cache.stats()
+    assert (stats.hits, stats.misses) == (1, 1)
+
+    # a budget of 0 disables the cache
+    widget.cache_spinbox.setValue(0)
+    widget._apply_gaussian_blur()
+    assert widget.viewer.add_image.call_args[0][0] is not first
+
+
 def test_saturation_adjustment(widget, image_layer):
     """Test saturation slider functionality."""
     widget.viewer.layers.selection = [image_layer]
@@ -152,6 +315,213 @@ def test_saturation_adjustment(widget, image_layer):
     assert widget.sat_label.text() == "Saturation: 1.50"
 
 
+def test_saturation_live_preview(widget, image_layer):
+    """Test that dragging previews in one layer and release commits once."""
+    big = np.repeat(np.repeat(image_layer.data, 6, axis=0), 6, axis=1)
+    layer = napari.layers.Image(big, rgb=True)
+    widget.viewer.layers.selection.append(layer)
+    widget.viewer.layers.__contains__.return_value = True
+
+    widget.sat_slider.setSliderDown(True)
+    for value in (110, 120, 130):
+        widget.sat_slider.setValue(value)
+    # slider events are coalesced into one pending preview
+    assert widget._preview_timer.isActive()
+    widget.viewer.add_image.assert_not_called()
+
+    widget._preview_saturation()
+    preview = widget.viewer.add_image.call_args[0][0]
+    assert max(preview.shape[:2]) <= 1024
+    assert widget.viewer.add_image.call_args[1]["scale"] == [2, 2]
+
+    # later previews update the same layer in place
+    widget.sat_slider.setValue(150)
+    widget._preview_saturation()
+    assert widget.viewer.add_image.call_count == 1
+    assert widget._preview_layer.data is not preview
+
+    # releasing the slider emits sliderReleased
+    widget.sat_slider.setSliderDown(False)
+    widget.viewer.layers.remove.assert_called_once()
+    assert widget.viewer.add_image.call_count == 2
+    assert widget.viewer.add_image.call_args[0][0].shape == big.shape
+    assert len(widget.history_stack) == 1
+
+
+def test_split_channels_as_views(widget, image_layer):
+    """Test that channel layers are colormapped views of the layer data."""
+    widget.viewer.layers.selection.append(image_layer)
+    widget._split_channels()
+
+    calls = widget.viewer.add_image.call_args_list
+    assert len(calls) == 3
+    for channel, (args, kwargs) in enumerate(calls):
+        assert np.shares_memory(args[0], image_layer.data)
+        np.testing.assert_array_equal(
+            args[0], image_layer.data[..., channel])
+        assert kwargs["colormap"] == ("red", "green", "blue")[channel]
+
+    # unchecked, the channels are copies with the others zeroed
+    widget.channel_views_checkbox.setChecked(False)
+    widget._split_channels()
+    assert widget.viewer.add_image.call_count == 6
+    assert widget.viewer.add_image.call_args[0][0].shape == \
+        image_layer.data.shape
+
+
+def test_background_filter_job(widget, image_layer, qtbot):
+    """Test that background jobs add their result on completion."""
+    widget.background_checkbox.setChecked(True)
+    widget.viewer.layers.selection.append(image_layer)
+    widget._apply_gaussian_blur()
+
+    with qtbot.waitSignal(widget.job_queue.idle, timeout=10000):
+        pass
+    widget.viewer.add_image.assert_called_once()
+    assert widget.viewer.add_image.call_args[0][0].shape == \
+        image_layer.data.shape
+    assert not widget.job_progress.isVisible()
+
+
+def test_background_jobs_supersede(widget, image_layer, qtbot):
+    """Test that only the newest saturation of a layer is added."""
+    from src.napari_image_filters import apply_saturation
+    widget.background_checkbox.setChecked(True)
+    widget.viewer.layers.selection.append(image_layer)
+    for value in (50, 120, 180):
+        widget.sat_slider.setValue(value)
+        widget._apply_saturation()
+
+    with qtbot.waitSignal(widget.job_queue.idle, timeout=10000):
+        pass
+    widget.viewer.add_image.assert_called_once()
+    expected = widget._run_filter(apply_saturation, image_layer.data, 1.8)[0]
+    np.testing.assert_array_equal(
+        widget.viewer.add_image.call_args[0][0], expected)
+
+
+def test_stack_filtered_in_batches(widget, image_layer, monkeypatch):
+    """Test that batching a stack gives the result of a single call."""
+    from src import napari_image_filtering_interface as interface
+    from src.napari_image_filters import apply_gaussian_blur
+    from src.napari_image_filters_stack import apply_stack
+    monkeypatch.setattr(interface, "JOB_BATCH_BYTES", 0)
+    stack = np.stack([image_layer.data[..., 0]] * 45)
+    result, impl = widget._run_filter(apply_gaussian_blur, stack)
+    np.testing.assert_array_equal(result, apply_stack(impl, stack))
+
+
+@pytest.fixture
+def model_widget(qapp):
+    """Widget on a napari ViewerModel, which keeps real layer lists."""
+    from napari.components import ViewerModel
+    widget = ImageFilterWidget(ViewerModel())
+    widget.background_checkbox.setChecked(False)
+    return widget
+
+
+def test_update_in_place(model_widget, image_layer):
+    """Test that repeated calls of a filter update one result layer."""
+    viewer = model_widget.viewer
+    source = viewer.add_image(image_layer.data, name="source")
+    model_widget.in_place_checkbox.setChecked(True)
+    # cached results are shared and read only, so disable the cache to
+    # see the buffer reused
+    model_widget.cache_spinbox.setValue(0)
+
+    buffers = []
+    for value in (50, 120, 180):
+        viewer.layers.selection = {source}
+        model_widget.sat_slider.setValue(value)
+        buffers.append(viewer.layers[-1].data)
+
+    assert len(viewer.layers) == 2
+    assert all(buffer is buffers[0] for buffer in buffers)
+    from src.napari_image_filters import apply_saturation
+    expected = model_widget._run_filter(
+        apply_saturation, image_layer.data, 1.8)[0]
+    np.testing.assert_array_equal(viewer.layers[-1].data, expected)
+
+
+def test_result_layer_cap(model_widget, image_layer):
+    """Test that the oldest result layers are removed beyond the cap."""
+    viewer = model_widget.viewer
+    source = viewer.add_image(image_layer.data, name="source")
+    model_widget.layer_cap_spinbox.setValue(2)
+    for _ in range(4):
+        viewer.layers.selection = {source}
+        model_widget._apply_gaussian_blur()
+
+    assert len(viewer.layers) == 3
+    assert viewer.layers[0] is source
+
+
+def test_original_data_per_layer(widget, image_layer):
+    """Test that each layer keeps a read only view of its original data."""
+    other = napari.layers.Image(np.zeros((32, 32), np.uint8))
+    selection = widget.viewer.layers.selection
+
+    selection.append(image_layer)
+    widget._get_current_layer()
+    first = widget.original_data
+    assert np.shares_memory(first, image_layer.data)
+    assert not first.flags.writeable
+
+    selection[:] = [other]
+    widget._get_current_layer()
+    assert widget.original_data.shape == (32, 32)
+
+    # replacing the layer data keeps the original
+    selection[:] = [image_layer]
+    image_layer.data = np.zeros_like(image_layer.data)
+    widget._get_current_layer()
+    assert widget.original_data is first
+
+
+def test_chat_command_filters_current_layer(widget, image_layer):
+    """Test that chat commands read the current layer without a copy."""
+    from src.ai import ActionModel
+    other = napari.layers.Image(np.zeros((40, 40, 3), np.uint8))
+    selection = widget.viewer.layers.selection
+    selection.append(image_layer)
+    widget._get_current_layer()
+    selection[:] = [other]
+
+    widget.chat_widget.execute_command(
+        [ActionModel(action_name="blur", action_args=[])])
+    assert widget.viewer.add_image.call_args[0][0].shape == (40, 40, 3)
+
+
+def test_workflow_profile(model_widget, image_layer):
+    """Test that profiled workflow runs report every step in the chat."""
+    from src.napari_image_filters import apply_gaussian_blur, apply_sharpening
+    from src.pipelines import Pipeline
+    viewer = model_widget.viewer
+    source = viewer.add_image(image_layer.data, name="source")
+    messages = []
+    model_widget.add_to_chat = messages.append
+
+    workflow = model_widget.workflow
+    pipeline = Pipeline()
+    pipeline.name = "profiled"
+    pipeline.add_func(apply_gaussian_blur)
+    pipeline.add_func(apply_sharpening)
+    workflow.workflows[pipeline.name] = pipeline
+    workflow.profile_checkbox.setChecked(True)
+
+    for compiled in (False, True):
+        messages.clear()
+        viewer.layers.selection = {source}
+        workflow.compiled_checkbox.setChecked(compiled)
+        workflow.apply_wf(pipeline.name)
+        profile = workflow.last_profile
+        assert [stage.name for stage in profile.stages] == \
+            ["apply_gaussian_blur", "apply_sharpening"]
+        assert profile.stages[-1].output["shape"] == \
+            list(image_layer.data.shape)
+        assert any(message.startswith("[Profile]") for message in messages)
+
+
 def test_undo_functionality(widget, image_layer):
     """Test undo operation."""
     widget.viewer.layers.selection.append(image_layer)
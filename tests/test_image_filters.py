@@ -23,7 +23,9 @@ from src.napari_image_filters import (
     apply_adaptive_threshold,
     apply_sharpening,
     apply_ridge_detection,
-    sanitize_dimensional_image
+    channel_views,
+    sanitize_dimensional_image,
+    split_channels
 )
 
 
@@ -305,3 +307,31 @@ def test_ridge_detection(sample_images):
     ridges_img = apply_ridge_detection(sample_images['gray_pil'])
     assert isinstance(ridges_img, np.ndarray)
     assert ridges_img.ndim == 2
+
+
+@pytest.mark.unit
+def test_channel_views(sample_images):
+    """
+    Test that channels are views of the image, for images and stacks.
+    """
+    rgb = sample_images['rgb_array']
+    views = channel_views(rgb)
+    assert len(views) == 3
+    for channel, view in enumerate(views):
+        assert np.shares_memory(view, rgb)
+        np.testing.assert_array_equal(view, rgb[..., channel])
+
+    stack = np.stack([rgb, rgb])
+    assert channel_views(stack)[1].shape == stack.shape[:3]
+
+    with pytest.raises(ValueError):
+        channel_views(sample_images['gray_array'])
+
+
+@pytest.mark.unit
+def test_split_channels_rejects_greyscale(sample_images):
+    """
+    Test that split_channels raises a ValueError for greyscale images.
+    """
+    with pytest.raises(ValueError):
+        split_channels(sample_images['gray_array'])
@@ -0,0 +1,104 @@
+"""
+Test Suite for the filter result cache.
+"""
+from functools import partial
+import pytest
+import numpy as np
+import dask.array as da
+
+from src.napari_image_filters import apply_gaussian_blur, apply_saturation
+from src.napari_image_filters_native import as_native
+from src.napari_image_filters_cache import ResultCache, array_digest
+
+
+@pytest.mark.unit
+def test_cache_key(rgb_image):
+    """
+    Test that keys depend on the content, the filter and its arguments.
+    """
+    key = ResultCache.make_key(rgb_image, apply_saturation, 1.5)
+    assert key == ResultCache.make_key(rgb_image.copy(), apply_saturation, 1.5)
+    assert key != ResultCache.make_key(rgb_image, apply_saturation, 0.5)
+    assert key != ResultCache.make_key(
+        rgb_image, as_native(apply_saturation), 1.5)
+
+    changed = rgb_image.copy()
+    changed[0, 0, 0] ^= 1
+    assert key != ResultCache.make_key(changed, apply_saturation, 1.5)
+
+    # partials are keyed on their function and bound arguments
+    assert ResultCache.make_key(
+        rgb_image, partial(apply_saturation, saturation_level=1.5)) == \
+        ResultCache.make_key(
+            rgb_image, partial(apply_saturation, saturation_level=1.5))
+
+
+@pytest.mark.unit
+def test_cache_key_lazy(rgb_image):
+    """
+    Test that dask arrays are keyed on their graph, other data not at all.
+    """
+    lazy = da.from_array(rgb_image, chunks=64)
+    assert array_digest(lazy) == array_digest(lazy)
+    assert array_digest(lazy) != array_digest(lazy + 1)
+    assert ResultCache.make_key(object(), apply_gaussian_blur) is None
+
+
+@pytest.mark.unit
+def test_cache_hits_and_misses(rgb_image):
+    """
+    Test lookups, read only results and hit/miss statistics.
+    """
+    cache = ResultCache()
+    key = cache.make_key(rgb_image, apply_gaussian_blur)
+    assert cache.get(key) is None
+
+    result = cache.put(key, apply_gaussian_blur(rgb_image))
+    assert not result.flags.writeable
+    assert cache.get(key) is result
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries) == (1, 1, 1)
+    assert stats.hit_rate == 0.5
+    assert stats.current_bytes == result.nbytes
+    assert "1 hits" in repr(stats)
+
+
+@pytest.mark.unit
+def test_cache_lru_eviction():
+    """
+    Test that the least recently used results are evicted over budget.
+    """
+    blocks = [np.full((10, 10), i, np.uint8) for i in range(4)]
+    cache = ResultCache(max_bytes=250)
+    for i, block in enumerate(blocks[:2]):
+        cache.put(("key", i), block)
+    cache.get(("key", 0))
+    cache.put(("key", 2), blocks[2])
+
+    # key 1 was the least recently used
+    assert cache.get(("key", 1)) is None
+    assert cache.get(("key", 0)) is blocks[0]
+    assert cache.stats().evictions == 1
+
+    # results over budget are returned but not kept
+    large = np.zeros(1000, np.uint8)
+    assert cache.put(("key", 3), large) is large
+    assert cache.get(("key", 3)) is None
+
+    cache.set_max_bytes(100)
+    assert len(cache) == 1
+    cache.clear()
+    assert len(cache) == 0 and cache.current_bytes == 0
+
+
+@pytest.mark.unit
+def test_cache_tuple_results(rgb_image):
+    """
+    Test that filters returning several images are cached as a whole.
+    """
+    cache = ResultCache()
+    parts = (rgb_image.copy(), rgb_image.copy())
+    cache.put("split", parts)
+    assert cache.current_bytes == 2 * rgb_image.nbytes
+    assert all(not part.flags.writeable for part in cache.get("split"))
@@ -0,0 +1,111 @@
+"""
+Test Suite for the memory bounded undo history.
+"""
+import pytest
+import numpy as np
+import dask.array as da
+
+from src import napari_image_filters_history
+from src.napari_image_filters_history import UndoHistory
+
+
+@pytest.fixture
+def states():
+    rng = np.random.default_rng(0)
+    first = rng.integers(0, 255, (64, 80, 3), dtype=np.uint8)
+    second = first.copy()
+    second[10:20, 10:20] = 0
+    return [first, second, second.copy(), second[..., 0].astype(np.float32),
+            first]
+
+
+@pytest.mark.unit
+def test_undo_restores_states(states):
+    """
+    Test that states come back newest first, across shape and dtype
+    changes.
+    """
+    history = UndoHistory()
+    for state in states:
+        history.push(state)
+    assert len(history) == len(states)
+
+    for state in reversed(states):
+        restored = history.pop()
+        assert restored.dtype == state.dtype
+        np.testing.assert_array_equal(restored, state)
+    assert len(history) == 0
+    with pytest.raises(IndexError):
+        history.pop()
+
+
+@pytest.mark.unit
+def test_push_copies(states):
+    """
+    Test that later changes to a pushed array do not change the history.
+    """
+    history = UndoHistory()
+    state = states[0].copy()
+    history.push(state)
+    state[:] = 0
+    np.testing.assert_array_equal(history.pop(), states[0])
+
+
+@pytest.mark.unit
+def test_chunked_deltas(states, monkeypatch):
+    """
+    Test states spanning several compressed chunks.
+    """
+    monkeypatch.setattr(napari_image_filters_history, "CHUNK_BYTES", 1000)
+    history = UndoHistory()
+    for state in states:
+        history.push(state)
+    for state in reversed(states):
+        np.testing.assert_array_equal(history.pop(), state)
+
+
+@pytest.mark.unit
+def test_unchanged_states_are_free(states):
+    """
+    Test that repeated pushes of the same state only hold one copy.
+    """
+    history = UndoHistory()
+    for _ in range(10):
+        history.push(states[0])
+    assert history.nbytes == states[0].nbytes
+
+
+@pytest.mark.unit
+def test_memory_budget(states):
+    """
+    Test that the oldest states are dropped above the budget and the
+    newest one is always kept.
+    """
+    rng = np.random.default_rng(1)
+    noise = [rng.integers(0, 255, (64, 80), dtype=np.uint8)
+             for _ in range(5)]
+    history = UndoHistory(max_bytes=3 * noise[0].nbytes)
+    for state in noise:
+        history.push(state)
+    assert history.nbytes <= history.max_bytes
+    assert 1 < len(history) < len(noise)
+    np.testing.assert_array_equal(history.pop(), noise[-1])
+
+    history.set_max_bytes(0)
+    assert len(history) == 1
+
+
+@pytest.mark.unit
+def test_lazy_states_are_references(states):
+    """
+    Test that dask backed states are kept by reference at no cost.
+    """
+    lazy = da.from_array(states[0], chunks=32)
+    history = UndoHistory()
+    history.push(lazy)
+    assert history.nbytes == 0
+
+    history.push(states[1])
+    history.push(lazy)
+    assert history.pop() is lazy
+    np.testing.assert_array_equal(history.pop(), states[1])
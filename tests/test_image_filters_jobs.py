@@ -0,0 +1,79 @@
+"""
+Test Suite for the background filter job queue.
+"""
+import time
+import pytest
+
+from src.napari_image_filters_jobs import FilterJobQueue
+
+
+def slow_job(value, steps=5, delay=0.01):
+    def work():
+        for step in range(steps):
+            yield step / steps
+            time.sleep(delay)
+        return value
+    return work
+
+
+@pytest.fixture
+def queue(qtbot):
+    queue = FilterJobQueue()
+    yield queue
+    queue.cancel()
+    if queue.is_busy():
+        qtbot.waitSignal(queue.idle, timeout=10000).wait()
+
+
+@pytest.mark.unit
+def test_jobs_run_in_order(queue, qtbot):
+    """
+    Test that jobs with different keys all run, one after the other.
+    """
+    results = []
+    with qtbot.waitSignal(queue.idle, timeout=10000):
+        for value in range(3):
+            queue.submit(value, "job", slow_job(value), results.append)
+    assert results == [0, 1, 2]
+
+
+@pytest.mark.unit
+def test_newest_job_supersedes(queue, qtbot):
+    """
+    Test that a job replaces queued and running jobs with the same key.
+    """
+    results = []
+    with qtbot.waitSignal(queue.idle, timeout=10000):
+        for value in range(4):
+            queue.submit("saturation", "job", slow_job(value), results.append)
+    assert results == [3]
+
+
+@pytest.mark.unit
+def test_progress_and_cancel(queue, qtbot):
+    """
+    Test that progress is reported and a cancelled job returns nothing.
+    """
+    results, progress = [], []
+    queue.progress.connect(lambda name, fraction: progress.append(fraction))
+    with qtbot.waitSignal(queue.idle, timeout=10000):
+        queue.submit("key", "job", slow_job(1, steps=1000), results.append)
+        qtbot.waitUntil(lambda: len(progress) > 2, timeout=10000)
+        queue.cancel()
+    assert results == []
+    assert not queue.is_busy()
+
+
+@pytest.mark.unit
+def test_errors_are_reported(queue, qtbot):
+    """
+    Test that the error callback receives the exception of a failed job.
+    """
+    def failing():
+        yield 0.0
+        raise ValueError("bad input")
+
+    errors = []
+    with qtbot.waitSignal(queue.idle, timeout=10000):
+        queue.submit("key", "job", failing, print, errors.append)
+    assert isinstance(errors[0], ValueError)
@@ -0,0 +1,113 @@
+"""
+Test Suite for the vectorized local binary pattern.
+"""
+import pytest
+import numpy as np
+from skimage.feature import local_binary_pattern
+
+from src import napari_image_filters_lbp
+from src.napari_image_filters import apply_texture_analysis
+from src.napari_image_filters_lbp import (
+    local_binary_pattern_uniform,
+    uniform_lut,
+)
+from src.napari_image_filters_stack import _apply_per_frame, apply_stack
+
+
+@pytest.fixture
+def gray_stack():
+    rng = np.random.default_rng(0)
+    return (rng.random((3, 41, 53)) * 255).astype(np.uint8)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "n_points, radius", [(8, 1), (8, 3), (4, 1.5), (16, 2), (24, 3)])
+def test_matches_skimage(gray_stack, n_points, radius):
+    """
+    Test that the codes equal skimage's uniform LBP, including
+    non-integer radii and point counts above the lookup table size.
+    """
+    image = gray_stack[0]
+    expected = local_binary_pattern(image, n_points, radius, method="uniform")
+    result = local_binary_pattern_uniform(image, n_points, radius)
+
+    assert result.dtype == np.uint8
+    np.testing.assert_array_equal(result, expected)
+
+
+@pytest.mark.unit
+def test_matches_skimage_uint16():
+    """
+    Test that 16-bit images are compared at full precision.
+    """
+    rng = np.random.default_rng(1)
+    image = (rng.random((30, 30)) * 65535).astype(np.uint16)
+    expected = local_binary_pattern(image, 8, 2, method="uniform")
+    np.testing.assert_array_equal(
+        local_binary_pattern_uniform(image, 8, 2), expected)
+
+
+@pytest.mark.unit
+def test_row_blocks_match_skimage(gray_stack, monkeypatch):
+    """
+    Test that blocks of rows agree with a single pass at the block seams.
+    """
+    monkeypatch.setattr(napari_image_filters_lbp, "BLOCK_PIXELS", 5 * 53)
+    expected = local_binary_pattern(gray_stack[0], 8, 3, method="uniform")
+    np.testing.assert_array_equal(
+        local_binary_pattern_uniform(gray_stack[0], 8, 3), expected)
+
+
+@pytest.mark.unit
+def test_batch_matches_frames(gray_stack):
+    """
+    Test that a stack is processed frame by frame in one call.
+    """
+    result = local_binary_pattern_uniform(gray_stack, 8, 3)
+    for frame, codes in zip(gray_stack, result):
+        np.testing.assert_array_equal(
+            codes, local_binary_pattern_uniform(frame, 8, 3))
+
+
+@pytest.mark.unit
+def test_out_buffer(gray_stack):
+    """
+    Test that codes are written into a given buffer of any dtype.
+    """
+    out = np.zeros(gray_stack.shape, np.float64)
+    result = local_binary_pattern_uniform(gray_stack, 8, 3, out=out)
+
+    assert result is out
+    np.testing.assert_array_equal(
+        out, local_binary_pattern_uniform(gray_stack, 8, 3))
+
+    with pytest.raises(ValueError):
+        local_binary_pattern_uniform(gray_stack, out=np.empty((2, 2)))
+
+
+@pytest.mark.unit
+def test_uniform_lut():
+    """
+    Test the code of uniform and non-uniform patterns.
+    """
+    lut = uniform_lut(8)
+    assert lut.shape == (256,)
+    assert lut[0b00000000] == 0
+    assert lut[0b00111000] == 3
+    assert lut[0b11111111] == 8
+    assert lut[0b01010000] == 9
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("shape", [(3, 41, 53), (3, 41, 53, 3)])
+def test_stack_texture_analysis_vectorized(shape):
+    """
+    Test that apply_stack runs texture analysis in one call with the
+    results of the frame loop.
+    """
+    rng = np.random.default_rng(2)
+    stack = (rng.random(shape) * 255).astype(np.uint8)
+    np.testing.assert_array_equal(
+        apply_stack(apply_texture_analysis, stack, 2, 8),
+        _apply_per_frame(apply_texture_analysis, stack, 2, 8))
@@ -0,0 +1,195 @@
+"""
+Test Suite for the native-dtype filter implementations.
+
+Covers dtype preservation for 16-bit and float images and agreement with
+the PIL compatible filters on 8-bit images.
+"""
+import os
+import pytest
+import numpy as np
+from PIL import Image
+
+from src import napari_image_filters as pil_filters
+from src.napari_image_filters_native import (
+    NATIVE_FUNCTIONS,
+    as_native,
+    ensure_array,
+    max_value,
+    apply_grayscale,
+    apply_gaussian_blur,
+    apply_saturation,
+    apply_sharpening,
+    apply_crop,
+    apply_adaptive_threshold,
+    apply_contrast_enhancement,
+    otsu_thresholding,
+)
+
+
+@pytest.fixture(scope="module")
+def sample_images():
+    """
+    Load the test image in 8-bit, 16-bit and float32 variants.
+    """
+    image_path = os.path.join(
+        os.path.dirname(__file__), "resources", "test_image.jpg")
+    rgb_array = np.array(Image.open(image_path))
+    gray_array = np.array(Image.open(image_path).convert("L"))
+
+    return {
+        'rgb_path': image_path,
+        'rgb_uint8': rgb_array,
+        'gray_uint8': gray_array,
+        'rgb_uint16': rgb_array.astype(np.uint16) * 257,
+        'gray_uint16': gray_array.astype(np.uint16) * 257,
+        'rgb_float32': rgb_array.astype(np.float32) / 255,
+        'gray_float32': gray_array.astype(np.float32) / 255,
+    }
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("dtype", ["uint8", "uint16", "float32"])
+@pytest.mark.parametrize("layout", ["rgb", "gray"])
+@pytest.mark.parametrize("pil_func", [
+    pil_filters.apply_grayscale,
+    pil_filters.apply_edge_enhance,
+    pil_filters.apply_edge_detection,
+    pil_filters.apply_gaussian_blur,
+    pil_filters.apply_contrast_enhancement,
+    pil_filters.apply_texture_analysis,
+    pil_filters.apply_adaptive_threshold,
+    pil_filters.apply_sharpening,
+    pil_filters.apply_ridge_detection,
+    pil_filters.otsu_thresholding,
+    pil_filters.otsu_thresholding_no_mask,
+])
+def test_native_keeps_dtype(sample_images, dtype, layout, pil_func):
+    """
+    Test that every native filter returns the dtype it was given.
+    """
+    if pil_func is pil_filters.otsu_thresholding_no_mask and layout == "rgb":
+        pytest.skip("otsu without mask expects a grayscale image")
+
+    img = sample_images[f"{layout}_{dtype}"]
+    result = as_native(pil_func)(img)
+    assert isinstance(result, np.ndarray)
+    assert result.dtype == img.dtype
+    assert result.shape[:2] == img.shape[:2]
+
+
+@pytest.mark.unit
+def test_native_no_truncation(sample_images):
+    """
+    Test that 16-bit data keeps values above 255.
+    """
+    img = sample_images['gray_uint16']
+    assert apply_gaussian_blur(img).max() > 255
+    assert apply_sharpening(img).max() > 255
+    assert apply_saturation(sample_images['rgb_uint16'], 1.5).max() > 255
+    assert otsu_thresholding(img).max() == max_value(np.uint16)
+
+
+@pytest.mark.unit
+def test_native_matches_pil_on_uint8(sample_images):
+    """
+    Test that the native filters agree with PIL on 8-bit images.
+    """
+    rgb = sample_images['rgb_uint8']
+
+    np.testing.assert_array_equal(
+        apply_gaussian_blur(rgb), pil_filters.apply_gaussian_blur(rgb))
+    np.testing.assert_array_equal(
+        apply_sharpening(rgb), pil_filters.apply_sharpening(rgb))
+
+    gray_diff = apply_grayscale(rgb).astype(int) - \
+        pil_filters.apply_grayscale(rgb).astype(int)
+    assert np.abs(gray_diff).max() <= 1
+
+    sat_diff = apply_saturation(rgb, 1.5).astype(int) - \
+        pil_filters.apply_saturation(rgb, 1.5).astype(int)
+    assert np.abs(sat_diff).max() <= 1
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("dtype", ["uint16", "float32"])
+def test_native_adaptive_threshold_scales_c(sample_images, dtype):
+    """
+    Test that c keeps its 8-bit meaning, so masks agree across dtypes.
+    """
+    reference = apply_adaptive_threshold(sample_images['gray_uint8']) > 0
+    mask = apply_adaptive_threshold(sample_images[f"gray_{dtype}"]) > 0
+
+    # not a uniformly white (or black) mask
+    assert 0.05 < mask.mean() < 0.95
+    assert np.mean(mask != reference) < 0.01
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("dtype", ["uint8", "uint16", "float32"])
+def test_native_contrast_enhancement_rgba(sample_images, dtype):
+    """
+    Test that RGBA images are equalized on RGB and keep their alpha.
+    """
+    rgb = sample_images[f"rgb_{dtype}"]
+    alpha = np.full(rgb.shape[:2] + (1,), max_value(rgb.dtype) / 2, rgb.dtype)
+    rgba = np.concatenate([rgb, alpha], axis=2)
+
+    result = apply_contrast_enhancement(rgba)
+    assert result.shape == rgba.shape
+    assert result.dtype == rgba.dtype
+    np.testing.assert_array_equal(result[..., :3], apply_contrast_enhancement(rgb))
+    np.testing.assert_array_equal(result[..., 3], rgba[..., 3])
+
+
+@pytest.mark.unit
+def test_native_crop_is_view(sample_images):
+    """
+    Test that cropping returns a view in the input dtype.
+    """
+    img = sample_images['rgb_uint16']
+    cropped = apply_crop(img, (10, 10, 90, 90))
+    assert cropped.shape[:2] == (80, 80)
+    assert np.shares_memory(cropped, img)
+
+    with pytest.raises(Exception):
+        apply_crop(img, (-1, 0, 10, 10))
+
+
+@pytest.mark.unit
+def test_native_input_types(sample_images):
+    """
+    Test array conversion of file paths and PIL images.
+    """
+    from_path = ensure_array(sample_images['rgb_path'])
+    assert np.array_equal(from_path, sample_images['rgb_uint8'])
+
+    img = sample_images['gray_uint16']
+    assert ensure_array(img) is img
+
+    with pytest.raises(TypeError):
+        ensure_array(42)
+
+
+@pytest.mark.unit
+def test_native_error_handling():
+    """
+    Test error handling of the native filters.
+    """
+    with pytest.raises(ValueError):
+        apply_gaussian_blur(np.zeros((10, 10), np.uint16), radius=-1.0)
+
+    with pytest.raises(ValueError):
+        apply_saturation(np.zeros((10, 10, 3), np.uint16), -1.0)
+
+    with pytest.raises(ValueError):
+        apply_adaptive_threshold(np.zeros((10, 10), np.uint16), block_size=4)
+
+
+@pytest.mark.unit
+def test_native_function_mapping():
+    """
+    Test that every registered filter has a native counterpart.
+    """
+    for func in pil_filters.IMG_FUNCTIONS:
+        assert func in NATIVE_FUNCTIONS
+    assert as_native(print) is print
@@ -0,0 +1,101 @@
+"""
+Test Suite for the thread-pool execution of channel and frame loops.
+"""
+import pytest
+import numpy as np
+
+from src import napari_image_filters_native as native_filters
+from src.napari_image_filters import (
+    apply_gaussian_blur,
+    apply_texture_analysis,
+    otsu_thresholding,
+)
+from src.napari_image_filters_parallel import (
+    get_worker_count,
+    map_slices,
+    parallel_map,
+    set_worker_count,
+)
+from src.napari_image_filters_stack import apply_stack
+
+
+@pytest.fixture
+def workers():
+    """Restore the worker count after the test."""
+    previous = get_worker_count()
+    yield
+    set_worker_count(previous)
+
+
+@pytest.mark.unit
+def test_parallel_map_keeps_order(workers):
+    """
+    Test that results come back in item order with several workers.
+    """
+    set_worker_count(4)
+    assert parallel_map(lambda i: i * i, range(100)) == [
+        i * i for i in range(100)]
+
+
+@pytest.mark.unit
+def test_parallel_map_raises(workers):
+    """
+    Test that exceptions of a task reach the caller.
+    """
+    set_worker_count(4)
+
+    def fail(i):
+        if i == 3:
+            raise ValueError("task failed")
+        return i
+
+    with pytest.raises(ValueError):
+        parallel_map(fail, range(8))
+
+
+@pytest.mark.unit
+def test_map_slices(rgb_image, workers):
+    """
+    Test that slices are written into the output along the given axis.
+    """
+    set_worker_count(3)
+    out = np.empty_like(rgb_image)
+    result = map_slices(lambda channel: 255 - channel, rgb_image, axis=2,
+                        out=out)
+    assert result is out
+    np.testing.assert_array_equal(result, 255 - rgb_image)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("func", [
+    apply_gaussian_blur,
+    native_filters.apply_gaussian_blur,
+    apply_texture_analysis,
+    otsu_thresholding,
+])
+def test_worker_count_does_not_change_results(rgb_image, workers, func):
+    """
+    Test that single and multi threaded runs give identical results.
+    """
+    stack = np.stack([rgb_image[:96, :128], rgb_image[32:128, 16:144]] * 3)
+
+    set_worker_count(1)
+    single = func(rgb_image), apply_stack(func, stack)
+    set_worker_count(4)
+    threaded = func(rgb_image), apply_stack(func, stack)
+
+    for expected, result in zip(single, threaded):
+        np.testing.assert_array_equal(result, expected)
+
+
+@pytest.mark.unit
+def test_set_worker_count(workers):
+    """
+    Test validation of the worker count setting.
+    """
+    set_worker_count(2)
+    assert get_worker_count() == 2
+
+    with pytest.raises(ValueError):
+        set_worker_count(0)
+    assert get_worker_count() == 2
@@ -0,0 +1,139 @@
+"""
+Test Suite for the stack-aware filter execution.
+
+Every vectorized stack implementation must give the same result as the
+single image filter applied frame by frame.
+"""
+import os
+import pytest
+import numpy as np
+from PIL import Image
+
+from src.napari_image_filters import (
+    apply_grayscale,
+    apply_saturation,
+    apply_edge_enhance,
+    apply_edge_detection,
+    apply_gaussian_blur,
+    apply_contrast_enhancement,
+    apply_texture_analysis,
+    apply_adaptive_threshold,
+    apply_sharpening,
+    apply_ridge_detection,
+    apply_crop,
+    otsu_thresholding,
+    otsu_thresholding_no_mask,
+    split_channels,
+)
+from src.napari_image_filters_stack import apply_stack
+
+
+@pytest.fixture(scope="module")
+def stacks():
+    """
+    Build RGB and grayscale stacks from shifted crops of the test image.
+    """
+    image_path = os.path.join(
+        os.path.dirname(__file__), "resources", "test_image.jpg")
+    base_image = np.array(Image.open(image_path))
+
+    rgb = np.stack([
+        base_image[i * 7:i * 7 + 64, i * 5:i * 5 + 80] for i in range(4)])
+    gray = np.stack([
+        np.array(Image.fromarray(frame).convert("L")) for frame in rgb])
+    return {'rgb': rgb, 'gray': gray}
+
+
+def _assert_matches_frames(func, stack, *args, **kwargs):
+    result = apply_stack(func, stack, *args, **kwargs)
+    assert result.shape[0] == stack.shape[0]
+    for i, frame in enumerate(stack):
+        np.testing.assert_array_equal(result[i], func(frame, *args, **kwargs))
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("layout", ["rgb", "gray"])
+@pytest.mark.parametrize("func, args", [
+    (apply_grayscale, ()),
+    (apply_saturation, (0.0,)),
+    (apply_saturation, (1.7,)),
+    (apply_edge_enhance, ()),
+    (apply_edge_detection, ()),
+    (apply_gaussian_blur, ()),
+    (apply_gaussian_blur, (4.5,)),
+    (apply_contrast_enhancement, ()),
+    (apply_texture_analysis, ()),
+    (apply_adaptive_threshold, ()),
+    (apply_sharpening, ()),
+    (apply_ridge_detection, ()),
+    (apply_crop, ((5, 3, 50, 40),)),
+    (otsu_thresholding, ()),
+])
+def test_stack_matches_single_image(stacks, layout, func, args):
+    """
+    Test that stack execution matches the single image filter per frame.
+    """
+    _assert_matches_frames(func, stacks[layout], *args)
+
+
+@pytest.mark.unit
+def test_stack_otsu_no_mask(stacks):
+    """
+    Test Otsu thresholding without cleaning on a grayscale stack.
+    """
+    _assert_matches_frames(otsu_thresholding_no_mask, stacks['gray'])
+
+
+@pytest.mark.unit
+def test_stack_non_uint8_input(stacks):
+    """
+    Test that float stacks are cast the same way as single images.
+    """
+    stack = stacks['rgb'].astype(np.float32) * 1.3
+    _assert_matches_frames(apply_edge_enhance, stack)
+    _assert_matches_frames(apply_saturation, stack, 0.5)
+
+
+@pytest.mark.unit
+def test_stack_split_channels(stacks):
+    """
+    Test that split channels returns one stack per channel.
+    """
+    r, g, b = apply_stack(split_channels, stacks['rgb'])
+    for i, frame in enumerate(stacks['rgb']):
+        for stacked, single in zip((r, g, b), split_channels(frame)):
+            np.testing.assert_array_equal(stacked[i], single)
+
+
+@pytest.mark.unit
+def test_stack_split_channels_rgba(stacks):
+    """
+    Test that RGBA stacks keep their alpha channel like split_channels.
+    """
+    alpha = np.full(stacks['rgb'].shape[:-1] + (1,), 200, np.uint8)
+    rgba = np.concatenate([stacks['rgb'], alpha], axis=-1)
+    parts = apply_stack(split_channels, rgba)
+    for i, frame in enumerate(rgba):
+        for stacked, single in zip(parts, split_channels(frame)):
+            np.testing.assert_array_equal(stacked[i], single)
+
+
+@pytest.mark.unit
+def test_stack_lambda_fallback(stacks):
+    """
+    Test that unknown callables run through the frame loop.
+    """
+    result = apply_stack(lambda img: apply_saturation(img, 0.5), stacks['rgb'])
+    assert result.shape == stacks['rgb'].shape
+
+
+@pytest.mark.unit
+def test_stack_error_handling(stacks):
+    """
+    Test error handling of the stack execution.
+    """
+    with pytest.raises(ValueError):
+        apply_stack(apply_grayscale, stacks['gray'][0, 0])
+
+    with pytest.raises(ValueError):
+        apply_stack(apply_gaussian_blur, stacks['gray'], radius=-1.0)
@@ -0,0 +1,183 @@
+"""
+Test Suite for the tiled filter execution.
+
+Tiled results must match the filter applied to the whole image, while
+staying lazy until computed.
+"""
+import pytest
+from unittest.mock import MagicMock
+import numpy as np
+import dask.array as da
+from PIL import Image
+
+from src.napari_image_filters import (
+    apply_grayscale,
+    apply_saturation,
+    apply_edge_enhance,
+    apply_edge_detection,
+    apply_gaussian_blur,
+    apply_contrast_enhancement,
+    apply_texture_analysis,
+    apply_adaptive_threshold,
+    apply_sharpening,
+    apply_ridge_detection,
+    apply_crop,
+    otsu_thresholding,
+    otsu_thresholding_no_mask,
+    split_channels,
+)
+from src.napari_image_filters_tiled import (
+    CLAHE_TILE_SIZE,
+    DEFAULT_HALO,
+    apply_tiled,
+    filter_halo,
+    is_lazy_array,
+)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("func, args", [
+    (apply_grayscale, ()),
+    (apply_saturation, (1.5,)),
+    (apply_edge_enhance, ()),
+    (apply_edge_detection, ()),
+    (apply_gaussian_blur, (3.0,)),
+    (apply_adaptive_threshold, ()),
+    (apply_sharpening, ()),
+    (apply_ridge_detection, ()),
+    (otsu_thresholding, ()),
+])
+def test_tiled_matches_whole_image(rgb_image, func, args):
+    """
+    Test that tiles with halos give the same result as the whole image.
+    """
+    source = da.from_array(rgb_image, chunks=50)
+    result = apply_tiled(func, source, *args, tile_size=32)
+    assert isinstance(result, da.Array)
+    np.testing.assert_array_equal(result.compute(), func(rgb_image, *args))
+
+
+@pytest.mark.unit
+def test_tiled_texture_analysis(rgb_image):
+    """
+    Test LBP tiles, which only differ on floating point ties.
+    """
+    result = apply_tiled(apply_texture_analysis, rgb_image, tile_size=32)
+    expected = apply_texture_analysis(rgb_image)
+    assert result.shape == expected.shape
+    assert np.mean(result.compute() != expected) < 1e-3
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("tile_size", [64, 100, 1024])
+def test_tiled_contrast_enhancement(rgb_image, tile_size):
+    """
+    Test that CLAHE tiles agree across seams, whatever the chunk size.
+    """
+    result = apply_tiled(
+        apply_contrast_enhancement, rgb_image, tile_size=tile_size)
+    expected = apply_contrast_enhancement(
+        rgb_image, tile_pixels=CLAHE_TILE_SIZE)
+    np.testing.assert_array_equal(result.compute(), expected)
+
+
+@pytest.mark.unit
+def test_tiled_rejects_crop(rgb_image):
+    """
+    Test that filters changing the image shape are not run per tile.
+    """
+    with pytest.raises(ValueError):
+        apply_tiled(apply_crop, rgb_image, (0, 0, 10, 10))
+
+
+@pytest.mark.unit
+def test_tiled_otsu_threshold_is_deferred(rgb_image):
+    """
+    Test that the global histogram pass waits for the first computed tile.
+    """
+    source = MagicMock(wraps=rgb_image)
+    source.shape = rgb_image.shape
+    source.ndim = rgb_image.ndim
+    source.__getitem__ = MagicMock(side_effect=rgb_image.__getitem__)
+
+    result = apply_tiled(otsu_thresholding, source, tile_size=64)
+    reads = source.__getitem__.call_count
+    assert reads == 1  # the sample tile only
+
+    np.testing.assert_array_equal(
+        result.compute(), otsu_thresholding(rgb_image))
+    assert source.__getitem__.call_count > reads
+
+
+@pytest.mark.unit
+def test_tiled_stack(rgb_image):
+    """
+    Test tiled execution of stacks, with per frame Otsu thresholds.
+    """
+    stack = np.stack([rgb_image[..., i] for i in range(3)])
+    for func in [apply_gaussian_blur, otsu_thresholding_no_mask]:
+        result = apply_tiled(func, stack, tile_size=40).compute()
+        expected = np.stack([func(frame) for frame in stack])
+        np.testing.assert_array_equal(result, expected)
+
+
+@pytest.mark.unit
+def test_tiled_split_channels(rgb_image):
+    """
+    Test that filters returning several images give several lazy arrays.
+    """
+    calls = []
+
+    def counting_split(img):
+        calls.append(img.shape)
+        return split_channels(img)
+    counting_split.__name__ = split_channels.__name__
+
+    result = apply_tiled(counting_split, rgb_image, tile_size=64)
+    assert all(isinstance(part, da.Array) for part in result)
+    for tiled, expected in zip(da.compute(*result),
+                               split_channels(rgb_image)):
+        np.testing.assert_array_equal(tiled, expected)
+
+    # the sample, then each tile once for all three parts
+    tiles = -(-rgb_image.shape[0] // 64) * -(-rgb_image.shape[1] // 64)
+    assert len(calls) == 1 + tiles
+
+
+@pytest.mark.unit
+def test_filter_halo():
+    """
+    Test the halo sizes derived from the filter parameters.
+    """
+    assert filter_halo(apply_grayscale, (256, 256)) == 0
+    assert filter_halo(apply_sharpening, (256, 256)) == 1
+    assert filter_halo(apply_gaussian_blur, (256, 256)) == 8
+    assert filter_halo(apply_gaussian_blur, (256, 256), 5.0) == 20
+    assert filter_halo(apply_gaussian_blur, (256, 256), radius=1.0) == 4
+    assert filter_halo(apply_adaptive_threshold, (256, 256), 21) == 10
+    assert filter_halo(
+        apply_contrast_enhancement, (256, 256), tile_pixels=32) == 32
+    assert filter_halo(apply_texture_analysis, (256, 256), radius=2) == 3
+    assert filter_halo(lambda img: img, (256, 256)) == DEFAULT_HALO
+
+
+@pytest.mark.unit
+def test_is_lazy_array(rgb_image):
+    """
+    Test detection of lazily backed layer data.
+    """
+    assert not is_lazy_array(rgb_image)
+    assert not is_lazy_array(Image.fromarray(rgb_image))
+    assert is_lazy_array(da.from_array(rgb_image))
+    assert is_lazy_array([rgb_image, rgb_image[::2, ::2]])
+
+
+@pytest.mark.unit
+def test_tiled_multiscale(rgb_image):
+    """
+    Test that multiscale pyramids are filtered at full resolution.
+    """
+    pyramid = [da.from_array(rgb_image), da.from_array(rgb_image[::2, ::2])]
+    result = apply_tiled(apply_gaussian_blur, pyramid, tile_size=64)
+    np.testing.assert_array_equal(
+        result.compute(), apply_gaussian_blur(rgb_image))
@@ -0,0 +1,373 @@
+"""
+Test Suite for the Pipeline class and its execution modes.
+"""
+import json
+import pickle
+import tracemalloc
+from functools import partial
+import pytest
+import numpy as np
+from cellpose.models import CellposeModel
+
+from src.napari_image_filters import (
+    apply_gaussian_blur,
+    apply_sharpening,
+    apply_grayscale,
+    apply_edge_detection,
+    apply_saturation,
+    split_channels,
+)
+from src import pipelines
+from src.napari_image_filters_cache import ResultCache
+from src.pipelines import (
+    Pipeline, CompiledPipeline, PIPELINE_FORMAT_VERSION, load_pipeline,
+    save_pipeline
+)
+
+
+@pytest.fixture
+def pipeline():
+    """A recorded workflow with a grayscale step in the middle."""
+    pipeline = Pipeline()
+    pipeline.name = "test"
+    for func in [apply_gaussian_blur, apply_sharpening,
+                 apply_grayscale, apply_edge_detection]:
+        pipeline.add_func(func)
+    return pipeline
+
+
+@pytest.mark.unit
+def test_compiled_matches_step_by_step(pipeline, rgb_image):
+    """
+    Test that the compiled run gives the same result as replaying steps.
+    """
+    expected = rgb_image
+    for func in pipeline:
+        if func is apply_grayscale:
+            expected = np.mean(expected, axis=2)
+        expected = func(expected)
+
+    compiled = pipeline.compile()
+    assert isinstance(compiled, CompiledPipeline)
+    np.testing.assert_array_equal(compiled(rgb_image), expected)
+
+
+@pytest.mark.unit
+def test_compiled_memory_report(pipeline, rgb_image):
+    """
+    Test that measured runs report the peak next to the replay estimate.
+    """
+    compiled = pipeline.compile(measure_memory=True)
+    compiled(rgb_image)
+    report = compiled.report
+    assert report.peak_bytes > 0
+    assert report.replay_bytes > 0
+    assert report.saved_bytes == max(
+        report.replay_bytes - report.peak_bytes, 0)
+    assert "estimated" in repr(report)
+
+
+@pytest.mark.unit
+def test_compiled_memory_report_opt_in(pipeline, rgb_image):
+    """
+    Test that runs are only traced when asked for.
+    """
+    compiled = pipeline.compile()
+    compiled(rgb_image)
+    assert compiled.report is None
+    assert not tracemalloc.is_tracing()
+
+
+@pytest.mark.unit
+def test_compiled_stack(pipeline, rgb_image):
+    """
+    Test that compiled pipelines run over stacks of images.
+    """
+    stack = np.stack([rgb_image[:64, :64]] * 3)
+    result = pipeline.compile()(stack)
+    assert result.shape[0] == 3
+
+
+@pytest.mark.unit
+def test_compiled_lazy_input(pipeline, rgb_image):
+    """
+    Test that dask backed input runs tile by tile and stays lazy.
+    """
+    import dask.array as da
+    compiled = pipeline.compile(measure_memory=True)
+    expected = compiled(rgb_image)
+
+    result = compiled(da.from_array(rgb_image, chunks=64))
+    assert isinstance(result, da.Array)
+    assert compiled.report is None
+    np.testing.assert_array_equal(result.compute(), expected)
+
+
+@pytest.mark.unit
+def test_compile_split_channels(pipeline):
+    """
+    Test that pipelines which split channels cannot be compiled.
+    """
+    pipeline.add_func(split_channels)
+    with pytest.raises(ValueError):
+        pipeline.compile()
+
+
+@pytest.mark.unit
+def test_declarative_round_trip(pipeline, rgb_image):
+    """
+    Test that steps and their arguments survive the JSON form.
+    """
+    saturation = partial(apply_saturation, saturation_level=1.5)
+    saturation.__name__ = apply_saturation.__name__
+    pipeline.add_func(saturation)
+
+    spec = json.loads(pipeline.to_json())
+    assert spec["version"] == PIPELINE_FORMAT_VERSION
+    assert spec["steps"][-1] == {
+        "name": "apply_saturation", "args": {"saturation_level": 1.5}}
+
+    loaded = Pipeline.from_dict(spec)
+    assert loaded.name == pipeline.name
+    assert [func.__name__ for func in loaded] == \
+        [func.__name__ for func in pipeline]
+    assert loaded.digest() == pipeline.digest()
+    np.testing.assert_array_equal(
+        loaded.compile()(rgb_image), pipeline.compile()(rgb_image))
+
+
+@pytest.mark.unit
+def test_digest_ignores_name(pipeline):
+    """
+    Test that digests identify the steps, not the name.
+    """
+    renamed = Pipeline.from_dict(pipeline.to_dict())
+    renamed.name = "other"
+    assert renamed.digest() == pipeline.digest()
+
+    renamed.add_func(apply_sharpening)
+    assert renamed.digest() != pipeline.digest()
+
+
+@pytest.mark.unit
+def test_declarative_rejects_unknown(pipeline):
+    """
+    Test that closures, unknown steps and newer versions are rejected.
+    """
+    pipeline.add_func(lambda img: img)
+    with pytest.raises(ValueError):
+        pipeline.to_dict()
+
+    spec = Pipeline().to_dict()
+    spec["steps"] = [{"name": "os_system", "args": {}}]
+    with pytest.raises(ValueError):
+        Pipeline.from_dict(spec)
+
+    spec = Pipeline().to_dict()
+    spec["version"] = PIPELINE_FORMAT_VERSION + 1
+    with pytest.raises(ValueError):
+        Pipeline.from_dict(spec)
+
+
+@pytest.mark.unit
+def test_model_spec(pipeline, monkeypatch):
+    """
+    Test that models are saved as constructor arguments and created again.
+    """
+    model = CellposeModel.__new__(CellposeModel)
+    model.gpu = False
+    model.model_type = "cyto3"
+    model.nchan = 2
+    model.pretrained_model = "/models/cyto3"
+    model.diam_mean = np.float32(30.0)
+    model.net_type = "cellpose_default"
+    pipeline.segModel = model
+
+    spec = json.loads(pipeline.to_json())["segModel"]
+    assert spec == {"class": "CellposeModel", "gpu": False,
+                    "model_type": "cyto3", "nchan": 2,
+                    "pretrained_model": "/models/cyto3", "diam_mean": 30.0,
+                    "backbone": "default"}
+
+    created = []
+    monkeypatch.setitem(pipelines.MODEL_CLASSES, "CellposeModel",
+                        lambda **kwargs: created.append(kwargs) or kwargs)
+    loaded = Pipeline.from_dict(pipeline.to_dict())
+    assert created == [{key: value for key, value in spec.items()
+                        if key != "class"}]
+    assert loaded.filtModel is None
+
+    assert Pipeline.from_dict(pipeline.to_dict(),
+                              load_models=False).segModel is None
+
+
+@pytest.mark.unit
+def test_load_pipeline(pipeline, tmp_path):
+    """
+    Test that saved and earlier pickled pipelines load, other files not.
+    """
+    path = str(tmp_path / "workflow.json")
+    save_pipeline(pipeline, path)
+    assert load_pipeline(path).digest() == pipeline.digest()
+
+    legacy = str(tmp_path / "workflow.pkl")
+    with open(legacy, "wb") as fp:
+        pickle.dump(pipeline, fp)
+    assert load_pipeline(legacy).digest() == pipeline.digest()
+
+    with open(legacy, "wb") as fp:
+        pickle.dump([apply_sharpening], fp)
+    with pytest.raises(ValueError):
+        load_pipeline(legacy)
+    with open(path, "w") as fp:
+        fp.write("not a pipeline")
+    with pytest.raises(ValueError):
+        load_pipeline(path)
+
+
+@pytest.mark.unit
+def test_incremental_rerun(pipeline, rgb_image):
+    """
+    Test that after editing a step only it and the steps after it run.
+    """
+    calls = []
+
+    def counted(func, name):
+        def step(img):
+            calls.append(name)
+            return func(img)
+        step.__name__ = name
+        return step
+
+    for index, func in enumerate(pipeline):
+        pipeline[index] = counted(func, func.__name__)
+    compiled = pipeline.compile(cache=ResultCache())
+    first = compiled(rgb_image)
+    assert len(calls) == 4 and compiled.reused_steps == 0
+
+    calls.clear()
+    np.testing.assert_array_equal(compiled(rgb_image), first)
+    assert calls == [] and compiled.reused_steps == 4
+
+    pipeline[1] = counted(partial(apply_gaussian_blur, radius=5.0), "blur")
+    result = compiled(rgb_image)
+    assert compiled.reused_steps == 1
+    assert calls == ["blur", "apply_grayscale", "apply_edge_detection"]
+    np.testing.assert_array_equal(result, pipeline.compile()(rgb_image))
+
+
+@pytest.mark.unit
+def test_incremental_budget(pipeline, rgb_image):
+    """
+    Test that stages above the memory budget are evicted, oldest first.
+    """
+    cache = ResultCache(max_bytes=rgb_image.nbytes)
+    compiled = pipeline.compile(cache=cache)
+    expected = compiled(rgb_image)
+    assert cache.current_bytes <= rgb_image.nbytes
+    assert cache.evictions > 0
+
+    # the final stage is the most recently stored one, and still cached
+    np.testing.assert_array_equal(compiled(rgb_image), expected)
+    assert compiled.reused_steps == len(pipeline)
+
+    compiled = pipeline.compile(cache=ResultCache(max_bytes=0))
+    compiled(rgb_image)
+    compiled(rgb_image)
+    assert compiled.reused_steps == 0
+
+
+@pytest.mark.unit
+def test_compiled_profile(pipeline, rgb_image, tmp_path):
+    """
+    Test that profiled runs measure every step and export as JSON.
+    """
+    compiled = pipeline.compile(profile=True)
+    result = compiled(rgb_image)
+    profile = compiled.profile
+    assert not tracemalloc.is_tracing()
+
+    assert [stage.name for stage in profile.stages] == \
+        [func.__name__ for func in pipeline]
+    first, last = profile.stages[0], profile.stages[-1]
+    assert first.input == {"shape": list(rgb_image.shape), "dtype": "uint8"}
+    assert last.output == {"shape": list(result.shape),
+                           "dtype": str(result.dtype)}
+    assert all(stage.wall_seconds > 0 for stage in profile.stages)
+    assert first.peak_bytes >= rgb_image.nbytes
+    assert profile.slowest() in profile.stages
+    assert "apply_sharpening" in repr(profile)
+
+    path = tmp_path / "profile.json"
+    profile.save(str(path))
+    exported = json.loads(path.read_text())
+    assert exported["name"] == pipeline.name
+    assert exported["machine"]["cpu_count"] > 0
+    assert len(exported["stages"]) == len(pipeline)
+
+    compiled.profile_stages = False
+    compiled(rgb_image)
+    assert compiled.profile is None
+
+
+@pytest.mark.unit
+def test_stream_frames(pipeline, rgb_image):
+    """
+    Test that streamed stacks match filtering every frame on its own.
+    """
+    stack = np.stack([np.roll(rgb_image[:64, :64], index, axis=0)
+                      for index in range(4)])
+    compiled = pipeline.compile()
+    expected = np.stack([compiled(frame) for frame in stack])
+
+    frames = list(compiled.iter_frames(stack))
+    assert len(frames) == 4
+    np.testing.assert_array_equal(np.stack(frames), expected)
+    np.testing.assert_array_equal(pipeline.stream(stack), expected)
+
+    out = np.zeros_like(expected)
+    assert compiled.stream(stack, out=out) is out
+    np.testing.assert_array_equal(out, expected)
+    with pytest.raises(ValueError):
+        compiled.stream(stack, out=np.zeros((3,) + expected.shape[1:]))
+
+    # single images are one frame
+    np.testing.assert_array_equal(
+        compiled.stream(rgb_image), compiled(rgb_image))
+
+
+@pytest.mark.unit
+def test_stream_lazy(pipeline, rgb_image):
+    """
+    Test that lazy stacks stream into a lazy result, one frame per task.
+    """
+    import dask.array as da
+    stack = np.stack([rgb_image[:64, :64]] * 3)
+    compiled = pipeline.compile()
+    result = compiled.stream(da.from_array(stack, chunks=(1, 32, 32, 3)))
+    assert isinstance(result, da.Array)
+    assert result.numblocks[0] == 3
+    np.testing.assert_array_equal(
+        result.compute(), compiled.stream(stack))
+
+
+@pytest.mark.unit
+def test_stream_peak_memory(pipeline, rgb_image):
+    """
+    Test that the peak memory of a stream does not grow with the frames.
+    """
+    frame = rgb_image[:128, :128]
+    compiled = pipeline.compile()
+
+    def extra_peak(frames):
+        stack = np.stack([frame] * frames)
+        out = np.empty((frames,) + compiled(frame).shape, np.uint8)
+        tracemalloc.start()
+        try:
+            compiled.stream(stack, out=out)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    few, many = extra_peak(2), extra_peak(16)
+    assert many < few * 1.5
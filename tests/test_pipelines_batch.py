@@ -0,0 +1,74 @@
+"""
+Test Suite for headless batch runs of exported pipelines.
+"""
+import os
+import pytest
+import numpy as np
+import tifffile
+
+from src.napari_image_filters import apply_gaussian_blur, apply_sharpening
+from src.pipelines import Pipeline, save_pipeline
+from src.pipelines_batch import main, run_batch
+
+
+@pytest.fixture
+def exported_pipeline(tmp_path):
+    """A filter only workflow, exported like WorkflowWidget.export_wf."""
+    pipeline = Pipeline()
+    pipeline.name = "batch"
+    pipeline.add_func(apply_gaussian_blur)
+    pipeline.add_func(apply_sharpening)
+    path = str(tmp_path / "workflow.json")
+    save_pipeline(pipeline, path)
+    return pipeline, path
+
+
+@pytest.fixture
+def image_folder(tmp_path, rgb_image):
+    """A folder of a few tif images."""
+    folder = tmp_path / "images"
+    folder.mkdir()
+    for index in range(3):
+        tifffile.imwrite(folder / f"img{index}.tif",
+                         np.roll(rgb_image, index, axis=0))
+    return str(folder)
+
+
+@pytest.mark.unit
+def test_run_batch_matches_pipeline(exported_pipeline, image_folder,
+                                    tmp_path):
+    """
+    Test that every image is written as the compiled pipeline's result.
+    """
+    pipeline, path = exported_pipeline
+    output = str(tmp_path / "results")
+    report = run_batch(path, image_folder, output, workers=2)
+
+    assert report.processed == 3
+    assert not report.failed
+    assert len(report.written) == 3
+    assert report.nbytes > 0
+    compiled = pipeline.compile()
+    for index in range(3):
+        img = tifffile.imread(os.path.join(image_folder, f"img{index}.tif"))
+        result = tifffile.imread(
+            os.path.join(output, f"img{index}_filtered.tif"))
+        np.testing.assert_array_equal(result, compiled(img))
+
+
+@pytest.mark.unit
+def test_run_batch_reports_failures(exported_pipeline, image_folder,
+                                    tmp_path):
+    """
+    Test that unreadable images are reported and the others still run, and
+    that earlier results in the input folder are not processed again.
+    """
+    _, path = exported_pipeline
+    with open(os.path.join(image_folder, "broken.tif"), "wb") as fp:
+        fp.write(b"not an image")
+    tifffile.imwrite(os.path.join(image_folder, "img0_filtered.tif"),
+                     np.zeros((4, 4), np.uint8))
+    output = str(tmp_path / "results")
+    assert main([path, image_folder, output, "--workers", "1"]) == 1
+    assert sorted(os.listdir(output)) == [
+        f"img{index}_filtered.tif" for index in range(3)]
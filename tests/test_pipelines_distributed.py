@@ -0,0 +1,86 @@
+"""
+Test Suite for recorded workflows as distributed_eval preprocessing steps.
+"""
+from functools import partial
+from itertools import product
+import pytest
+import numpy as np
+
+from src.napari_image_filters import (
+    apply_contrast_enhancement,
+    apply_crop,
+    apply_edge_detection,
+    apply_gaussian_blur,
+    apply_sharpening,
+)
+from src.napari_image_filters_tiled import filter_halo
+from src.pipelines import Pipeline
+from src.pipelines_distributed import pipeline_halo, preprocessing_steps
+
+
+@pytest.fixture
+def volume():
+    """A small Z x Y x X volume of blobs."""
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[:96, :96]
+    planes = []
+    for _ in range(3):
+        plane = np.zeros((96, 96))
+        for cy, cx in rng.uniform(8, 88, size=(12, 2)):
+            plane += np.exp(-((yy - cy) ** 2 + (xx - cx) ** 2) / 30.0)
+        planes.append(plane)
+    return (np.clip(np.stack(planes), 0, 1) * 255).astype(np.uint8)
+
+
+def run_blocks(steps, volume, block):
+    """Run the steps block by block like distributed_eval and reassemble."""
+    result = None
+    for y, x in product(range(0, volume.shape[1], block),
+                        range(0, volume.shape[2], block)):
+        crop = (slice(0, volume.shape[0]), slice(y, y + block),
+                slice(x, x + block))
+        image = volume[crop]
+        for function, kwargs in steps:
+            kwargs["crop"] = crop
+            image = function(image, **kwargs)
+        if result is None:
+            result = np.zeros(volume.shape, image.dtype)
+        result[crop] = image
+    return result
+
+
+@pytest.mark.unit
+def test_blocks_match_whole_volume(volume):
+    """
+    Test that blocks filtered with their halo reassemble to the result of
+    the pipeline on the whole volume.
+    """
+    pipeline = Pipeline()
+    pipeline.add_func(apply_gaussian_blur)
+    pipeline.add_func(apply_sharpening)
+    pipeline.add_func(apply_edge_detection)
+
+    steps = preprocessing_steps(pipeline, source=volume)
+    np.testing.assert_array_equal(run_blocks(steps, volume, 32),
+                                  pipeline.compile()(volume))
+
+
+@pytest.mark.unit
+def test_pipeline_halo():
+    """
+    Test that the halo adds up the steps' halos, CLAHE's rounded up to its
+    tile size, and that shape changing steps are rejected.
+    """
+    blur = partial(apply_gaussian_blur, radius=4)
+    blur.__name__ = apply_gaussian_blur.__name__
+    pipeline = Pipeline()
+    pipeline.add_func(blur)
+    pipeline.add_func(apply_contrast_enhancement)
+    halo = pipeline_halo(pipeline, (256, 256))
+    assert halo >= filter_halo(apply_gaussian_blur, (256, 256), radius=4)
+    assert (halo - filter_halo(apply_gaussian_blur, (256, 256),
+                               radius=4)) % 64 == 0
+
+    pipeline.add_func(apply_crop)
+    with pytest.raises(ValueError):
+        preprocessing_steps(pipeline)
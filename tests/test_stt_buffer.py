@@ -0,0 +1,66 @@
+"""
+Test Suite for the ring buffer of recorded audio.
+"""
+import pytest
+import numpy as np
+
+from src.stt_buffer import AudioRingBuffer
+
+
+def blocks(total, size, channels=1):
+    """Consecutive int16 sample blocks, like the sounddevice callback's."""
+    samples = (np.arange(total * channels) % 30000).astype(np.int16)
+    samples = samples.reshape(total, channels)
+    return [samples[start:start + size] for start in range(0, total, size)]
+
+
+@pytest.mark.unit
+def test_reads_recorded_frames():
+    """
+    Test that frame ranges read back what was written, across the wrap.
+    """
+    buffer = AudioRingBuffer(1000, channels=2)
+    recording = blocks(900, 64, channels=2)
+    for block in recording:
+        buffer.write(block)
+    expected = np.concatenate(recording)
+
+    assert buffer.frames_written == 900
+    assert len(buffer) == 900
+    np.testing.assert_array_equal(buffer.read(), expected)
+    np.testing.assert_array_equal(buffer.read(100, 300), expected[100:300])
+    assert buffer.read(500, 400).shape == (0, 2)
+
+
+@pytest.mark.unit
+def test_keeps_latest_frames():
+    """
+    Test that a full buffer overwrites its oldest frames, that positions
+    stay those of the whole recording and that memory stays fixed.
+    """
+    buffer = AudioRingBuffer(1000)
+    recording = blocks(2500, 128)
+    for block in recording:
+        buffer.write(block)
+    expected = np.concatenate(recording)
+
+    assert buffer.nbytes == 2000
+    assert buffer.frames_written == 2500
+    assert buffer.first_frame == 1500
+    assert len(buffer) == 1000
+    np.testing.assert_array_equal(buffer.read(), expected[1500:])
+    # the range crossing the end of the buffer
+    np.testing.assert_array_equal(buffer.read(1900, 2100),
+                                  expected[1900:2100])
+    # overwritten frames are left out
+    np.testing.assert_array_equal(buffer.read(0, 1600), expected[1500:1600])
+
+    # a block larger than the buffer keeps its end
+    buffer.write(np.arange(2500, dtype=np.int16))
+    np.testing.assert_array_equal(buffer.read()[:, 0],
+                                  np.arange(1500, 2500, dtype=np.int16))
+    assert buffer.frames_written == 5000
+
+    buffer.clear()
+    assert len(buffer) == 0
+    assert buffer.read().shape == (0, 1)